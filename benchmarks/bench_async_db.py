@@ -0,0 +1,180 @@
+"""Нагрузочный тест базы: 200 одновременных пользователей.
+
+Каждый "хендлер" делает запрос к базе и имитирует сетевой вызов
+(await asyncio.sleep). Сравниваем синхронный Database, который
+блокирует event loop, с AsyncDatabase на пуле потоков.
+
+Два сценария:
+    fast  — база отвечает за доли миллисекунды. Здесь пул потоков только
+            добавляет переключения потоков, и синхронный вариант быстрее;
+    stall — другое соединение (второй воркер, бэкап, чекпоинт) периодически
+            держит запись --stall-ms. Синхронный Database ждёт блокировку
+            прямо в event loop, и встают все пользователи, включая тех, чей
+            хендлер в базу не ходит (ответ Gemini, кнопка Listen).
+
+Помимо задержек хендлеров печатается лаг event loop (насколько позже
+просыпается задача с sleep(5 мс)) и задержка хендлеров без базы.
+
+    python benchmarks/bench_async_db.py --users 200 --rounds 20
+    python benchmarks/bench_async_db.py --scenario stall --stall-ms 100 --stall-every 0.3
+"""
+import argparse
+import asyncio
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from database import AsyncDatabase, Database  # noqa: E402
+
+NETWORK_LATENCY = 0.02
+LAG_PROBE = 0.005
+
+
+async def maybe_await(value):
+    if asyncio.iscoroutine(value):
+        return await value
+    return value
+
+
+async def simulated_handler(db, user_id, rnd):
+    """Смесь /mywords, сохранения слова, ответа на напоминание и хендлеров без базы.
+
+    Возвращает True, если хендлер ходил в базу.
+    """
+    action = rnd.random()
+    if action < 0.4:
+        await maybe_await(db.get_words_page(user_id))
+    elif action < 0.6:
+        await maybe_await(db.add_word(user_id, f"word{rnd.randrange(10_000)}", "перевод", "example"))
+    elif action < 0.8:
+        await maybe_await(db.get_word_by_id(rnd.randrange(1, 50_000)))
+    else:
+        # Ответ из Gemini / отправка голосового — база не нужна
+        await asyncio.sleep(NETWORK_LATENCY)
+        return False
+    await asyncio.sleep(NETWORK_LATENCY)  # reply_text
+    return True
+
+
+async def user_session(db, user_id, rounds, latencies):
+    rnd = random.Random(user_id)
+    for _ in range(rounds):
+        start = time.perf_counter()
+        used_db = await simulated_handler(db, user_id, rnd)
+        latencies["db" if used_db else "no_db"].append(time.perf_counter() - start)
+
+
+async def watch_lag(lags, stop):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(LAG_PROBE)
+        lags.append(time.perf_counter() - start - LAG_PROBE)
+
+
+def pct(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] * 1000 if values else 0.0
+
+
+async def run(db, users, rounds):
+    latencies = {"db": [], "no_db": []}
+    lags = []
+    stop = asyncio.Event()
+    watcher = asyncio.ensure_future(watch_lag(lags, stop))
+    start = time.perf_counter()
+    await asyncio.gather(*(user_session(db, u, rounds, latencies) for u in range(users)))
+    total = time.perf_counter() - start
+    stop.set()
+    await watcher
+    everything = latencies["db"] + latencies["no_db"]
+    return {
+        "p50": pct(everything, 0.50),
+        "p99": pct(everything, 0.99),
+        "rps": len(everything) / total,
+        "no_db_p99": pct(latencies["no_db"], 0.99),
+        "lag_p99": pct(lags, 0.99),
+        "lag_max": max(lags, default=0.0) * 1000,
+    }
+
+
+class Staller(threading.Thread):
+    """Отдельное соединение, которое каждые every секунд держит запись stall секунд."""
+
+    def __init__(self, path, stall, every):
+        super().__init__(daemon=True)
+        self.path = path
+        self.stall = stall
+        self.every = every
+        self.stopped = threading.Event()
+
+    def run(self):
+        connection = sqlite3.connect(self.path, isolation_level=None)
+        while not self.stopped.is_set():
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute("UPDATE words SET stage = stage WHERE id = 1")
+            time.sleep(self.stall)
+            connection.execute("COMMIT")
+            self.stopped.wait(self.every)
+        connection.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def seed(path, rows, users):
+    db = Database(path)
+    with db.connection:
+        db.connection.executemany(
+            "INSERT INTO words (user_id, word, short_translation, example, next_review, stage) "
+            "VALUES (?, ?, 'перевод', 'example', unixepoch(), 1)",
+            ((i % users, f"seed{i}") for i in range(rows)),
+        )
+    db.close()
+
+
+def report(name, r):
+    print(f"{name:20} p50={r['p50']:7.2f} ms  p99={r['p99']:7.2f} ms  {r['rps']:7.1f} handlers/s  "
+          f"no-db p99={r['no_db_p99']:7.2f} ms  loop lag p99={r['lag_p99']:6.2f} max={r['lag_max']:6.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--scenario", choices=("fast", "stall"), default="fast")
+    parser.add_argument("--stall-ms", type=float, default=100, help="сколько держится чужая запись")
+    parser.add_argument("--stall-every", type=float, default=0.3, help="пауза между блокировками, с")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        seed(path, args.rows, args.users)
+
+        for name, make in (
+            ("Database (sync)", lambda: Database(path)),
+            (f"AsyncDatabase ({args.workers} thr)", lambda: AsyncDatabase(path, workers=args.workers)),
+        ):
+            db = make()
+            staller = None
+            if args.scenario == "stall":
+                staller = Staller(path, args.stall_ms / 1000, args.stall_every)
+                staller.start()
+            try:
+                report(name, asyncio.run(run(db, args.users, args.rounds)))
+            finally:
+                if staller:
+                    staller.stop()
+                db.close()
+
+
+if __name__ == "__main__":
+    main()
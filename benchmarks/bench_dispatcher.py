@@ -0,0 +1,96 @@
+"""Бенчмарк рассылки напоминаний против локального фейкового Bot.
+
+Фейк имитирует сетевую задержку и иногда отвечает flood control
+(RetryAfter), чтобы проверить ретраи, или постоянной ошибкой (BadRequest
+"chat not found"), которую повторять нельзя.
+
+    python benchmarks/bench_dispatcher.py --messages 3000 --chats 1000
+
+--heavy N добавляет в начало N напоминаний одному чату (как после /import):
+остальные чаты не должны ждать, пока он разошлётся.
+
+    python benchmarks/bench_dispatcher.py --messages 5 --chats 5 --heavy 30
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from telegram.error import BadRequest, RetryAfter  # noqa: E402
+
+from dispatcher import ReminderDispatcher  # noqa: E402
+
+# Чат для --heavy: вне диапазона --chats и --bad-share
+HEAVY_CHAT = 10**9
+
+
+class FakeBot:
+    def __init__(self, latency, flood_share, bad_share=0.0, seed=42):
+        self.latency = latency
+        self.flood_share = flood_share
+        self.bad_share = bad_share
+        self.calls = 0
+        self.rnd = random.Random(seed)
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        if chat_id < self.bad_share * 1000:
+            raise BadRequest("Chat not found")
+        if self.rnd.random() < self.flood_share:
+            raise RetryAfter(1)
+        self.sent.append((chat_id, text, time.perf_counter()))
+
+
+async def run(args):
+    bot = FakeBot(args.latency, args.flood_share, args.bad_share)
+    dispatcher = ReminderDispatcher(
+        bot, concurrency=args.concurrency, global_rate=args.global_rate, backoff=0.1
+    )
+    # Ключи тяжёлого чата отрицательные, чтобы не пересекаться с обычными
+    messages = [(-1 - i, HEAVY_CHAT, {"text": f"import {i}"}) for i in range(args.heavy)] + [
+        (i, i % args.chats, {"text": f"word {i}"}) for i in range(args.messages)
+    ]
+
+    # Последовательная отправка, как было раньше
+    start = time.perf_counter()
+    sample = messages[: min(len(messages), 100)]
+    for _, chat_id, kwargs in sample:
+        await asyncio.sleep(args.latency)
+    sequential_rate = len(sample) / (time.perf_counter() - start)
+
+    started = time.perf_counter()
+    delivered = await dispatcher.dispatch(messages)
+    stats = dispatcher.last_stats
+    print(f"sequential (estimated): {sequential_rate:8.1f} msg/s")
+    print(f"dispatcher:             {stats.rate:8.1f} msg/s")
+    print(f"  {stats}")
+    print(f"  send_message calls: {bot.calls} for {stats.queued} messages")
+    if args.heavy:
+        others = [at for chat_id, _, at in bot.sent if chat_id != HEAVY_CHAT]
+        print(f"  other chats done after {max(others, default=started) - started:.2f}s")
+    assert len(delivered) == stats.sent
+    assert len(set(delivered)) == len(delivered), "duplicate sends"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=3000)
+    parser.add_argument("--chats", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--flood-share", type=float, default=0.01)
+    parser.add_argument("--bad-share", type=float, default=0.0, help="доля чатов с BadRequest (из 1000)")
+    parser.add_argument("--heavy", type=int, default=0, help="напоминаний одному чату в начале страницы")
+    parser.add_argument("--concurrency", type=int, default=20)
+    # Без настоящего Telegram можно поднять глобальный лимит и померить потолок
+    parser.add_argument("--global-rate", type=float, default=25)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
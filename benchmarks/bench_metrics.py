@@ -0,0 +1,84 @@
+"""Накладные расходы metrics.py на один измеренный вызов.
+
+Меряет счётчик, гистограмму с метками и полный замер (пара
+time.perf_counter() + labels().observe(), как в gate/tts/AsyncDatabase)
+против пустого цикла и проверяет, что каждое измерение укладывается в
+бюджет (по умолчанию 1 мкс). Берётся лучший из нескольких прогонов.
+
+    python benchmarks/bench_metrics.py --calls 1000000
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from metrics import Counter, Histogram, Registry  # noqa: E402
+
+
+def per_call(fn, calls, runs=5):
+    best = float("inf")
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn(calls)
+        best = min(best, time.perf_counter() - start)
+    return best / calls * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=200_000)
+    parser.add_argument("--budget-ns", type=float, default=1000)
+    args = parser.parse_args()
+
+    registry = Registry()
+    counter = registry.register(Counter("c", "counter"))
+    labelled = registry.register(Histogram("h", "histogram", ("method",)))
+    plain = registry.register(Histogram("p", "plain histogram"))
+
+    def baseline(n):
+        for _ in range(n):
+            pass
+
+    def counter_inc(n):
+        for _ in range(n):
+            counter.inc()
+
+    def observe(n):
+        for _ in range(n):
+            plain.observe(0.003)
+
+    def labelled_observe(n):
+        for _ in range(n):
+            labelled.labels("get_words_page").observe(0.003)
+
+    def timed(n):
+        perf_counter = time.perf_counter
+        for _ in range(n):
+            started = perf_counter()
+            labelled.labels("add_word").observe(perf_counter() - started)
+
+    base = per_call(baseline, args.calls)
+    results = {
+        "counter.inc()": per_call(counter_inc, args.calls) - base,
+        "histogram.observe()": per_call(observe, args.calls) - base,
+        "labels().observe()": per_call(labelled_observe, args.calls) - base,
+        "timed labels().observe()": per_call(timed, args.calls) - base,
+    }
+    for name, ns in results.items():
+        print(f"{name:24} {ns:8.0f} ns/call")
+
+    start = time.perf_counter()
+    registry.render()
+    print(f"render /metrics: {(time.perf_counter() - start) * 1000:.2f} ms")
+
+    worst = max(results.values())
+    if worst > args.budget_ns:
+        print(f"FAIL: budget {args.budget_ns:.0f} ns")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,413 @@
+"""Офлайн-прогон бота: настоящее приложение PTB, фейковые Telegram, Gemini и edge-tts.
+
+Собирает приложение через engbot.build_application() — с теми же
+хендлерами (handle_text, handle_voice, button_click, show_my_words) — и
+подменяет только сеть: Bot API отвечает FakeRequest, Gemini — FakeGenaiClient,
+синтез речи — FakeCommunicate (см. fake_backends.py). База — настоящая SQLite
+во временной папке. Задержка апдейта — от попадания в update_queue до конца
+обработки всеми хендлерами.
+
+Синтетическая нагрузка (закрытый цикл: пользователь ждёт ответ, думает, пишет дальше):
+    python benchmarks/bench_replay.py --users 200 --actions 20 --out results/replay.json
+
+Записанные апдейты (открытый цикл, --rate апдейтов в секунду, 0 — сразу все):
+    python benchmarks/bench_replay.py --updates benchmarks/updates/sample.jsonl --repeat 50 --rate 100
+
+Роутер и локальный словарь (без словаря слова всё равно идут в Gemini):
+    python benchmarks/bench_replay.py --no-router
+    python benchmarks/bench_replay.py --dictionary benchmarks/sample_dictionary.tsv
+
+Сравнение с прошлым прогоном:
+    python benchmarks/bench_replay.py --out new.json --compare old.json
+
+Перед нагрузкой отдельно замеряется один тик check_reminders по --due словам.
+"""
+import argparse
+import asyncio
+import collections
+import datetime
+import itertools
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from fake_backends import FakeCommunicate, FakeGenaiClient, FakeRequest, FakeTelegram, parse_latency  # noqa: E402
+from post_updates import load_updates  # noqa: E402
+
+# Слова повторяются между пользователями — как в жизни, часть ответов из кэша
+WORDS = [
+    "leverage", "opportunity", "reluctant", "get along", "bring up", "thorough", "adjust",
+    "deadline", "negotiate", "figure out", "commitment", "meanwhile", "awkward", "rely on",
+    "sustainable", "straightforward", "hesitate", "look forward to", "eventually", "assume",
+]
+SENTENCES = [
+    "I've been meaning to ask you about the project deadline.",
+    "Could you walk me through how this feature actually works?",
+    "She was reluctant to take on more responsibility at work.",
+    "We should figure out a better way to handle these requests.",
+]
+# Доли действий синтетического пользователя
+DEFAULT_MIX = "word=45,sentence=15,voice=10,tts=10,save=10,mywords=5,page=5"
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "engbot"}
+
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(","):
+        kind, _, weight = part.partition("=")
+        mix[kind.strip()] = float(weight)
+    return mix
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+def summarize(latencies):
+    values = sorted(latencies)
+    return {
+        "count": len(values),
+        "p50_ms": round(percentile(values, 0.50) * 1000, 1) if values else None,
+        "p95_ms": round(percentile(values, 0.95) * 1000, 1) if values else None,
+        "p99_ms": round(percentile(values, 0.99) * 1000, 1) if values else None,
+        "max_ms": round(values[-1] * 1000, 1) if values else None,
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def peak_rss_mib():
+    # ru_maxrss на Linux — в КиБ
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def seed_due_words(path, users, due):
+    """Слова, которым уже пора на повтор, — для замера тика check_reminders."""
+    from database import Database
+
+    db = Database(path)
+    past = int((datetime.datetime.now() - datetime.timedelta(minutes=5)).timestamp())
+    with db.connection:
+        db.connection.executemany(
+            "INSERT INTO words (user_id, word, short_translation, next_review, stage) VALUES (?, ?, 'x', ?, 1)",
+            ((1_000 + i % users, f"due{i}", past) for i in range(due)),
+        )
+    db.close()
+
+
+class Replay:
+    """Кормит приложение апдейтами и меряет, когда каждый из них обработан."""
+
+    def __init__(self, application, telegram, rnd, mix):
+        self.application = application
+        self.telegram = telegram
+        self.rnd = rnd
+        self.mix = mix
+        self.update_ids = itertools.count(1)
+        self.message_ids = itertools.count(1)
+        self.pending = {}
+        self.latencies = collections.defaultdict(list)
+
+    async def done(self, update, context):
+        """Хендлер из группы 1: вызывается после всех хендлеров группы 0."""
+        kind, started, future = self.pending.pop(update.update_id, (None, None, None))
+        if kind is None:
+            return
+        self.latencies[kind].append(time.perf_counter() - started)
+        if not future.done():
+            future.set_result(None)
+
+    async def submit(self, kind, data):
+        """Кладёт апдейт в очередь; возвращает future, который завершится после обработки."""
+        from telegram import Update
+
+        data = dict(data, update_id=next(self.update_ids))
+        future = asyncio.get_running_loop().create_future()
+        self.pending[data["update_id"]] = (kind, time.perf_counter(), future)
+        await self.application.update_queue.put(Update.de_json(data, self.application.bot))
+        return future
+
+    # --- Синтетические апдейты ---
+
+    def _message(self, chat_id, **fields):
+        user = {"id": chat_id, "is_bot": False, "first_name": f"User{chat_id}"}
+        return {
+            "message_id": next(self.message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private", "first_name": user["first_name"]},
+            "from": user,
+            **fields,
+        }
+
+    def _text(self, chat_id, text):
+        fields = {"text": text}
+        if text.startswith("/"):
+            fields["entities"] = [{"offset": 0, "length": len(text.split()[0]), "type": "bot_command"}]
+        return {"message": self._message(chat_id, **fields)}
+
+    def _callback(self, chat_id, data, message_id):
+        return {"callback_query": {
+            "id": str(next(self.update_ids)),
+            "from": {"id": chat_id, "is_bot": False, "first_name": f"User{chat_id}"},
+            "chat_instance": "bench",
+            "data": data,
+            "message": {
+                "message_id": message_id, "date": int(time.time()),
+                "chat": {"id": chat_id, "type": "private"}, "from": BOT_USER, "text": "…",
+            },
+        }}
+
+    def make_update(self, chat_id):
+        """Случайное действие пользователя: (вид, сырой апдейт)."""
+        kind = self.rnd.choices(list(self.mix), weights=list(self.mix.values()))[0]
+        keyboards = self.telegram.keyboards[chat_id]
+        if kind in ("tts", "save") and "reply" not in keyboards:
+            kind = "word"
+        elif kind == "page" and "words" not in keyboards:
+            kind = "mywords"
+        if kind == "word":
+            return kind, self._text(chat_id, self.rnd.choice(WORDS))
+        if kind == "sentence":
+            return kind, self._text(chat_id, self.rnd.choice(SENTENCES))
+        if kind == "voice":
+            file_id = f"v{chat_id}_{next(self.message_ids)}"
+            return kind, {"message": self._message(chat_id, voice={
+                "file_id": file_id, "file_unique_id": file_id, "duration": 2, "mime_type": "audio/ogg"
+            })}
+        if kind == "mywords":
+            return kind, self._text(chat_id, "/mywords")
+        if kind == "page":
+            return kind, self._callback(chat_id, "mw:f:0:0", keyboards["words"])
+        # tts / save — кнопки под последним ответом бота
+        return kind, self._callback(chat_id, kind, keyboards["reply"])
+
+    async def user_session(self, chat_id, actions, think):
+        for _ in range(actions):
+            kind, data = self.make_update(chat_id)
+            await (await self.submit(kind, data))
+            if think:
+                await asyncio.sleep(self.rnd.expovariate(1 / think))
+
+    async def closed_loop(self, users, actions, think):
+        await asyncio.gather(*(
+            self.user_session(1_000 + i, actions, think) for i in range(users)
+        ))
+
+    async def open_loop(self, updates, rate):
+        futures = []
+        started = time.perf_counter()
+        for i, data in enumerate(updates):
+            if rate:
+                delay = started + i / rate - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            kind = next((key for key in data if key != "update_id"), "other")
+            if kind == "message":
+                message = data["message"]
+                kind = "voice" if "voice" in message else (
+                    "command" if message.get("text", "").startswith("/") else "text"
+                )
+            futures.append(await self.submit(kind, data))
+        await asyncio.gather(*futures)
+
+
+def drop_reminder_jobs(application):
+    for job in application.job_queue.get_jobs_by_name("check_reminders"):
+        job.schedule_removal()
+
+
+async def time_reminder_tick(application):
+    """Один тик рассылки напоминаний, как его запускает JobQueue.
+
+    Таймер, который ставит build_application, и следующий, который ставит
+    сам тик, снимаем: иначе вторая цепочка check_reminders пошла бы
+    параллельно с замером и с нагрузкой.
+    """
+    import engbot
+    from telegram.ext import CallbackContext
+
+    drop_reminder_jobs(application)
+    started = time.perf_counter()
+    await engbot.check_reminders(CallbackContext(application))
+    elapsed = time.perf_counter() - started
+    drop_reminder_jobs(application)
+    return elapsed
+
+
+async def run(args, telegram, replay_factory):
+    import engbot
+    from telegram import Update
+    from telegram.ext import TypeHandler
+
+    application = engbot.build_application(FakeRequest(telegram), FakeRequest(telegram))
+    replay = replay_factory(application)
+    application.add_handler(TypeHandler(Update, replay.done), group=1)
+
+    async with application:
+        if application.post_init:
+            await application.post_init(application)
+        await application.start()
+        await engbot.on_started(application)
+        try:
+            tick = await time_reminder_tick(application)
+            reminders = telegram.calls["sendMessage"]
+
+            started = time.perf_counter()
+            if args.updates:
+                updates = load_updates(args.updates) * args.repeat
+                await replay.open_loop(updates, args.rate)
+            else:
+                await replay.closed_loop(args.users, args.actions, args.think)
+            elapsed = time.perf_counter() - started
+        finally:
+            await application.stop()
+            await application.post_stop(application)
+    return replay, elapsed, tick, reminders
+
+
+def compare(old, new):
+    """Печатает изменения ключевых цифр относительно прошлого JSON."""
+    rows = [("updates/sec", old["updates_per_sec"], new["updates_per_sec"])]
+    for key in ("p50_ms", "p95_ms", "p99_ms"):
+        rows.append((key, old["latency"]["all"][key], new["latency"]["all"][key]))
+    rows.append(("prompt chars/call", old.get("gemini_prompt_chars_per_call"), new["gemini_prompt_chars_per_call"]))
+    rows.append(("peak RSS MiB", old["peak_rss_mib"], new["peak_rss_mib"]))
+    rows.append(("reminder tick s", old["reminders"]["tick_seconds"], new["reminders"]["tick_seconds"]))
+    print(f"\ncompared with {old.get('commit')}:")
+    for name, before, after in rows:
+        change = f"{(after - before) / before * 100:+.1f}%" if before and after is not None else "n/a"
+        print(f"  {name:17} {before!s:>10} -> {after!s:<10} {change}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, default=100, help="синтетические пользователи (закрытый цикл)")
+    parser.add_argument("--actions", type=int, default=20, help="действий на пользователя")
+    parser.add_argument("--think", type=float, default=0.5, help="средняя пауза пользователя, с")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="доли действий")
+    parser.add_argument("--updates", help="JSONL/JSON с записанными апдейтами (открытый цикл)")
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--rate", type=float, default=0, help="апдейтов в секунду для --updates, 0 — без паузы")
+    parser.add_argument("--due", type=int, default=2_000, help="слов для тика напоминаний")
+    parser.add_argument("--telegram-latency", default="lognormal:0.04,0.5")
+    parser.add_argument("--gemini-latency", default="lognormal:0.9,0.4")
+    parser.add_argument("--gemini-per-kchar", type=float, default=0.03,
+                        help="добавка к задержке Gemini на 1000 символов промпта, с")
+    parser.add_argument("--model-latency", action="append", default=[], metavar="MODEL=SPEC",
+                        help="своя задержка для модели, например gemini-2.5-flash-lite=lognormal:0.5,0.4")
+    parser.add_argument("--no-router", action="store_true", help="ROUTER=0: все тексты с полным промптом")
+    parser.add_argument("--dictionary", help="TSV локального словаря (DICTIONARY_PATH), например benchmarks/sample_dictionary.tsv")
+    parser.add_argument("--tts-latency", default="uniform:0.3,0.8")
+    parser.add_argument("--stream", action="store_true", help="STREAM_REPLIES=1")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", help="куда записать JSON с результатами")
+    parser.add_argument("--compare", help="JSON прошлого прогона")
+    args = parser.parse_args()
+    # Дальше работаем во временной папке — пути пользователя делаем абсолютными
+    for name in ("updates", "out", "compare", "dictionary"):
+        if getattr(args, name):
+            setattr(args, name, os.path.abspath(getattr(args, name)))
+    cwd = os.getcwd()
+
+    rnd = random.Random(args.seed)
+    telegram = FakeTelegram(parse_latency(args.telegram_latency, random.Random(args.seed + 1)))
+    model_latency = {}
+    for item in args.model_latency:
+        model, _, spec = item.partition("=")
+        model_latency[model] = parse_latency(spec, random.Random(args.seed + 4 + len(model_latency)))
+    gemini = FakeGenaiClient(
+        parse_latency(args.gemini_latency, random.Random(args.seed + 2)), args.gemini_per_kchar, model_latency
+    )
+    FakeCommunicate.latency = staticmethod(parse_latency(args.tts_latency, random.Random(args.seed + 3)))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # engbot открывает vocab.db в текущей папке, настройки читает из окружения при импорте
+        os.chdir(tmp)
+        os.environ.update(TELEGRAM_TOKEN="123456:BENCH", GEMINI_API_KEY="bench")
+        os.environ["STREAM_REPLIES"] = "1" if args.stream else "0"
+        os.environ["ROUTER"] = "0" if args.no_router else "1"
+        if args.dictionary:
+            os.environ["DICTIONARY_PATH"] = args.dictionary
+        seed_due_words(os.path.join(tmp, "vocab.db"), max(args.users, 1), args.due)
+
+        import edge_tts
+        import engbot
+        from tts import TTSCache
+
+        edge_tts.Communicate = FakeCommunicate
+        engbot.client = gemini
+        engbot.init_services()
+        engbot.tts_cache = TTSCache(engbot.db, directory=os.path.join(tmp, "tts"))
+
+        replay, elapsed, tick, reminders = asyncio.run(run(
+            args, telegram, lambda application: Replay(application, telegram, rnd, parse_mix(args.mix))
+        ))
+        engbot.db.close()
+        os.chdir(cwd)
+
+    everything = [value for values in replay.latencies.values() for value in values]
+    result = {
+        "commit": git_commit(),
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "config": vars(args),
+        "updates": len(everything),
+        "elapsed_seconds": round(elapsed, 3),
+        "updates_per_sec": round(len(everything) / elapsed, 1) if elapsed else None,
+        "latency": {"all": summarize(everything), **{
+            kind: summarize(values) for kind, values in sorted(replay.latencies.items())
+        }},
+        "peak_rss_mib": peak_rss_mib(),
+        "reminders": {"sent": reminders, "tick_seconds": round(tick, 3)},
+        "bot_api_calls": dict(telegram.calls),
+        "gemini_calls": dict(gemini.models.calls),
+        "gemini_prompt_chars": gemini.models.prompt_chars,
+        "gemini_prompt_chars_per_call": round(
+            gemini.models.prompt_chars / max(1, sum(gemini.models.calls.values()) - gemini.models.calls["get"])
+        ),
+        "text_routes": {labels[0]: child.value for labels, child in engbot.TEXT_ROUTES.children.items()},
+        "tts_syntheses": FakeCommunicate.calls,
+        "errors": {labels[0]: child.value for labels, child in engbot.ERRORS.children.items()},
+        "unfinished": len(replay.pending),
+    }
+
+    print(f"{result['updates']} updates in {elapsed:.2f}s: {result['updates_per_sec']} updates/s, "
+          f"peak RSS {result['peak_rss_mib']} MiB")
+    for kind, stats in result["latency"].items():
+        print(f"  {kind:10} n={stats['count']:<6} p50 {stats['p50_ms']} ms, p95 {stats['p95_ms']} ms, "
+              f"p99 {stats['p99_ms']} ms, max {stats['max_ms']} ms")
+    print(f"reminder tick: {reminders} reminders in {tick:.2f}s")
+    print(f"Bot API: {result['bot_api_calls']}")
+    print(f"text routes: {result['text_routes']}, prompt chars/call: {result['gemini_prompt_chars_per_call']}")
+    print(f"Gemini: {result['gemini_calls']}, TTS syntheses: {result['tts_syntheses']}, "
+          f"errors: {result['errors']}")
+
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        print(f"saved to {args.out}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(json.load(f), result)
+
+
+if __name__ == "__main__":
+    main()
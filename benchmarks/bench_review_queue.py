@@ -0,0 +1,119 @@
+"""Бенчмарк таймера напоминаний: полный скан против индекса + кучи.
+
+Засевает N строк (по умолчанию 1M) во временную базу и меряет задержку
+одного тика check_reminders до и после индексов.
+
+    python benchmarks/bench_review_queue.py --rows 1000000
+"""
+import argparse
+import datetime
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from database import REVIEW_PAGE_SIZE, Database  # noqa: E402
+
+OLD_QUERY = "SELECT id, user_id, word, translation, stage FROM words WHERE next_review <= ?"
+# Постраничный запрос по индексу — то, что делал тик после индексов (сейчас бот
+# забирает те же страницы через claim_due_words, с арендой)
+PAGE_QUERY = ("SELECT id, user_id, word, short_translation, stage FROM words INDEXED BY idx_words_next_review "
+              "WHERE next_review <= ? AND id > ? ORDER BY id LIMIT ?")
+
+
+def seed(path, rows, users, due_share):
+    conn = sqlite3.connect(path)
+    conn.execute("""
+        CREATE TABLE words (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            word TEXT,
+            translation TEXT,
+            next_review TIMESTAMP,
+            stage INTEGER DEFAULT 0
+        )
+    """)
+    now = datetime.datetime.now()
+    rnd = random.Random(42)
+
+    def gen():
+        for i in range(rows):
+            if rnd.random() < due_share:
+                delta = -rnd.randint(1, 3600)
+            else:
+                delta = rnd.randint(3600, 30 * 86400)
+            yield (
+                rnd.randrange(users), f"word{i}", f"перевод {i}\n(example {i})",
+                now + datetime.timedelta(seconds=delta), rnd.randint(1, 5),
+            )
+
+    with conn:
+        conn.executemany(
+            "INSERT INTO words (user_id, word, translation, next_review, stage) VALUES (?, ?, ?, ?, ?)",
+            gen(),
+        )
+    conn.close()
+
+
+def iter_due(db, page_size=REVIEW_PAGE_SIZE):
+    """Все слова к повторению, страницами по page_size (keyset по id)."""
+    now = int(time.time())
+    after_id = 0
+    while True:
+        rows = db.connection.execute(PAGE_QUERY, (now, after_id, page_size)).fetchall()
+        yield from rows
+        if len(rows) < page_size:
+            return
+        after_id = rows[-1][0]
+
+
+def measure(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return timings[len(timings) // 2] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--due-share", type=float, default=0.001)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        start = time.perf_counter()
+        seed(path, args.rows, args.users, args.due_share)
+        print(f"seeded {args.rows} rows in {time.perf_counter() - start:.1f}s")
+
+        conn = sqlite3.connect(path)
+        before = measure(
+            lambda: conn.execute(OLD_QUERY, (datetime.datetime.now(),)).fetchall(), args.repeat
+        )
+        conn.close()
+
+        # Database() переводит схему на последнюю версию, строит индексы и заполняет кучу
+        start = time.perf_counter()
+        db = Database(path)
+        print(f"migrate + index build: {time.perf_counter() - start:.1f}s")
+
+        after = measure(lambda: sum(1 for _ in iter_due(db)), args.repeat)
+        idle = measure(db.seconds_until_next_review, args.repeat)
+
+        print(f"before (full scan):        {before:8.2f} ms/tick")
+        print(f"after  (index + paging):   {after:8.2f} ms/tick")
+        print(f"after  (heap, idle check): {idle:8.3f} ms/tick")
+        db.connection.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Симуляция интервальных повторений: нагрузка по дням и скорость планировщиков.
+
+Синтетические пользователи каждый день добавляют слова и отвечают на
+напоминания; вероятность вспомнить — по экспоненциальной кривой забывания
+со случайной "настоящей" стабильностью слова. Для каждого алгоритма
+печатаем среднее и дисперсию числа повторов в день, долю "забыл" и
+сколько тысяч оценок в секунду считает планировщик.
+
+    python benchmarks/bench_scheduler.py --days 180 --words-per-day 20
+"""
+import argparse
+import datetime
+import math
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from scheduler import AGAIN, EASY, GOOD, HARD, NEW_STATE, SCHEDULERS, schedule  # noqa: E402
+
+
+def grade_answer(rnd, recall_probability):
+    if rnd.random() > recall_probability:
+        return AGAIN
+    roll = rnd.random()
+    return HARD if roll < 0.15 else EASY if roll > 0.85 else GOOD
+
+
+def simulate(scheduler, args, fuzz):
+    rnd = random.Random(args.seed)
+    start = datetime.datetime(2025, 1, 1, 9)
+    words = []  # [state, due_day, true_stability, last_day]
+    load = {}  # день -> сколько слов назначено
+    daily = []
+    failures = reviews = 0
+    spent = 0.0
+
+    for day in range(args.days):
+        now = start + datetime.timedelta(days=day)
+        for _ in range(args.words_per_day):
+            words.append([NEW_STATE, day, rnd.uniform(1, 10), day])
+            load[day] = load.get(day, 0) + 1
+
+        count = 0
+        for word in words:
+            state, due_day, true_stability, last_day = word
+            if due_day != day:
+                continue
+            count += 1
+            elapsed = day - last_day
+            grade = grade_answer(rnd, math.exp(-elapsed / true_stability))
+            failures += grade == AGAIN
+            # Каждый успешный повтор укрепляет "настоящую" память
+            word[2] = true_stability * (1.2 if grade == AGAIN else 2.0)
+
+            started = time.perf_counter()
+            if fuzz:
+                load_fn = lambda days, d=day: {k - d: v for k, v in load.items() if d < k <= d + days}
+                new_state, next_review = schedule(scheduler, state, grade, now, load_fn, rnd)
+            else:
+                new_state, interval = scheduler.review(state, grade, now)
+                next_review = now + datetime.timedelta(days=max(1, round(interval)))
+            spent += time.perf_counter() - started
+            next_day = (next_review.date() - now.date()).days + day
+            load[next_day] = load.get(next_day, 0) + 1
+            word[0], word[1], word[3] = new_state, next_day, day
+        reviews += count
+        daily.append(count)
+
+    # Первые недели — разгон, считаем нагрузку на установившемся участке
+    steady = daily[args.days // 3:]
+    return {
+        "mean": statistics.mean(steady),
+        "variance": statistics.pvariance(steady),
+        "peak": max(steady),
+        "fail_rate": failures / reviews if reviews else 0.0,
+        "kops": reviews / spent / 1000 if spent else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=180)
+    parser.add_argument("--words-per-day", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    print(f"{'scheduler':18s} {'mean/day':>9s} {'variance':>9s} {'peak':>5s} {'fail %':>7s} {'k reviews/s':>12s}")
+    for name, cls in SCHEDULERS.items():
+        for fuzz in (False, True):
+            r = simulate(cls(), args, fuzz)
+            label = f"{name}{' + fuzz' if fuzz else ''}"
+            print(f"{label:18s} {r['mean']:9.1f} {r['variance']:9.1f} {r['peak']:5d} "
+                  f"{r['fail_rate'] * 100:6.1f}% {r['kops']:12.1f}")
+
+
+if __name__ == "__main__":
+    main()
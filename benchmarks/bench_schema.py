@@ -0,0 +1,152 @@
+"""Бенчмарк схемы words: старая раскладка (v1) против компактной (v2).
+
+Засевает N строк (по умолчанию 1M) в базу со схемой v1 — даты строками,
+карточка одной строкой в translation, без UNIQUE — и меряет размер файла
+и горячие запросы. Потом та же база проходит миграцию через Database(),
+и замеры повторяются.
+
+    python benchmarks/bench_schema.py --rows 1000000
+"""
+import argparse
+import datetime
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from database import MIGRATIONS, Database  # noqa: E402
+from scheduler import GOOD, get_scheduler  # noqa: E402
+
+# Запросы в том виде, в каком их делал бот до миграции
+OLD_DUE = ("SELECT id, user_id, word, translation, stage FROM words INDEXED BY idx_words_next_review "
+           "WHERE next_review <= ? AND id > 0 ORDER BY id LIMIT 500")
+OLD_PAGE = "SELECT id, word, translation, stage FROM words WHERE user_id = ? ORDER BY id DESC LIMIT 21"
+OLD_EXISTS = "SELECT id FROM words WHERE user_id = ? AND word = ?"
+OLD_DAY_LOAD = "SELECT next_review FROM words WHERE user_id = ? AND next_review > ? AND next_review <= ?"
+# Тот же тик на схеме v2: даты — epoch-секунды
+NEW_DUE = ("SELECT id, user_id, word, short_translation, stage FROM words INDEXED BY idx_words_next_review "
+           "WHERE next_review <= ? AND id > 0 ORDER BY id LIMIT 500")
+
+
+def seed(path, rows, users, due_share):
+    conn = sqlite3.connect(path)
+    with conn:
+        MIGRATIONS[0](conn)
+        conn.execute("PRAGMA user_version = 1")
+    now = datetime.datetime.now()
+    rnd = random.Random(42)
+
+    def gen():
+        for i in range(rows):
+            if rnd.random() < due_share:
+                delta = -rnd.randint(1, 3600)
+            else:
+                delta = rnd.randint(3600, 30 * 86400)
+            yield (
+                i % users, f"word{i}",
+                f"перевод {i}\n(An example sentence number {i}. — Пример предложения номер {i}.)",
+                now + datetime.timedelta(seconds=delta), rnd.randint(1, 5),
+            )
+
+    with conn:
+        conn.executemany(
+            "INSERT INTO words (user_id, word, translation, next_review, stage) VALUES (?, ?, ?, ?, ?)",
+            gen(),
+        )
+    conn.close()
+
+
+def file_size(conn):
+    conn.execute("VACUUM")
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    return conn.execute("PRAGMA page_count").fetchone()[0] * page_size / 2**20
+
+
+def measure(fn, repeat):
+    timings = []
+    for i in range(repeat):
+        start = time.perf_counter()
+        fn(i)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return timings[len(timings) // 2] * 1000
+
+
+def run_old(path, args):
+    conn = sqlite3.connect(path)
+    # Те же настройки, что у Database, чтобы сравнивать только схему
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    now = datetime.datetime.now()
+
+    def add_word(i):
+        # SELECT-then-INSERT: на существующем слове вставки нет
+        with conn:
+            if not conn.execute(OLD_EXISTS, (i % args.users, f"word{i}")).fetchone():
+                conn.execute("INSERT INTO words (user_id, word, translation, next_review, stage) "
+                             "VALUES (?, ?, ?, ?, 1)", (i % args.users, f"word{i}", "x", now))
+
+    results = {
+        "size": file_size(conn),
+        "due tick": measure(lambda i: conn.execute(OLD_DUE, (now,)).fetchall(), args.repeat),
+        "/mywords page": measure(
+            lambda i: [r[2].split("\n")[0] for r in conn.execute(OLD_PAGE, (i,)).fetchall()], args.repeat),
+        "add_word (dup)": measure(add_word, args.repeat),
+        "day load": measure(
+            lambda i: conn.execute(OLD_DAY_LOAD, (i, now, now + datetime.timedelta(days=30))).fetchall(),
+            args.repeat),
+    }
+    conn.close()
+    return results
+
+
+def run_new(path, args):
+    start = time.perf_counter()
+    db = Database(path)
+    print(f"migration: {time.perf_counter() - start:.1f}s")
+    now = datetime.datetime.now()
+    scheduler = get_scheduler("fsrs")
+    results = {
+        "size": file_size(db.connection),
+        "due tick": measure(
+            lambda i: db.connection.execute(NEW_DUE, (int(now.timestamp()),)).fetchall(), args.repeat),
+        "/mywords page": measure(lambda i: db.get_words_page(i), args.repeat),
+        "add_word (dup)": measure(lambda i: db.add_word(i % args.users, f"word{i}", "x"), args.repeat),
+        "day load": measure(lambda i: db.get_day_load(i, now, 30), args.repeat),
+    }
+    # Для справки: полный шаг оценки (чтение + day load + запись)
+    results["review_word"] = measure(lambda i: db.review_word(i + 1, GOOD, scheduler, now), args.repeat)
+    db.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--due-share", type=float, default=0.001)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        start = time.perf_counter()
+        seed(path, args.rows, args.users, args.due_share)
+        print(f"seeded {args.rows} rows in {time.perf_counter() - start:.1f}s")
+
+        before = run_old(path, args)
+        after = run_new(path, args)
+
+    print(f"{'':16} {'v1':>10} {'v2':>10}")
+    print(f"{'size, MiB':16} {before['size']:10.1f} {after['size']:10.1f}")
+    for name in ("due tick", "/mywords page", "add_word (dup)", "day load", "review_word"):
+        old = f"{before[name]:10.3f}" if name in before else f"{'—':>10}"
+        print(f"{name + ', ms':16} {old} {after[name]:10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""Холодный старт бота: время импорта (-X importtime) и время до первого апдейта.
+
+1. `python -X importtime -c "import engbot"` — сколько стоит сам импорт и
+   какие модули верхнего уровня в нём самые дорогие.
+2. Несколько свежих процессов (--runs), каждый от запуска интерпретатора
+   до ответа на первый апдейт: импорт -> build_application -> initialize +
+   post_init (prewarm) + start -> первое слово через handle_text. Сеть —
+   фейковая (fake_backends.py) с нулевой задержкой по умолчанию, чтобы
+   считалось только время процесса.
+
+    python benchmarks/bench_startup.py --runs 5 --out results/startup.json
+    PREWARM=0 python benchmarks/bench_startup.py   # без прогрева — для сравнения
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+PHASES = ("interpreter", "import", "build", "start", "first_update", "total")
+
+
+def bench_env(**extra):
+    env = dict(os.environ, TELEGRAM_TOKEN="123456:BENCH", GEMINI_API_KEY="bench", **extra)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [ROOT, env.get("PYTHONPATH")]))
+    return env
+
+
+def import_profile(cwd, top):
+    """Разбирает вывод -X importtime: общее время и самые дорогие импорты верхнего уровня."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import engbot"],
+        cwd=cwd, env=bench_env(), capture_output=True, text=True
+    )
+    if proc.returncode:
+        raise RuntimeError(proc.stderr[-2000:])
+    modules = []
+    direct, children, total_us = [], [], 0
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        # "import time:  self [us] | cumulative | имя" — вложенность показана отступом имени,
+        # вложенные модули печатаются раньше того, кто их импортировал
+        _, cumulative_part, name = line.split("|", 2)
+        cumulative_us = int(cumulative_part)
+        name = name[1:]
+        level = len(name) - len(name.lstrip())
+        name = name.strip()
+        modules.append(name)
+        if level == 2:
+            children.append((name, cumulative_us))
+        elif level == 0:
+            if name == "engbot":
+                direct, total_us = children, cumulative_us
+            children = []
+    direct.sort(key=lambda m: m[1], reverse=True)
+    return {
+        "total_ms": round(total_us / 1000, 1),
+        "modules": len(modules),
+        "top": [{"module": name, "cumulative_ms": round(cum / 1000, 1)} for name, cum in direct[:top]],
+        "heavy_loaded": sorted({
+            name.split(".")[0] for name in modules
+            if name.split(".")[0] in ("google", "edge_tts", "uvicorn", "starlette", "aiohttp")
+        }),
+    }
+
+
+def child(args):
+    """Тело одного замера: выполняется в отдельном процессе."""
+    t0 = float(os.environ["BENCH_T0"])
+    phases = {"interpreter": time.time() - t0}
+
+    started = time.perf_counter()
+    import engbot
+    phases["import"] = time.perf_counter() - started
+
+    from fake_backends import FakeGenaiClient, FakeRequest, FakeTelegram, parse_latency
+    from telegram import Update
+    from telegram.ext import TypeHandler
+
+    telegram = FakeTelegram(parse_latency(args.telegram_latency))
+    engbot.client = FakeGenaiClient(parse_latency(args.gemini_latency))
+
+    started = time.perf_counter()
+    application = engbot.build_application(FakeRequest(telegram), FakeRequest(telegram))
+    phases["build"] = time.perf_counter() - started
+
+    async def first_update():
+        done = asyncio.get_running_loop().create_future()
+
+        async def answered(update, context):
+            done.set_result(None)
+
+        application.add_handler(TypeHandler(Update, answered), group=1)
+        async with application:
+            started = time.perf_counter()
+            if application.post_init:
+                await application.post_init(application)
+            await application.start()
+            phases["start"] = time.perf_counter() - started
+
+            started = time.perf_counter()
+            await application.update_queue.put(Update.de_json({"update_id": 1, "message": {
+                "message_id": 1, "date": int(time.time()),
+                "chat": {"id": 424242, "type": "private"},
+                "from": {"id": 424242, "is_bot": False, "first_name": "Bench"},
+                "text": "leverage",
+            }}, application.bot))
+            await done
+            phases["first_update"] = time.perf_counter() - started
+            await application.stop()
+
+    asyncio.run(first_update())
+    phases["total"] = time.time() - t0
+    engbot.db.close()
+    print(json.dumps(phases))
+
+
+def run_child(args, cwd):
+    command = [sys.executable, os.path.abspath(__file__), "--child",
+               "--telegram-latency", args.telegram_latency, "--gemini-latency", args.gemini_latency]
+    env = bench_env(BENCH_T0=repr(time.time()))
+    proc = subprocess.run(command, cwd=cwd, env=env, capture_output=True, text=True)
+    if proc.returncode:
+        raise RuntimeError(proc.stderr)
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="сколько импортов показать")
+    parser.add_argument("--telegram-latency", default="const:0")
+    parser.add_argument("--gemini-latency", default="const:0")
+    parser.add_argument("--out", help="куда записать JSON с результатами")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args)
+        return
+
+    from bench_replay import git_commit
+
+    with tempfile.TemporaryDirectory() as tmp:
+        profile = import_profile(tmp, args.top)
+        # Первый прогон создаёт базу и .pyc — его не считаем
+        run_child(args, tmp)
+        runs = [run_child(args, tmp) for _ in range(args.runs)]
+
+    medians = {phase: round(statistics.median(run[phase] for run in runs) * 1000, 1) for phase in PHASES}
+    print(f"import engbot: {profile['total_ms']} ms, {profile['modules']} modules")
+    for item in profile["top"]:
+        print(f"  {item['cumulative_ms']:>8} ms  {item['module']}")
+    print(f"heavy packages loaded by import: {profile['heavy_loaded'] or 'none'}")
+    print(f"time to first update (median of {args.runs}, PREWARM={os.getenv('PREWARM', '1')}):")
+    for phase in PHASES:
+        print(f"  {phase:13} {medians[phase]:>8} ms")
+
+    if args.out:
+        os.makedirs(os.path.dirname(os.path.abspath(args.out)), exist_ok=True)
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({
+                "commit": git_commit(), "config": vars(args), "import": profile,
+                "median_ms": medians, "runs": runs,
+            }, f, ensure_ascii=False, indent=2)
+        print(f"saved to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
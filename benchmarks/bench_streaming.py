@@ -0,0 +1,96 @@
+"""Бенчмарк стриминга ответа: время до первого текста и число правок.
+
+Фейковый клиент отдаёт JSON-ответ кусками с задержкой, фейковое
+сообщение Telegram записывает отправку и правки.
+
+    python benchmarks/bench_streaming.py --chunks 40 --chunk-delay 0.1
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from cards import parse_answer, partial_reply  # noqa: E402
+from streaming import StreamingReply  # noqa: E402
+
+
+class FakeStreamingClient:
+    def __init__(self, text, chunks, first_delay, chunk_delay):
+        self.raw = json.dumps({"reply": text, "card": None}, ensure_ascii=False)
+        self.chunks = chunks
+        self.first_delay = first_delay
+        self.chunk_delay = chunk_delay
+
+    async def generate_content(self):
+        await asyncio.sleep(self.first_delay + self.chunk_delay * (self.chunks - 1))
+        return SimpleNamespace(text=self.raw)
+
+    async def generate_content_stream(self):
+        size = -(-len(self.raw) // self.chunks)
+
+        async def gen():
+            await asyncio.sleep(self.first_delay)
+            for i in range(0, len(self.raw), size):
+                if i:
+                    await asyncio.sleep(self.chunk_delay)
+                yield SimpleNamespace(text=self.raw[i:i + size])
+        return gen()
+
+
+class FakeMessage:
+    def __init__(self):
+        self.started = time.monotonic()
+        self.first_text = None
+        self.edits = 0
+
+    async def reply_text(self, text, reply_markup=None):
+        if self.first_text is None:
+            self.first_text = time.monotonic() - self.started
+        return self
+
+    async def edit_text(self, text, reply_markup=None):
+        self.edits += 1
+
+
+async def run_blocking(client):
+    message = FakeMessage()
+    response = await client.generate_content()
+    reply, _ = parse_answer(response.text)
+    await message.reply_text(reply)
+    return message.first_text, time.monotonic() - message.started, 0
+
+
+async def run_streaming(client):
+    message = FakeMessage()
+    stream = StreamingReply(message)
+    raw = ""
+    async for chunk in await client.generate_content_stream():
+        raw += chunk.text
+        await stream.update(partial_reply(raw))
+    reply, _ = parse_answer(raw)
+    await stream.finish(reply)
+    return message.first_text, time.monotonic() - message.started, message.edits
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chars", type=int, default=2500)
+    parser.add_argument("--chunks", type=int, default=40)
+    parser.add_argument("--first-delay", type=float, default=0.4)
+    parser.add_argument("--chunk-delay", type=float, default=0.1)
+    args = parser.parse_args()
+
+    text = ("**Leverage** — рычаг, влияние [ˈlevərɪdʒ]\n" * 100)[: args.chars]
+    client = FakeStreamingClient(text, args.chunks, args.first_delay, args.chunk_delay)
+    for name, runner in (("blocking", run_blocking), ("streaming", run_streaming)):
+        ttfb, total, edits = asyncio.run(runner(client))
+        print(f"{name:10s} time-to-first-text={ttfb * 1000:7.0f}ms  total={total * 1000:7.0f}ms  edits={edits}")
+
+
+if __name__ == "__main__":
+    main()
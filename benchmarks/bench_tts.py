@@ -0,0 +1,141 @@
+"""Бенчмарк кнопки Listen на длинных ответах: извлечение текста и синтез с заглушкой edge-tts.
+
+Заглушка синтезирует base + per_char * len(text) секунд — как edge-tts,
+чьё время растёт с длиной текста. Сравниваются:
+    old    — прежний clean_for_tts (всё ASCII, обрезка до 1000 символов) и один запрос;
+    single — новое извлечение, но один запрос на весь текст;
+    concat — части параллельно, склеенные в одно голосовое;
+    stream — каждая часть отдельным голосовым, по мере готовности.
+Для каждого режима — время до первого голосового (time-to-first-audio),
+до последнего и сколько символов озвучено. Кэш и file_id холодные.
+
+    python benchmarks/bench_tts.py --base 0.35 --per-char 0.002 --replies 20
+"""
+import argparse
+import asyncio
+import os
+import re
+import statistics
+import sys
+import tempfile
+import time
+import timeit
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from tts import TTSCache, extract_speech  # noqa: E402
+
+# Ответ по сценарию 3 — английского в нём много, ради таких ответов и режем на части
+REPLY = """🗣 1. **Перевод:** Я думал о нашем проекте весь день и хочу обсудить сроки.
+2. **Оценка:**
+   - 📉 **Ошибки:** "I was thinking about our project all the day" → "I've been thinking about our project all day." (артикль лишний)
+   - 📈 **Апгрейд:** "Our project has been on my mind all day, and I'd like to go over the timeline with you."
+3. **Ответ:** That's totally understandable, deadlines can be stressful! {body}
+Let me know which part worries you the most, and we can break it down together step by step.
+"""
+BODY_SENTENCES = [
+    "When a timeline feels tight, it usually helps to list every task and estimate it honestly.",
+    "Once you see everything in one place, you can decide what really has to ship first.",
+    "It's also worth asking your manager which features are truly essential for the launch.",
+    "Sometimes the scope can be reduced without anyone noticing the difference.",
+    "If a task depends on another team, reach out early instead of waiting until the last week.",
+    "And don't forget to leave some buffer for testing, because that's where surprises usually hide.",
+]
+
+
+def old_clean_for_tts(text):
+    """Прежний вариант из engbot.py — для сравнения."""
+    clean = text.replace('*', '').replace('_', '')
+    clean_english_only = re.sub(r'[^\x00-\x7F]+', '', clean)
+    return " ".join(clean_english_only.split())[:1000]
+
+
+def make_reply(i, sentences):
+    body = " ".join(BODY_SENTENCES[(i + k) % len(BODY_SENTENCES)] for k in range(sentences))
+    # Номер в начале: после обрезки до 1000 символов ответы всё равно разные
+    return REPLY.format(body=f"Reply {i}. {body}")
+
+
+class StubSynth:
+    def __init__(self, base, per_char):
+        self.base = base
+        self.per_char = per_char
+        self.calls = 0
+
+    async def __call__(self, text, voice, path):
+        self.calls += 1
+        await asyncio.sleep(self.base + self.per_char * len(text))
+        with open(path, "wb") as f:
+            f.write(b"\xff\xf3" + bytes(len(text) * 40))
+
+
+class StubFileIds:
+    """Вместо AsyncDatabase: file_id ещё нет ни для одного текста."""
+
+    async def get_tts_file_id(self, key):
+        return None
+
+    async def put_tts_file_id(self, key, file_id):
+        pass
+
+
+class StubBot:
+    def __init__(self):
+        self.sent = []
+
+    async def send_voice(self, chat_id, voice):
+        self.sent.append(time.perf_counter())
+        return SimpleNamespace(voice=None)
+
+
+async def listen(mode, texts, synth, tmp):
+    """Нажатия Listen по одному на каждый текст (все разом); время первого и последнего голосового."""
+    cache = TTSCache(StubFileIds(), directory=os.path.join(tmp, mode),
+                     mode="single" if mode == "old" else mode, synthesize=synth)
+
+    async def one(chat_id, text):
+        bot = StubBot()
+        started = time.perf_counter()
+        await cache.send_voice(bot, chat_id, text)
+        return bot.sent[0] - started, bot.sent[-1] - started, len(bot.sent)
+
+    return await asyncio.gather(*(one(i, text) for i, text in enumerate(texts)))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--replies", type=int, default=20, help="одновременных нажатий Listen")
+    parser.add_argument("--sentences", type=int, default=12, help="предложений в теле ответа")
+    parser.add_argument("--base", type=float, default=0.35, help="задержка синтеза на запрос, с")
+    parser.add_argument("--per-char", type=float, default=0.002, help="задержка синтеза на символ, с")
+    args = parser.parse_args()
+
+    replies = [make_reply(i, args.sentences) for i in range(args.replies)]
+    sample = replies[0]
+    n = 2000
+    old_us = timeit.timeit(lambda: old_clean_for_tts(sample), number=n) / n * 1e6
+    new_us = timeit.timeit(lambda: extract_speech(sample), number=n) / n * 1e6
+    print(f"reply: {len(sample)} chars; extraction: old {old_us:.1f} µs, new {new_us:.1f} µs")
+    print(f"  old: {old_clean_for_tts(sample)[:120]!r}...")
+    print(f"  new: {extract_speech(sample)[:120]!r}...")
+
+    old_texts = [old_clean_for_tts(reply) for reply in replies]
+    new_texts = [extract_speech(reply) for reply in replies]
+    print(f"spoken chars per reply: old {len(old_texts[0])} (cut at 1000), new {len(new_texts[0])}")
+    print(f"{args.replies} concurrent Listen clicks, synth = {args.base}s + {args.per_char * 1000:.1f}ms/char")
+    print(f"{'mode':8} {'first p50':>10} {'first max':>10} {'last p50':>10} {'voices':>7} {'synth calls':>12}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in ("old", "single", "concat", "stream"):
+            synth = StubSynth(args.base, args.per_char)
+            texts = old_texts if mode == "old" else new_texts
+            results = asyncio.run(listen(mode, texts, synth, tmp))
+            first = [r[0] for r in results]
+            last = [r[1] for r in results]
+            print(f"{mode:8} {statistics.median(first):>9.2f}s {max(first):>9.2f}s "
+                  f"{statistics.median(last):>9.2f}s {results[0][2]:>7} {synth.calls:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""Бенчмарк голосового пайплайна против заглушки genai.Client.
+
+Сравнивает старую схему (синхронная загрузка + опрос раз в секунду)
+с новой (inline до порога, async-загрузка с экспоненциальным опросом)
+и печатает время по стадиям: download, upload, processing, generation.
+Заодно меряет, насколько event loop "замерзает" при параллельных голосовых.
+
+    python benchmarks/bench_voice.py --concurrent 10
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import voice  # noqa: E402
+
+
+class StubFile:
+    def __init__(self, processing_polls):
+        self.name = "files/stub"
+        self.uri = "https://stub/files/stub"
+        self.mime_type = voice.VOICE_MIME_TYPE
+        self.polls_left = processing_polls
+
+    @property
+    def state(self):
+        return SimpleNamespace(name="PROCESSING" if self.polls_left > 0 else "ACTIVE")
+
+
+class StubClient:
+    """Имитирует genai.Client: sync files.* блокируют поток, aio.* — нет."""
+
+    def __init__(self, upload_latency, processing_time, generation_latency):
+        self.upload_latency = upload_latency
+        self.processing_time = processing_time
+        self.generation_latency = generation_latency
+        self.files = SimpleNamespace(upload=self._sync_upload, get=self._sync_get)
+        self.aio = SimpleNamespace(
+            files=SimpleNamespace(upload=self._upload, get=self._get, delete=self._delete),
+            models=SimpleNamespace(generate_content=self._generate),
+        )
+
+    def _new_file(self):
+        f = StubFile(processing_polls=1)
+        f.ready_at = time.monotonic() + self.processing_time
+        return f
+
+    def _refresh(self, f):
+        if time.monotonic() >= f.ready_at:
+            f.polls_left = 0
+        return f
+
+    def _sync_upload(self, file, config):
+        time.sleep(self.upload_latency)
+        return self._new_file()
+
+    def _sync_get(self, name):
+        time.sleep(0.01)
+        return self._refresh(self._last)
+
+    async def _upload(self, file, config):
+        await asyncio.sleep(self.upload_latency)
+        self._last = self._new_file()
+        return self._last
+
+    async def _get(self, name):
+        await asyncio.sleep(0.01)
+        return self._refresh(self._last)
+
+    async def _delete(self, name):
+        await asyncio.sleep(0.01)
+
+    async def _generate(self, model, contents, config):
+        await asyncio.sleep(self.generation_latency)
+        return SimpleNamespace(text="stub reply")
+
+
+class StubTelegramFile:
+    def __init__(self, size, latency):
+        self.size = size
+        self.latency = latency
+
+    async def download_as_bytearray(self):
+        await asyncio.sleep(self.latency)
+        return bytearray(self.size)
+
+
+class StubBot:
+    def __init__(self, size, latency):
+        self.size = size
+        self.latency = latency
+
+    async def get_file(self, file_id):
+        return StubTelegramFile(self.size, self.latency)
+
+
+async def old_pipeline(client, bot, timings):
+    """Схема до изменений: sync upload и опрос раз в секунду."""
+    audio = await voice.download_voice(bot, "voice", timings)
+    with timings.measure("upload"):
+        uploaded = client.files.upload(file=audio, config={"mime_type": voice.VOICE_MIME_TYPE})
+        client._last = uploaded
+    with timings.measure("processing"):
+        while uploaded.state.name == "PROCESSING":
+            await asyncio.sleep(1)
+            uploaded = client.files.get(name=uploaded.name)
+    with timings.measure("generation"):
+        await client.aio.models.generate_content(model="m", contents=[], config=None)
+
+
+async def new_pipeline(client, bot, timings):
+    audio = await voice.download_voice(bot, "voice", timings)
+    await voice.answer_voice(client, "m", audio, "prompt", timings)
+
+
+async def loop_lag_probe(stop, samples):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.01)
+        samples.append(time.perf_counter() - start - 0.01)
+
+
+async def run(pipeline, args, size):
+    client = StubClient(args.upload_latency, args.processing_time, args.generation_latency)
+    bot = StubBot(size, args.download_latency)
+    stop = asyncio.Event()
+    lag = []
+    probe = asyncio.create_task(loop_lag_probe(stop, lag))
+    all_timings = [voice.Timings() for _ in range(args.concurrent)]
+    start = time.perf_counter()
+    await asyncio.gather(*(pipeline(client, bot, t) for t in all_timings))
+    total = time.perf_counter() - start
+    stop.set()
+    await probe
+    stages = {}
+    for t in all_timings:
+        for stage, value in t.items():
+            stages.setdefault(stage, []).append(value)
+    parts = " ".join(f"{k}={statistics.mean(v) * 1000:.0f}ms" for k, v in stages.items())
+    return total, max(lag) * 1000 if lag else 0.0, parts
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrent", type=int, default=10)
+    parser.add_argument("--download-latency", type=float, default=0.05)
+    parser.add_argument("--upload-latency", type=float, default=0.3)
+    parser.add_argument("--processing-time", type=float, default=0.2)
+    parser.add_argument("--generation-latency", type=float, default=1.0)
+    args = parser.parse_args()
+
+    small = 64 * 1024
+    large = voice.INLINE_AUDIO_LIMIT + 1
+    for name, pipeline, size in (
+        ("old (sync upload)", old_pipeline, small),
+        ("new (inline)", new_pipeline, small),
+        ("new (Files API)", new_pipeline, large),
+    ):
+        total, lag, parts = asyncio.run(run(pipeline, args, size))
+        print(f"{name:18s} wall={total:6.2f}s  max loop lag={lag:7.1f}ms  {parts}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,171 @@
+"""Проверка аренды напоминаний: несколько процессов, ни одного дубля.
+
+Засевает базу словами, которым пора на повтор, и запускает N процессов,
+которые одновременно крутят тот же цикл, что send_due_reminders:
+claim_due_words -> "отправка" -> finish_claimed_words. Часть "отправок"
+случайно не удаётся — такие слова должны вернуться и уйти позже. В конце
+каждое слово должно быть отправлено ровно один раз.
+
+С --dispatcher каждый процесс гоняет настоящий dispatcher.dispatch_leased
+(ReminderDispatcher с лимитом на чат) против фейкового бота. Чатов мало, а
+аренда короткая (--lease), так что страница рассылается дольше аренды —
+как чат с сотнями слов после /import при 1 сообщении/с. Без продления
+аренды здесь появляются дубли.
+
+    python benchmarks/check_reminder_leases.py --workers 8 --words 20000
+    python benchmarks/check_reminder_leases.py --dispatcher --workers 4 --words 2000 --users 4 --lease 2
+"""
+import argparse
+import asyncio
+import collections
+import datetime
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from telegram.error import BadRequest  # noqa: E402
+
+from database import AsyncDatabase, Database  # noqa: E402
+from dispatcher import ReminderDispatcher, dispatch_leased  # noqa: E402
+
+
+def seed(path, words, users):
+    db = Database(path)
+    past = int((datetime.datetime.now() - datetime.timedelta(minutes=5)).timestamp())
+    with db.connection:
+        db.connection.executemany(
+            "INSERT INTO words (user_id, word, short_translation, next_review, stage) VALUES (?, ?, 'x', ?, 1)",
+            ((i % users, f"word{i}", past) for i in range(words)),
+        )
+    db.close()
+
+
+def worker(index, path, page_size, fail_share, rounds, results):
+    owner = f"test:{index}"
+    rnd = random.Random(index)
+    db = Database(path)
+    sent = []
+    idle = 0
+    while idle < rounds:
+        rows = db.claim_due_words(owner, limit=page_size)
+        if not rows:
+            idle += 1
+            time.sleep(0.01)
+            continue
+        idle = 0
+        ok = [row[0] for row in rows if rnd.random() >= fail_share]
+        failed = [row[0] for row in rows if row[0] not in set(ok)]
+        sent.extend(ok)
+        # Без паузы перед повтором: неудачные сразу возвращаются в общую очередь
+        db.finish_claimed_words(owner, ok, failed, retry_seconds=0)
+    db.close()
+    results.put((index, sent))
+
+
+class FakeBot:
+    """Отправка занимает latency; часть сообщений падает с постоянной ошибкой."""
+
+    def __init__(self, latency, fail_share, seed):
+        self.latency = latency
+        self.fail_share = fail_share
+        self.rnd = random.Random(seed)
+        self.sent = []
+
+    async def send_message(self, chat_id, text):
+        await asyncio.sleep(self.latency)
+        if self.rnd.random() < self.fail_share:
+            raise BadRequest("Chat not found")
+        self.sent.append(int(text))
+
+
+async def dispatch_loop(index, path, args):
+    db = AsyncDatabase(path, workers=2)
+    bot = FakeBot(0.005, args.fail_share, index)
+    dispatcher = ReminderDispatcher(bot, global_rate=1000, per_chat_rate=args.chat_rate, per_chat_burst=1)
+    idle = 0
+    # Без продления аренды воркеры бесконечно пересылают чужие страницы — ограничиваем время
+    deadline = time.monotonic() + args.timeout
+    try:
+        while idle < args.idle_rounds and time.monotonic() < deadline:
+            pages = await dispatch_leased(
+                dispatcher, db, f"test:{index}", lambda row: (row[0], row[1], {"text": str(row[0])}),
+                lease_seconds=args.lease, retry_seconds=0, page_size=args.page_size
+            )
+            idle = 0 if pages else idle + 1
+            await asyncio.sleep(0.05)
+    finally:
+        db.close()
+    return bot.sent
+
+
+def dispatcher_worker(index, path, args, results):
+    import builtins
+    # Ошибки фейкового бота ожидаемы — не засоряем вывод
+    builtins.print = lambda *a, **k: None
+    results.put((index, asyncio.run(dispatch_loop(index, path, args))))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--words", type=int, default=20_000)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--page-size", type=int, default=200)
+    parser.add_argument("--fail-share", type=float, default=0.05)
+    parser.add_argument("--idle-rounds", type=int, default=20)
+    parser.add_argument("--dispatcher", action="store_true", help="через dispatch_leased и ReminderDispatcher")
+    parser.add_argument("--lease", type=int, default=2, help="аренда для --dispatcher, с")
+    parser.add_argument("--chat-rate", type=float, default=20, help="сообщений/с в один чат для --dispatcher")
+    parser.add_argument("--timeout", type=float, default=120, help="предел времени для --dispatcher, с")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "leases.db")
+        seed(path, args.words, args.users)
+
+        context = multiprocessing.get_context("spawn")
+        results = context.Queue()
+        if args.dispatcher:
+            processes = [
+                context.Process(target=dispatcher_worker, args=(i, path, args, results))
+                for i in range(args.workers)
+            ]
+        else:
+            processes = [
+                context.Process(target=worker, args=(
+                    i, path, args.page_size, args.fail_share, args.idle_rounds, results
+                ))
+                for i in range(args.workers)
+            ]
+        start = time.perf_counter()
+        for process in processes:
+            process.start()
+        sent_by = dict(results.get() for _ in processes)
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - start
+
+        db = Database(path)
+        leased = db.connection.execute("SELECT count(*) FROM words WHERE lease_owner IS NOT NULL").fetchone()[0]
+        db.close()
+
+    counts = collections.Counter(word_id for sent in sent_by.values() for word_id in sent)
+    duplicates = sum(1 for n in counts.values() if n > 1)
+    missing = args.words - len(counts)
+    per_worker = ", ".join(f"{i}: {len(sent_by[i])}" for i in sorted(sent_by))
+    print(f"{args.workers} workers, {args.words} words in {elapsed:.1f}s")
+    print(f"sent per worker: {per_worker}")
+    print(f"duplicates: {duplicates}, never sent: {missing}, still leased: {leased}")
+    if duplicates or missing or leased:
+        print("FAIL")
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
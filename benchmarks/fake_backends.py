@@ -0,0 +1,211 @@
+"""Фейковые Bot API, Gemini и edge-tts для офлайн-бенчмарков (bench_replay.py).
+
+Задержки задаются строкой распределения:
+    const:0.2            — всегда 0.2 с
+    uniform:0.1,0.5      — равномерно
+    lognormal:0.8,0.5    — медиана 0.8 с, sigma 0.5 (похоже на реальный API)
+"""
+import asyncio
+import collections
+import itertools
+import json
+import math
+import random
+import time
+
+from telegram.request import BaseRequest
+
+
+def parse_latency(spec, rnd=None):
+    """Строка распределения -> функция без аргументов, возвращающая секунды."""
+    rnd = rnd or random.Random(0)
+    kind, _, params = spec.partition(":")
+    values = [float(v) for v in params.split(",")] if params else []
+    if kind == "const":
+        return lambda: values[0]
+    if kind == "uniform":
+        return lambda: rnd.uniform(values[0], values[1])
+    if kind == "lognormal":
+        mu = math.log(values[0])
+        return lambda: rnd.lognormvariate(mu, values[1])
+    raise ValueError(f"unknown latency distribution: {spec}")
+
+
+class FakeTelegram:
+    """Общее состояние фейкового Bot API: счётчики, message_id, последние сообщения чатов."""
+
+    def __init__(self, latency):
+        self.latency = latency
+        self.message_ids = itertools.count(1_000_000)
+        self.calls = collections.Counter()
+        # chat_id -> {"reply" | "words": message_id последнего сообщения с такими кнопками}
+        self.keyboards = collections.defaultdict(dict)
+        self.sent = collections.Counter()
+
+    def message(self, params, **extra):
+        chat_id = int(params.get("chat_id", 0))
+        message_id = int(params["message_id"]) if "message_id" in params else next(self.message_ids)
+        markup = params.get("reply_markup") or ""
+        if not isinstance(markup, str):
+            # PTB отдаёт разметку словарём — к JSON, чтобы искать callback_data в кавычках
+            markup = json.dumps(markup)
+        if '"tts"' in markup:
+            self.keyboards[chat_id]["reply"] = message_id
+        elif "mw:" in markup:
+            self.keyboards[chat_id]["words"] = message_id
+        self.sent[chat_id] += 1
+        return {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": {"id": 1, "is_bot": True, "first_name": "engbot"},
+            "text": params.get("text") or "",
+            **extra,
+        }
+
+    def result(self, endpoint, params):
+        if endpoint == "getMe":
+            return {"id": 1, "is_bot": True, "first_name": "engbot", "username": "engbot_bench_bot",
+                    "can_join_groups": False, "can_read_all_group_messages": False,
+                    "supports_inline_queries": False}
+        if endpoint in ("sendMessage", "editMessageText", "sendDocument"):
+            return self.message(params)
+        if endpoint == "sendVoice":
+            message_id = next(self.message_ids)
+            return self.message(params, voice={"file_id": f"voice{message_id}",
+                                               "file_unique_id": f"u{message_id}", "duration": 3})
+        if endpoint == "getFile":
+            return {"file_id": params["file_id"], "file_unique_id": "u" + params["file_id"],
+                    "file_size": 24_000, "file_path": f"voice/{params['file_id']}.oga"}
+        if endpoint == "getUpdates":
+            return []
+        # sendChatAction, answerCallbackQuery, setWebhook, deleteWebhook, ...
+        return True
+
+
+class FakeRequest(BaseRequest):
+    """Транспорт PTB без сети: отвечает как Bot API, с заданной задержкой."""
+
+    def __init__(self, telegram):
+        self.telegram = telegram
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None):
+        await asyncio.sleep(self.telegram.latency())
+        if "/file/bot" in url:
+            # Скачивание голосового: ~2 секунды OGG
+            self.telegram.calls["downloadFile"] += 1
+            return 200, b"OggS" + bytes(24_000)
+        endpoint = url.rsplit("/", 1)[-1]
+        self.telegram.calls[endpoint] += 1
+        params = request_data.parameters if request_data else {}
+        body = {"ok": True, "result": self.telegram.result(endpoint, params)}
+        return 200, json.dumps(body).encode("utf-8")
+
+
+REPLY_TEXT = (
+    "1. **Перевод:** {word} — перевод [ˈwɜːd].\n"
+    "2. **Контексты:**\n"
+    "   - 🏢 **Бизнес:** We need to {word} our existing network to close the deal.\n"
+    "   - 🗣 **Разговорный:** I didn't expect him to {word} it like that.\n"
+    "3. **Коллокации:** {word} the market (рынок), {word} a deal (сделка).\n"
+    "4. **Нюансы:** Слово чаще встречается в деловой речи, чем в разговорной.\n"
+    "5. **Синонимы:** use, exploit, capitalize on.\n"
+)
+
+
+class _Response:
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeModels:
+    """client.aio.models: задержка = распределение модели + per_kchar секунд на 1000 символов промпта.
+
+    model_latency — {модель: функция задержки} для моделей быстрее/медленнее основной.
+    """
+
+    def __init__(self, latency, per_kchar=0.0, model_latency=None, stream_chunk=80, chunk_latency=0.05):
+        self.latency = latency
+        self.per_kchar = per_kchar
+        self.model_latency = model_latency or {}
+        self.stream_chunk = stream_chunk
+        self.chunk_latency = chunk_latency
+        self.calls = collections.Counter()
+        self.prompt_chars = 0
+
+    def _answer(self, model, contents, config):
+        """(текст ответа, задержка до первого токена)."""
+        self.calls[model] += 1
+        text = contents if isinstance(contents, str) else "voice"
+        system = getattr(config, "system_instruction", None) or ""
+        chars = len(str(system)) + len(str(text))
+        self.prompt_chars += chars
+        delay = self.model_latency.get(model, self.latency)() + self.per_kchar * chars / 1000
+        reply = REPLY_TEXT.format(word=str(text)[:40])
+        if getattr(config, "response_mime_type", None) == "application/json":
+            reply = json.dumps({"reply": reply, "card": {
+                "word": str(text)[:40], "translation": "перевод",
+                "example": f"Use {str(text)[:20]} wisely.", "example_translation": "Пример.",
+            }}, ensure_ascii=False)
+        return reply, delay
+
+    async def get(self, model):
+        # prewarm: лёгкий запрос, открывающий соединение
+        self.calls["get"] += 1
+        await asyncio.sleep(self.latency())
+        return _Response(model)
+
+    async def generate_content(self, model, contents, config=None):
+        text, delay = self._answer(model, contents, config)
+        await asyncio.sleep(delay)
+        return _Response(text)
+
+    async def generate_content_stream(self, model, contents, config=None):
+        text, delay = self._answer(model, contents, config)
+
+        async def chunks():
+            await asyncio.sleep(delay)
+            for i in range(0, len(text), self.stream_chunk):
+                yield _Response(text[i:i + self.stream_chunk])
+                await asyncio.sleep(self.chunk_latency)
+
+        return chunks()
+
+
+class _FakeAio:
+    def __init__(self, models):
+        self.models = models
+
+
+class FakeGenaiClient:
+    """То, что бот использует от genai.Client: client.aio.models.generate_content(_stream)."""
+
+    def __init__(self, latency, per_kchar=0.0, model_latency=None):
+        self.models = FakeModels(latency, per_kchar, model_latency)
+        self.aio = _FakeAio(self.models)
+
+
+class FakeCommunicate:
+    """Подмена edge_tts.Communicate: пишет пустой mp3 после задержки синтеза."""
+    latency = staticmethod(lambda: 0.5)
+    calls = 0
+
+    def __init__(self, text, voice):
+        self.text = text
+
+    async def save(self, path):
+        FakeCommunicate.calls += 1
+        await asyncio.sleep(self.latency())
+        with open(path, "wb") as f:
+            f.write(b"ID3" + bytes(len(self.text) * 40))
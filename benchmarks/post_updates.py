@@ -0,0 +1,78 @@
+"""POST-ит записанные апдейты Telegram в локальный webhook-сервер бота.
+
+Апдейты — JSON-массив или JSONL (по апдейту в строке), как их присылает
+Telegram. Бот запускается без WEBHOOK_URL, чтобы setWebhook не вызывался:
+
+    BOT_MODE=webhook WEBHOOK_SECRET=test python engbot.py
+    python benchmarks/post_updates.py benchmarks/updates/sample.jsonl --secret test
+
+Печатает коды ответов и задержку приёма. Ответы бота уходят в настоящий
+Bot API, так что для нагрузки берите тестовый токен и свои chat_id.
+"""
+import argparse
+import collections
+import json
+import os
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from webserver import SECRET_HEADER, WEBHOOK_PATH  # noqa: E402
+
+
+def load_updates(path):
+    with open(path, encoding="utf-8") as f:
+        text = f.read().strip()
+    if text.startswith("["):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def post(url, update, secret):
+    request = urllib.request.Request(
+        url, data=json.dumps(update).encode("utf-8"), method="POST",
+        headers={"Content-Type": "application/json"}
+    )
+    if secret:
+        request.add_header(SECRET_HEADER, secret)
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            status = response.status
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except urllib.error.URLError as e:
+        status = f"error: {e.reason}"
+    return status, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("updates", help="JSON-массив или JSONL с апдейтами")
+    parser.add_argument("--url", default=f"http://127.0.0.1:{os.environ.get('PORT', 10000)}{WEBHOOK_PATH}")
+    parser.add_argument("--secret", default=os.environ.get("WEBHOOK_SECRET"))
+    parser.add_argument("--repeat", type=int, default=1, help="сколько раз прогнать весь файл")
+    parser.add_argument("--concurrency", type=int, default=1)
+    args = parser.parse_args()
+
+    updates = load_updates(args.updates) * args.repeat
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(lambda u: post(args.url, u, args.secret), updates))
+    total = time.perf_counter() - start
+
+    codes = collections.Counter(status for status, _ in results)
+    latencies = sorted(latency for _, latency in results)
+    print(f"posted {len(updates)} updates in {total:.2f}s ({len(updates) / total:.0f}/s)")
+    print(f"status: {dict(codes)}")
+    if latencies:
+        print(f"accept latency p50 {latencies[len(latencies) // 2] * 1000:.1f} ms, "
+              f"max {latencies[-1] * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
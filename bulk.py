@@ -0,0 +1,137 @@
+import asyncio
+import csv
+import io
+import json
+import re
+import tempfile
+
+from pydantic import TypeAdapter
+
+from cards import Card, card_columns, format_card
+
+# Больше за один импорт не берём
+MAX_IMPORT_WORDS = 2000
+# Слов в одном запросе к Gemini и сколько таких запросов идут параллельно
+CARD_BATCH_SIZE = 25
+CARD_BATCH_CONCURRENCY = 4
+
+SPLIT_RE = re.compile(r"[\n;]+")
+CARD_LIST = TypeAdapter(list[Card])
+
+
+def parse_pasted(text):
+    """Слова из вставленного списка: по строке (или через ;) на слово.
+
+    Строка вида "word — перевод" сразу даёт перевод, без запроса к Gemini.
+    """
+    for line in SPLIT_RE.split(text):
+        yield from _parse_line(line)
+
+
+def parse_document(data):
+    """Слова из CSV/TXT-файла. Первая колонка — слово, вторая (если есть) — перевод."""
+    text = data.decode("utf-8-sig", errors="replace")
+    sample = text[:2048]
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=",;\t")
+    except csv.Error:
+        dialect = csv.excel
+    for row in csv.reader(io.StringIO(text), dialect):
+        if row:
+            yield from _parse_line(*row[:2])
+
+
+def _parse_line(word, translation=None):
+    word = word.strip()
+    if translation is None and " — " in word:
+        word, translation = word.split(" — ", 1)
+    word = word.strip().strip('"')
+    if not word or word.lower() in ("word", "слово"):
+        return
+    translation = translation.strip() if translation else None
+    yield word, translation or None
+
+
+def dedupe(items, existing):
+    """Убирает повторы внутри списка и слова, которые уже есть в словаре."""
+    seen = set(existing)
+    for word, translation in items:
+        if word in seen:
+            continue
+        seen.add(word)
+        yield word, translation
+
+
+def batch_prompt(words):
+    return (
+        "Создай словарные карточки для каждого слова/фразы из списка. "
+        "Для каждого: `word` — ровно как в списке, `translation` — краткий перевод на русском, "
+        "`example` — короткое предложение-пример на английском, `example_translation` — его перевод.\n\n"
+        + json.dumps(words, ensure_ascii=False)
+    )
+
+
+async def generate_cards(client, model, gate, user_id, words,
+                         batch_size=CARD_BATCH_SIZE, concurrency=CARD_BATCH_CONCURRENCY):
+    """Карточки для многих слов: пачками по batch_size в одном запросе, JSON-массивом.
+
+    Возвращает {word: (short_translation, example)}. Слова, на которые модель
+    не ответила, в результат не попадают.
+    """
+    from google.genai import types
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_batch(batch):
+        async with semaphore:
+            response = await gate.run(user_id, lambda: client.aio.models.generate_content(
+                model=model,
+                contents=batch_prompt(batch),
+                config=types.GenerateContentConfig(
+                    response_mime_type="application/json",
+                    response_schema=list[Card]
+                )
+            ), handler="import")
+        try:
+            cards = CARD_LIST.validate_json(response.text)
+        except ValueError as e:
+            print(f"⚠ Import: bad card batch: {e}")
+            return {}
+        wanted = {w.lower(): w for w in batch}
+        return {
+            wanted[card.word.strip().lower()]: card_columns(card)
+            for card in cards if card.word.strip().lower() in wanted
+        }
+
+    batches = [words[i:i + batch_size] for i in range(0, len(words), batch_size)]
+    results = await asyncio.gather(*(run_batch(b) for b in batches), return_exceptions=True)
+    cards = {}
+    for result in results:
+        if isinstance(result, Exception):
+            print(f"⚠ Import: card batch failed: {result}")
+            continue
+        cards.update(result)
+    return cards
+
+
+def write_csv(rows):
+    """CSV (word, translation, example, stage) во временный файл; rows читаются по одной.
+
+    Возвращает путь к файлу — удалить его должен вызывающий.
+    """
+    with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False,
+                                     encoding="utf-8-sig", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["word", "translation", "example", "stage"])
+        writer.writerows(rows)
+        return f.name
+
+
+def write_anki(rows):
+    """TXT для импорта в Anki: "слово<TAB>перевод<br>(пример)"."""
+    with tempfile.NamedTemporaryFile("w", suffix=".txt", delete=False, encoding="utf-8") as f:
+        f.write("#separator:tab\n#html:true\n")
+        for word, short_translation, example, _ in rows:
+            back = format_card(short_translation, example).replace("\t", " ").replace("\n", "<br>")
+            f.write(f"{word}\t{back}\n")
+        return f.name
@@ -0,0 +1,128 @@
+import hashlib
+import re
+import time
+from collections import OrderedDict
+
+# Сценарий 1 — слово или короткая фраза. Длинные тексты и вопросы не кэшируем.
+MAX_CACHEABLE_WORDS = 4
+MAX_CACHEABLE_CHARS = 60
+QUESTION_RE = re.compile(r"\?|^\s*как\b", re.IGNORECASE)
+TRAILING_PUNCT_RE = re.compile(r"[\s.!,;:]+$")
+
+
+def normalize_input(text):
+    """Приводит ввод к виду, по которому считаем ключ: регистр, пробелы, точка в конце."""
+    text = " ".join(text.lower().split())
+    return TRAILING_PUNCT_RE.sub("", text)
+
+
+def is_cacheable(text):
+    """True для слов и коротких фраз (сценарий 1)."""
+    normalized = normalize_input(text)
+    if not normalized or len(normalized) > MAX_CACHEABLE_CHARS:
+        return False
+    if len(normalized.split()) > MAX_CACHEABLE_WORDS:
+        return False
+    return not QUESTION_RE.search(normalized)
+
+
+def prompt_hash(system_prompt):
+    return hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()[:16]
+
+
+class LRUCache:
+    """LRU в памяти с TTL на запись."""
+
+    def __init__(self, max_entries=2000, ttl=24 * 3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.data = OrderedDict()
+
+    def get(self, key):
+        item = self.data.get(key)
+        if item is None:
+            return None
+        value, expires = item
+        if expires < time.monotonic():
+            del self.data[key]
+            return None
+        self.data.move_to_end(key)
+        return value
+
+    def put(self, key, value):
+        self.data[key] = (value, time.monotonic() + self.ttl)
+        self.data.move_to_end(key)
+        while len(self.data) > self.max_entries:
+            self.data.popitem(last=False)
+
+
+class ResponseCache:
+    """Двухуровневый кэш ответов Gemini: LRU в памяти + таблица в SQLite.
+
+    Ключ — нормализованный ввод, модель и хэш системного промпта, так что
+    смена промпта сама делает старые записи недостижимыми (а purge_stale
+    удаляет их с диска). Ответы с другими промптами (сценарии роутера)
+    передают свой хэш в get/put; эти хэши — в prompt_hashes, иначе
+    purge_stale сочтёт такие записи устаревшими.
+    """
+
+    def __init__(self, db, system_prompt, prompt_hashes=(), memory_entries=2000, memory_ttl=24 * 3600,
+                 disk_entries=50_000, disk_ttl=30 * 24 * 3600, evict_every=100):
+        self.db = db
+        self.prompt_hash = prompt_hash(system_prompt)
+        self.prompt_hashes = {self.prompt_hash, *prompt_hashes}
+        self.memory = LRUCache(memory_entries, memory_ttl)
+        self.disk_entries = disk_entries
+        self.disk_ttl = disk_ttl
+        self.evict_every = evict_every
+        self.puts = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        # Суммарное время генерации на промахах — чтобы оценить сэкономленное
+        self.miss_seconds = 0.0
+
+    def key(self, text, model, prompt_hash=None):
+        raw = f"{model}\x00{prompt_hash or self.prompt_hash}\x00{normalize_input(text)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    async def purge_stale(self):
+        """Удаляет с диска ответы, чей промпт не совпадает ни с одним текущим."""
+        return await self.db.purge_cached_responses(sorted(self.prompt_hashes))
+
+    async def get(self, text, model, prompt_hash=None):
+        key = self.key(text, model, prompt_hash)
+        value = self.memory.get(key)
+        if value is not None:
+            self.memory_hits += 1
+            return value
+        value = await self.db.get_cached_response(key, time.time() - self.disk_ttl)
+        if value is not None:
+            self.disk_hits += 1
+            self.memory.put(key, value)
+            return value
+        self.misses += 1
+        return None
+
+    async def put(self, text, model, value, elapsed=0.0, prompt_hash=None):
+        key = self.key(text, model, prompt_hash)
+        self.miss_seconds += elapsed
+        self.memory.put(key, value)
+        await self.db.put_cached_response(key, prompt_hash or self.prompt_hash, value)
+        self.puts += 1
+        if self.puts % self.evict_every == 0:
+            await self.db.evict_cached_responses(self.disk_entries)
+
+    def stats(self):
+        hits = self.memory_hits + self.disk_hits
+        lookups = hits + self.misses
+        avg_miss = self.miss_seconds / self.puts if self.puts else 0.0
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "memory_entries": len(self.memory.data),
+            "saved_seconds": hits * avg_miss,
+            "saved_calls": hits,
+        }
@@ -0,0 +1,92 @@
+import json
+import re
+from typing import Optional
+
+from pydantic import BaseModel
+
+
+class Card(BaseModel):
+    """Словарная карточка для сохранения в базу (только для сценария 1)."""
+    word: str
+    translation: str
+    example: str
+    example_translation: str
+
+
+class Answer(BaseModel):
+    """Структурированный ответ Gemini: текст для пользователя + карточка."""
+    reply: str
+    card: Optional[Card] = None
+
+
+# Добавляется к SYSTEM_PROMPT, когда просим ответ по схеме Answer
+STRUCTURED_INSTRUCTIONS = """
+### ФОРМАТ ОТВЕТА (JSON)
+- В поле `reply` положи весь ответ пользователю, оформленный по правилам выше.
+- В поле `card` (только для СЦЕНАРИЯ 1) положи словарную карточку:
+  `word` — слово/фраза как прислал пользователь, `translation` — краткий перевод на русском,
+  `example` — короткое предложение-пример на английском, `example_translation` — его перевод на русский.
+- Для сценариев 2 и 3 поле `card` не заполняй.
+"""
+
+
+REPLY_KEY_RE = re.compile(r'"reply"\s*:\s*"')
+
+
+def partial_reply(raw):
+    """Поле reply из недописанного JSON (для стриминга ответа по кусочкам)."""
+    match = REPLY_KEY_RE.search(raw)
+    if not match:
+        return ""
+    start = i = match.end()
+    while i < len(raw):
+        if raw[i] == '"':
+            break
+        if raw[i] == '\\':
+            # Обрываем перед незаконченной escape-последовательностью
+            length = 6 if raw[i + 1:i + 2] == 'u' else 2
+            if i + length > len(raw):
+                break
+            i += length
+        else:
+            i += 1
+    text = json.loads('"' + raw[start:i] + '"', strict=False)
+    # Половинка суррогатной пары (\ud83d без второй части) Telegram не примет
+    if text and '\ud800' <= text[-1] <= '\udbff':
+        text = text[:-1]
+    return text
+
+
+def parse_answer(text):
+    """Разбирает JSON-ответ. Возвращает (reply, card) — card может быть None.
+
+    Если модель вернула не JSON, отдаём текст как есть, без карточки.
+    """
+    try:
+        answer = Answer.model_validate(json.loads(text))
+    except (ValueError, TypeError):
+        return text, None
+    return answer.reply, answer.card
+
+
+def card_columns(card):
+    """Карточка -> (short_translation, example) для колонок таблицы words."""
+    return card.translation, f"{card.example} — {card.example_translation}"
+
+
+def split_card_text(text):
+    """Старая строка "Перевод\\n(Example — Пример)" -> (short_translation, example)."""
+    if not text:
+        return text, None
+    short, _, rest = str(text).partition("\n")
+    rest = rest.strip()
+    if rest.startswith("(") and rest.endswith(")"):
+        rest = rest[1:-1].strip()
+    return short.strip(), rest or None
+
+
+def format_card(short_translation, example=None):
+    """Карточка для показа: "Перевод\\n(Example — Пример)"."""
+    if not example:
+        return short_translation or ""
+    return f"{short_translation}\n({example})"
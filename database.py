@@ -1,95 +1,727 @@
 import sqlite3
+import json
 import datetime
+import heapq
+import time
+import threading
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from cards import split_card_text
+from metrics import DB_QUERY
+from scheduler import LEITNER_INTERVALS, ReviewState, schedule
+
+# Сколько строк забираем из базы за один запрос в таймере напоминаний
+REVIEW_PAGE_SIZE = 500
+# На сколько секунд воркер арендует слово, пока рассылает напоминание
+REMINDER_LEASE = 300
+# Через сколько секунд снова пробовать слово, напоминание о котором не ушло
+REMINDER_RETRY = 600
+# Сколько секунд ждать, если база занята другим соединением
+BUSY_TIMEOUT = 5.0
+
+
+class ReviewQueue:
+    """Мин-куча ближайших дат повторения (epoch-секунды).
+
+    Нужна только как подсказка для таймера: сколько можно спать до
+    следующего слова. Устаревшие записи (слово уже повторили или удалили)
+    безвредны — они лишь разбудят таймер чуть раньше, а сами слова всё
+    равно берутся из базы.
+    """
+
+    def __init__(self, max_size=1000):
+        self.max_size = max_size
+        self.heap = []
+        # Куча общая для всех соединений AsyncDatabase (разные потоки)
+        self.lock = threading.Lock()
+
+    def push(self, next_review):
+        with self.lock:
+            heapq.heappush(self.heap, next_review)
+            if len(self.heap) > self.max_size * 2:
+                # Держим кучу компактной: нужны только самые ранние даты
+                self.heap = heapq.nsmallest(self.max_size, self.heap)
+
+    def pop_due(self, now):
+        """Убирает из кучи все даты, которые уже наступили."""
+        with self.lock:
+            while self.heap and self.heap[0] <= now:
+                heapq.heappop(self.heap)
+
+    def peek(self):
+        with self.lock:
+            return self.heap[0] if self.heap else None
+
+    def refill(self, timestamps):
+        heap = list(timestamps)
+        heapq.heapify(heap)
+        with self.lock:
+            self.heap = heap
+
+
+# --- Миграции схемы ---
+# Номер применённой миграции хранится в PRAGMA user_version. Новую миграцию
+# добавляем в конец MIGRATIONS, старые не меняем: по ним обновляются базы,
+# созданные прежними версиями бота.
+
+def _migrate_baseline(connection):
+    """v1: схема до появления версий (базы без user_version проходят её без изменений)."""
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS words (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER,
+            word TEXT,
+            translation TEXT,
+            next_review TIMESTAMP,
+            stage INTEGER DEFAULT 0
+        )
+    """)
+    connection.execute("CREATE INDEX IF NOT EXISTS idx_words_next_review ON words (next_review)")
+    connection.execute("CREATE INDEX IF NOT EXISTS idx_words_user_word ON words (user_id, word)")
+    connection.execute("CREATE INDEX IF NOT EXISTS idx_words_user ON words (user_id)")
+    connection.execute("CREATE INDEX IF NOT EXISTS idx_words_user_stage ON words (user_id, stage)")
+    _migrate_review_columns(connection)
+    # Кэш ответов Gemini (второй уровень после LRU в памяти)
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS response_cache (
+            key TEXT PRIMARY KEY,
+            prompt_hash TEXT,
+            response TEXT,
+            created_at REAL,
+            last_used REAL
+        )
+    """)
+    connection.execute("CREATE INDEX IF NOT EXISTS idx_cache_last_used ON response_cache (last_used)")
+    # Состояние кнопок под ответами бота (см. replies.py)
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS replies (
+            chat_id INTEGER,
+            message_id INTEGER,
+            input TEXT,
+            tts_text TEXT,
+            card TEXT,
+            PRIMARY KEY (chat_id, message_id)
+        )
+    """)
+    # file_id озвучки, которую Telegram уже хранит у себя
+    connection.execute("""
+        CREATE TABLE IF NOT EXISTS tts_file_ids (
+            key TEXT PRIMARY KEY,
+            file_id TEXT
+        )
+    """)
+
+
+def _migrate_review_columns(connection):
+    """Колонки планировщика (scheduler.py) для старых баз.
+
+    Уже повторённым словам (stage > 1) стабильность берём из прежнего
+    интервала их уровня, а дату последнего повтора — отсчётом от next_review.
+    """
+    columns = {row[1] for row in connection.execute("PRAGMA table_info(words)")}
+    if "stability" in columns:
+        return
+    connection.execute("ALTER TABLE words ADD COLUMN ease REAL DEFAULT 2.5")
+    connection.execute("ALTER TABLE words ADD COLUMN stability REAL")
+    connection.execute("ALTER TABLE words ADD COLUMN difficulty REAL")
+    connection.execute("ALTER TABLE words ADD COLUMN last_review TIMESTAMP")
+    cases = " ".join(f"WHEN {stage} THEN {days}" for stage, days in LEITNER_INTERVALS.items())
+    connection.execute(f"""
+        UPDATE words SET
+            stability = CASE stage {cases} ELSE 30 END,
+            difficulty = 5.0
+        WHERE stage > 1
+    """)
+    connection.execute("""
+        UPDATE words SET last_review = datetime(next_review, '-' || CAST(stability AS INTEGER) || ' days')
+        WHERE stability IS NOT NULL
+    """)
+
+
+def _migrate_compact_words(connection):
+    """v2: UNIQUE(user_id, word), даты — целые epoch-секунды, перевод и пример — отдельные колонки.
+
+    Таблицу пересоздаём (SQLite не умеет менять ограничения через ALTER).
+    Дубликаты слов, которые успела наплодить старая проверка SELECT-then-INSERT,
+    схлопываются в самую раннюю запись.
+    """
+    connection.create_function("to_epoch", 1, _to_epoch, deterministic=True)
+    connection.create_function("card_part", 2, lambda text, i: split_card_text(text)[i], deterministic=True)
+    connection.execute("""
+        CREATE TABLE words_v2 (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            word TEXT NOT NULL,
+            short_translation TEXT,
+            example TEXT,
+            next_review INTEGER,
+            stage INTEGER DEFAULT 0,
+            ease REAL DEFAULT 2.5,
+            stability REAL,
+            difficulty REAL,
+            last_review INTEGER,
+            UNIQUE (user_id, word)
+        )
+    """)
+    connection.execute("""
+        INSERT OR IGNORE INTO words_v2
+            (id, user_id, word, short_translation, example, next_review,
+             stage, ease, stability, difficulty, last_review)
+        SELECT id, user_id, word, card_part(translation, 0), card_part(translation, 1),
+               to_epoch(next_review), stage, ease, stability, difficulty, to_epoch(last_review)
+        FROM words ORDER BY id
+    """)
+    connection.execute("DROP TABLE words")
+    connection.execute("ALTER TABLE words_v2 RENAME TO words")
+    # (user_id, word) теперь покрывает UNIQUE-индекс. (user_id, next_review) —
+    # покрывающий для get_day_load, idx_words_user нужен для /mywords (порядок по id).
+    connection.execute("CREATE INDEX idx_words_next_review ON words (next_review)")
+    connection.execute("CREATE INDEX idx_words_user ON words (user_id)")
+    connection.execute("CREATE INDEX idx_words_user_stage ON words (user_id, stage)")
+    connection.execute("CREATE INDEX idx_words_user_review ON words (user_id, next_review)")
+    # Маленькие строки с текстовым ключом: WITHOUT ROWID хранит их прямо в B-дереве ключа
+    connection.execute("""
+        CREATE TABLE tts_file_ids_v2 (
+            key TEXT PRIMARY KEY,
+            file_id TEXT
+        ) WITHOUT ROWID
+    """)
+    connection.execute("INSERT INTO tts_file_ids_v2 SELECT key, file_id FROM tts_file_ids")
+    connection.execute("DROP TABLE tts_file_ids")
+    connection.execute("ALTER TABLE tts_file_ids_v2 RENAME TO tts_file_ids")
+
+
+def _migrate_shared_state(connection):
+    """v3: аренда напоминаний (lease) и общее для воркеров состояние пользователей.
+
+    lease_owner/lease_until — какой воркер и до какого момента рассылает
+    напоминание о слове. Ответы бота (replies) переезжают в общую таблицу
+    user_state, с которой работает state.SQLiteStateStore.
+    """
+    connection.execute("ALTER TABLE words ADD COLUMN lease_owner TEXT")
+    connection.execute("ALTER TABLE words ADD COLUMN lease_until INTEGER")
+    connection.execute("""
+        CREATE TABLE user_state (
+            namespace TEXT,
+            chat_id INTEGER,
+            key INTEGER,
+            value TEXT,
+            PRIMARY KEY (namespace, chat_id, key)
+        ) WITHOUT ROWID
+    """)
+    connection.execute("""
+        INSERT INTO user_state (namespace, chat_id, key, value)
+        SELECT 'reply', chat_id, message_id, json_array(input, tts_text, card) FROM replies
+    """)
+    connection.execute("DROP TABLE replies")
+
+
+MIGRATIONS = [_migrate_baseline, _migrate_compact_words, _migrate_shared_state]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def _epoch(moment):
+    return int(moment.timestamp())
+
+
+def _to_epoch(value):
+    """Старая дата-строка (datetime от sqlite3) -> epoch-секунды, с тем же локальным временем."""
+    if value is None or isinstance(value, (int, float)):
+        return value
+    return _epoch(datetime.datetime.fromisoformat(value))
+
+
+def _from_epoch(value):
+    return datetime.datetime.fromtimestamp(value) if value is not None else None
+
 
 class Database:
-    def __init__(self, db_file="vocab.db"):
-        self.connection = sqlite3.connect(db_file, check_same_thread=False)
-        self.cursor = self.connection.cursor()
-        self.create_table()
-
-    def create_table(self):
-        """Создает таблицу, если её нет."""
-        with self.connection:
-            self.cursor.execute("""
-                CREATE TABLE IF NOT EXISTS words (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    user_id INTEGER,
-                    word TEXT,
-                    translation TEXT,
-                    next_review TIMESTAMP,
-                    stage INTEGER DEFAULT 0
-                )
-            """)
+    def __init__(self, db_file="vocab.db", review_queue=None):
+        self.connection = sqlite3.connect(db_file, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        # WAL: читатели не ждут писателя; NORMAL — fsync только на чекпоинтах
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.migrate()
+        # Очередь может быть общей (AsyncDatabase) — тогда её уже заполнили
+        self.review_queue = review_queue or ReviewQueue()
+        if review_queue is None:
+            self.refill_review_queue()
+
+    def close(self):
+        self.connection.close()
+
+    def schema_version(self):
+        return self.connection.execute("PRAGMA user_version").fetchone()[0]
+
+    def migrate(self):
+        """Доводит схему до SCHEMA_VERSION, каждая миграция — в своей транзакции."""
+        while self.schema_version() < SCHEMA_VERSION:
+            with self.connection:
+                # IMMEDIATE: другой процесс не начнёт ту же миграцию параллельно
+                self.connection.execute("BEGIN IMMEDIATE")
+                version = self.schema_version()
+                if version >= SCHEMA_VERSION:
+                    break
+                MIGRATIONS[version](self.connection)
+                self.connection.execute(f"PRAGMA user_version = {version + 1}")
+            print(f"🗄 DB: схема обновлена до версии {version + 1}")
 
-    def add_word(self, user_id, word, translation):
+    def add_word(self, user_id, word, short_translation, example=None):
         """Добавляет слово. Возвращает True, если добавлено, False если уже было."""
+        next_review = _epoch(datetime.datetime.now() + datetime.timedelta(days=1))
         with self.connection:
-            exists = self.cursor.execute("SELECT id FROM words WHERE user_id = ? AND word = ?", (user_id, word)).fetchone()
-            if not exists:
-                next_review = datetime.datetime.now() + datetime.timedelta(days=1)
-                self.cursor.execute(
-                    "INSERT INTO words (user_id, word, translation, next_review, stage) VALUES (?, ?, ?, ?, ?)",
-                    (user_id, word, translation, next_review, 1)
-                )
-                return True
-            return False
+            cursor = self.connection.execute(
+                "INSERT INTO words (user_id, word, short_translation, example, next_review, stage) "
+                "VALUES (?, ?, ?, ?, ?, 1) ON CONFLICT (user_id, word) DO NOTHING",
+                (user_id, word, short_translation, example, next_review)
+            )
+        if cursor.rowcount > 0:
+            self.review_queue.push(next_review)
+            return True
+        return False
 
-    def get_all_words(self, user_id):
-        """Возвращает все слова пользователя для команды /mywords."""
+    def get_existing_words(self, user_id, words):
+        """Какие из words уже есть у пользователя — одним запросом на весь список."""
         with self.connection:
-            return self.cursor.execute(
-                "SELECT word, translation, stage FROM words WHERE user_id = ? ORDER BY id DESC", 
-                (user_id,)
+            rows = self.connection.execute(
+                "SELECT word FROM words WHERE user_id = ? AND word IN (SELECT value FROM json_each(?))",
+                (user_id, json.dumps(list(words)))
             ).fetchall()
+        return {row[0] for row in rows}
 
-    def get_words_to_review(self):
-        """Ищет слова, которые пора повторять (для таймера)."""
-        now = datetime.datetime.now()
+    def add_words(self, user_id, items):
+        """Добавляет пачку (word, short_translation, example) одной транзакцией, пропуская уже существующие.
+
+        Возвращает, сколько слов добавлено.
+        """
+        next_review = _epoch(datetime.datetime.now() + datetime.timedelta(days=1))
+        with self.connection:
+            before = self.connection.total_changes
+            self.connection.executemany(
+                "INSERT INTO words (user_id, word, short_translation, example, next_review, stage) "
+                "VALUES (?, ?, ?, ?, ?, 1) ON CONFLICT (user_id, word) DO NOTHING",
+                [(user_id, word, short_translation, example, next_review)
+                 for word, short_translation, example in items]
+            )
+            added = self.connection.total_changes - before
+        if added:
+            self.review_queue.push(next_review)
+        return added
+
+    def iter_user_words(self, user_id, batch_size=500):
+        """Все слова пользователя потоком (fetchmany), без списка в памяти."""
+        cursor = self.connection.execute(
+            "SELECT word, short_translation, example, stage FROM words WHERE user_id = ? ORDER BY id",
+            (user_id,)
+        )
+        try:
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                yield from rows
+        finally:
+            cursor.close()
+
+    def export_words(self, user_id, write):
+        """Передаёт поток слов пользователя в write(rows) и возвращает её результат."""
+        return write(self.iter_user_words(user_id))
+
+    def get_words_page(self, user_id, before_id=None, after_id=None, stage=0, limit=20, stage_or_higher=False):
+        """Одна страница словаря (keyset по id), новые слова первыми.
+
+        before_id — слова старше этого id (следующая страница), after_id —
+        новее (предыдущая). Берём limit + 1 строку, чтобы понять, есть ли ещё.
+        stage — только этот уровень (0 — все), с stage_or_higher — он и выше.
+        Возвращает (rows, has_more) — строки (id, word, short_translation, stage).
+        """
+        where = "user_id = ?"
+        params = [user_id]
+        if stage:
+            where += " AND stage >= ?" if stage_or_higher else " AND stage = ?"
+            params.append(stage)
+        if after_id is not None:
+            where += " AND id > ?"
+            params.append(after_id)
+            order = "ASC"
+        else:
+            if before_id is not None:
+                where += " AND id < ?"
+                params.append(before_id)
+            order = "DESC"
+        params.append(limit + 1)
+        with self.connection:
+            rows = self.connection.execute(
+                f"SELECT id, word, short_translation, stage FROM words WHERE {where} ORDER BY id {order} LIMIT ?",
+                params
+            ).fetchall()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if order == "ASC":
+            rows.reverse()
+        return rows, has_more
+
+    def get_upcoming_reviews(self, now=None, limit=None):
+        """Ближайшие даты повторения в epoch-секундах (по индексу, без скана таблицы)."""
+        if now is None:
+            now = datetime.datetime.now()
+        if limit is None:
+            limit = self.review_queue.max_size
+        with self.connection:
+            rows = self.connection.execute(
+                "SELECT next_review FROM words WHERE next_review > ? ORDER BY next_review LIMIT ?",
+                (_epoch(now), limit)
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def refill_review_queue(self, now=None):
+        self.review_queue.refill(self.get_upcoming_reviews(now))
+
+    def seconds_until_next_review(self, now=None):
+        """Сколько секунд таймер может спать до следующего слова (None — слов нет)."""
+        if now is None:
+            now = datetime.datetime.now()
+        self.review_queue.pop_due(_epoch(now))
+        if self.review_queue.peek() is None:
+            self.refill_review_queue(now)
+        head = self.review_queue.peek()
+        if head is None:
+            return None
+        return max(0.0, head - now.timestamp())
+
+    def get_day_load(self, user_id, now, days):
+        """Сколько слов пользователя назначено на каждый из ближайших дней: {смещение: count}."""
         with self.connection:
-            return self.cursor.execute(
-                "SELECT id, user_id, word, translation, stage FROM words WHERE next_review <= ?", 
-                (now,)
+            rows = self.connection.execute(
+                "SELECT next_review FROM words WHERE user_id = ? AND next_review > ? AND next_review <= ?",
+                (user_id, _epoch(now), _epoch(now + datetime.timedelta(days=days)))
             ).fetchall()
+        load = {}
+        for (value,) in rows:
+            day = (_from_epoch(value).date() - now.date()).days
+            load[day] = load.get(day, 0) + 1
+        return load
+
+    def review_word(self, word_id, grade, scheduler, now=None):
+        """Применяет оценку (AGAIN..EASY) к слову. Возвращает (stage, next_review) или None.
 
-    def update_word_stage(self, word_id, stage):
-        """Обновляет дату следующего повтора."""
-        # Интервалы: 1 -> 3 -> 7 -> 14 -> 30 дней
-        intervals = {1: 1, 2: 3, 3: 7, 4: 14, 5: 30}
-        days_to_add = intervals.get(stage, 30)
-        
-        next_review = datetime.datetime.now() + datetime.timedelta(days=days_to_add)
-        
-        with self.connection:
-            self.cursor.execute(
-                "UPDATE words SET stage = ?, next_review = ? WHERE id = ?", 
-                (stage, next_review, word_id)
+        Заодно снимает аренду напоминания: если пользователь ответил, пока
+        страница ещё рассылается, finish_claimed_words не перепишет
+        next_review на «через 2 часа».
+        """
+        if now is None:
+            now = datetime.datetime.now()
+        with self.connection:
+            row = self.connection.execute(
+                "SELECT user_id, stage, ease, stability, difficulty, last_review FROM words WHERE id = ?",
+                (word_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            user_id, stage, ease, stability, difficulty, last_review = row
+            state = ReviewState(stage or 1, ease or 2.5, stability, difficulty, _from_epoch(last_review))
+            # Сдвигаем повтор на наименее загруженный день пользователя
+            new_state, next_review = schedule(
+                scheduler, state, grade, now, lambda days: self.get_day_load(user_id, now, days)
             )
+            self.connection.execute(
+                "UPDATE words SET stage = ?, ease = ?, stability = ?, difficulty = ?, "
+                "last_review = ?, next_review = ?, lease_owner = NULL, lease_until = NULL WHERE id = ?",
+                (new_state.stage, new_state.ease, new_state.stability, new_state.difficulty,
+                 _epoch(new_state.last_review), _epoch(next_review), word_id)
+            )
+        self.review_queue.push(_epoch(next_review))
+        return new_state.stage, next_review
 
     def delete_word(self, user_id, word):
         """Удаляет слово по названию (для команды /delete)."""
         with self.connection:
-            self.cursor.execute("DELETE FROM words WHERE user_id = ? AND word = ?", (user_id, word))
-            return self.cursor.rowcount > 0
+            cursor = self.connection.execute("DELETE FROM words WHERE user_id = ? AND word = ?", (user_id, word))
+            return cursor.rowcount > 0
 
     def delete_word_by_id(self, word_id):
         """Удаляет слово по ID (для кнопки)."""
         with self.connection:
-            self.cursor.execute("DELETE FROM words WHERE id = ?", (word_id,))
+            self.connection.execute("DELETE FROM words WHERE id = ?", (word_id,))
 
 
     def get_word_by_id(self, word_id):
-        """Возвращает слово и перевод по ID (для показа ответа)."""
+        """Возвращает (word, short_translation, example) по ID (для показа ответа)."""
         with self.connection:
-            return self.cursor.execute(
-                "SELECT word, translation FROM words WHERE id = ?", 
+            return self.connection.execute(
+                "SELECT word, short_translation, example FROM words WHERE id = ?",
                 (word_id,)
             ).fetchone()
-        
-    def snooze_word(self, word_id, hours=2):
-        """Временно откладывает слово, чтобы бот не спамил каждую минуту, пока ждет ответа."""
-        next_review = datetime.datetime.now() + datetime.timedelta(hours=hours)
-        with self.connection:
-            self.cursor.execute(
-                "UPDATE words SET next_review = ? WHERE id = ?", 
-                (next_review, word_id)
-            )
\ No newline at end of file
+
+    def claim_due_words(self, owner, now=None, lease_seconds=REMINDER_LEASE, limit=REVIEW_PAGE_SIZE):
+        """Забирает в аренду до limit слов, которые пора повторять.
+
+        Слово, уже арендованное другим воркером (и аренда не истекла), не
+        попадёт сюда второй раз — так каждое напоминание уходит один раз,
+        сколько бы процессов ни рассылало. Возвращает строки
+        (id, user_id, word, short_translation, stage). Если воркер упал,
+        аренда истечёт и слово заберёт другой.
+        """
+        if now is None:
+            now = datetime.datetime.now()
+        now = _epoch(now)
+        with self.connection:
+            return self.connection.execute(
+                "UPDATE words SET lease_owner = ?, lease_until = ? WHERE id IN ("
+                "SELECT id FROM words INDEXED BY idx_words_next_review "
+                "WHERE next_review <= ? AND (lease_until IS NULL OR lease_until <= ?) LIMIT ?) "
+                "RETURNING id, user_id, word, short_translation, stage",
+                (owner, now + lease_seconds, now, now, limit)
+            ).fetchall()
+
+    def renew_claimed_words(self, owner, word_ids, lease_seconds=REMINDER_LEASE):
+        """Продлевает аренду слов, которые owner ещё рассылает."""
+        with self.connection:
+            self.connection.execute(
+                "UPDATE words SET lease_until = ? "
+                "WHERE lease_owner = ? AND id IN (SELECT value FROM json_each(?))",
+                (_epoch(datetime.datetime.now()) + lease_seconds, owner, json.dumps(list(word_ids)))
+            )
+
+    def finish_claimed_words(self, owner, sent_ids, failed_ids=(), hours=2, retry_seconds=REMINDER_RETRY):
+        """Снимает аренду: отправленные откладываем на hours.
+
+        Трогаем только строки, которые всё ещё за owner: review_word снимает
+        аренду, и уже оценённое слово сохранит расписание планировщика.
+
+        Неотправленные остаются due, но lease_until сдвигается на retry_seconds:
+        до тех пор claim_due_words их не вернёт — ни в этом тике, ни другому воркеру.
+        """
+        now = datetime.datetime.now()
+        next_review = _epoch(now + datetime.timedelta(hours=hours))
+        retry_at = _epoch(now) + retry_seconds
+        with self.connection:
+            self.connection.executemany(
+                "UPDATE words SET next_review = ?, lease_owner = NULL, lease_until = NULL "
+                "WHERE id = ? AND lease_owner = ?",
+                [(next_review, word_id, owner) for word_id in sent_ids]
+            )
+            self.connection.executemany(
+                "UPDATE words SET lease_owner = NULL, lease_until = ? WHERE id = ? AND lease_owner = ?",
+                [(retry_at, word_id, owner) for word_id in failed_ids]
+            )
+        if sent_ids:
+            self.review_queue.push(next_review)
+
+    def count_due_words(self, now=None):
+        """Сколько слов ждут напоминания прямо сейчас (по индексу next_review)."""
+        if now is None:
+            now = datetime.datetime.now()
+        with self.connection:
+            return self.connection.execute(
+                "SELECT count(*) FROM words WHERE next_review <= ?", (_epoch(now),)
+            ).fetchone()[0]
+
+    def get_cached_response(self, key, min_created_at):
+        """Ответ из кэша или None, если его нет или он устарел."""
+        with self.connection:
+            row = self.connection.execute(
+                "SELECT response FROM response_cache WHERE key = ? AND created_at >= ?",
+                (key, min_created_at)
+            ).fetchone()
+            if row:
+                self.connection.execute(
+                    "UPDATE response_cache SET last_used = ? WHERE key = ?", (time.time(), key)
+                )
+        return row[0] if row else None
+
+    def put_cached_response(self, key, prompt_hash, response):
+        now = time.time()
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO response_cache (key, prompt_hash, response, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, prompt_hash, response, now, now)
+            )
+
+    def evict_cached_responses(self, max_entries):
+        """Оставляет в кэше только max_entries самых свежих по использованию записей."""
+        with self.connection:
+            self.connection.execute(
+                "DELETE FROM response_cache WHERE key IN ("
+                "SELECT key FROM response_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (max_entries,)
+            )
+
+    def purge_cached_responses(self, prompt_hashes):
+        """Удаляет ответы, полученные со старыми промптами (хэш не из prompt_hashes)."""
+        with self.connection:
+            cursor = self.connection.execute(
+                "DELETE FROM response_cache WHERE prompt_hash NOT IN (SELECT value FROM json_each(?))",
+                (json.dumps(list(prompt_hashes)),)
+            )
+            return cursor.rowcount
+
+    def get_tts_file_id(self, key):
+        with self.connection:
+            row = self.connection.execute(
+                "SELECT file_id FROM tts_file_ids WHERE key = ?", (key,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def put_tts_file_id(self, key, file_id):
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO tts_file_ids (key, file_id) VALUES (?, ?)", (key, file_id)
+            )
+
+    def get_state(self, namespace, chat_id, key):
+        with self.connection:
+            row = self.connection.execute(
+                "SELECT value FROM user_state WHERE namespace = ? AND chat_id = ? AND key = ?",
+                (namespace, chat_id, key)
+            ).fetchone()
+        return row[0] if row else None
+
+    def put_state(self, namespace, chat_id, key, value, keep=None):
+        """Записывает значение; keep — сколько последних (по key) записей чата оставить."""
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO user_state (namespace, chat_id, key, value) VALUES (?, ?, ?, ?)",
+                (namespace, chat_id, key, value)
+            )
+            if keep is not None:
+                self.connection.execute(
+                    "DELETE FROM user_state WHERE namespace = ? AND chat_id = ? AND key <= ("
+                    "SELECT key FROM user_state WHERE namespace = ? AND chat_id = ? "
+                    "ORDER BY key DESC LIMIT 1 OFFSET ?)",
+                    (namespace, chat_id, namespace, chat_id, keep)
+                )
+
+    def delete_state(self, namespace, chat_id, key):
+        with self.connection:
+            self.connection.execute(
+                "DELETE FROM user_state WHERE namespace = ? AND chat_id = ? AND key = ?",
+                (namespace, chat_id, key)
+            )
+
+    def get_recent_responses(self, limit):
+        """Последние использованные ответы из кэша Gemini (для прогрева кэша озвучки)."""
+        with self.connection:
+            return [row[0] for row in self.connection.execute(
+                "SELECT response FROM response_cache ORDER BY last_used DESC LIMIT ?", (limit,)
+            )]
+
+
+class AsyncDatabase:
+    """Асинхронная обёртка над Database для хендлеров бота.
+
+    Запросы выполняются в отдельном пуле потоков, у каждого потока своё
+    соединение, так что диск не блокирует event loop. Методы те же, что у
+    Database, только их нужно await-ить.
+
+    Быстрый запрос через пул медленнее прямого вызова (переход между
+    потоками, GIL). Выигрыш — когда база ждёт: чужую блокировку записи,
+    чекпоинт, медленный диск. Тогда ждёт только этот хендлер, а не весь
+    бот (см. benchmarks/bench_async_db.py --scenario stall).
+    """
+
+    def __init__(self, db_file="vocab.db", workers=4):
+        self.db_file = db_file
+        self.local = threading.local()
+        # Схема и куча создаются один раз, синхронно, до старта пула
+        bootstrap = Database(db_file)
+        self.review_queue = bootstrap.review_queue
+        bootstrap.close()
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="db")
+
+    def _worker_db(self):
+        db = getattr(self.local, "db", None)
+        if db is None:
+            db = Database(self.db_file, review_queue=self.review_queue)
+            self.local.db = db
+        return db
+
+    def _call(self, method, args, kwargs):
+        started = time.perf_counter()
+        result = getattr(self._worker_db(), method)(*args, **kwargs)
+        return result, time.perf_counter() - started
+
+    async def _run(self, method, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        result, elapsed = await loop.run_in_executor(self.executor, self._call, method, args, kwargs)
+        # Время запроса без ожидания свободного потока; метрики пишем в потоке loop
+        DB_QUERY.labels(method).observe(elapsed)
+        return result
+
+    async def add_word(self, user_id, word, short_translation, example=None):
+        return await self._run("add_word", user_id, word, short_translation, example)
+
+    async def get_existing_words(self, user_id, words):
+        return await self._run("get_existing_words", user_id, words)
+
+    async def add_words(self, user_id, items):
+        return await self._run("add_words", user_id, items)
+
+    async def export_words(self, user_id, write):
+        """write(rows) выполняется в потоке базы, rows читаются курсором по частям."""
+        return await self._run("export_words", user_id, write)
+
+    async def get_words_page(self, user_id, before_id=None, after_id=None, stage=0, limit=20, stage_or_higher=False):
+        return await self._run("get_words_page", user_id, before_id, after_id, stage, limit, stage_or_higher)
+
+    async def seconds_until_next_review(self, now=None):
+        return await self._run("seconds_until_next_review", now)
+
+    async def review_word(self, word_id, grade, scheduler, now=None):
+        return await self._run("review_word", word_id, grade, scheduler, now)
+
+    async def delete_word(self, user_id, word):
+        return await self._run("delete_word", user_id, word)
+
+    async def delete_word_by_id(self, word_id):
+        return await self._run("delete_word_by_id", word_id)
+
+    async def get_word_by_id(self, word_id):
+        return await self._run("get_word_by_id", word_id)
+
+    async def claim_due_words(self, owner, now=None, lease_seconds=REMINDER_LEASE, limit=REVIEW_PAGE_SIZE):
+        return await self._run("claim_due_words", owner, now, lease_seconds, limit)
+
+    async def renew_claimed_words(self, owner, word_ids, lease_seconds=REMINDER_LEASE):
+        return await self._run("renew_claimed_words", owner, word_ids, lease_seconds)
+
+    async def finish_claimed_words(self, owner, sent_ids, failed_ids=(), hours=2, retry_seconds=REMINDER_RETRY):
+        return await self._run("finish_claimed_words", owner, sent_ids, failed_ids, hours, retry_seconds)
+
+    async def count_due_words(self, now=None):
+        return await self._run("count_due_words", now)
+
+    async def get_cached_response(self, key, min_created_at):
+        return await self._run("get_cached_response", key, min_created_at)
+
+    async def put_cached_response(self, key, prompt_hash, response):
+        return await self._run("put_cached_response", key, prompt_hash, response)
+
+    async def evict_cached_responses(self, max_entries):
+        return await self._run("evict_cached_responses", max_entries)
+
+    async def purge_cached_responses(self, prompt_hashes):
+        return await self._run("purge_cached_responses", prompt_hashes)
+
+    async def get_tts_file_id(self, key):
+        return await self._run("get_tts_file_id", key)
+
+    async def put_tts_file_id(self, key, file_id):
+        return await self._run("put_tts_file_id", key, file_id)
+
+    async def get_state(self, namespace, chat_id, key):
+        return await self._run("get_state", namespace, chat_id, key)
+
+    async def put_state(self, namespace, chat_id, key, value, keep=None):
+        return await self._run("put_state", namespace, chat_id, key, value, keep)
+
+    async def delete_state(self, namespace, chat_id, key):
+        return await self._run("delete_state", namespace, chat_id, key)
+
+    async def get_recent_responses(self, limit):
+        return await self._run("get_recent_responses", limit)
+
+    def close(self):
+        self.executor.shutdown(wait=True)
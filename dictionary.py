@@ -0,0 +1,62 @@
+import csv
+from collections import namedtuple
+
+from cache import normalize_input
+from cards import Answer, Card
+
+# Строка словаря: слово, IPA, краткий перевод, пример и его перевод (последние три — по желанию)
+Entry = namedtuple("Entry", "word ipa translation example example_translation")
+
+
+class LocalDictionary:
+    """Локальный словарь для сценария 1: известное слово отвечается без запроса к модели.
+
+    Файл — TSV в UTF-8, строка на слово:
+        word<TAB>ipa<TAB>translation<TAB>example<TAB>example_translation
+    Строки с # в начале пропускаются. Весь словарь держится в памяти
+    (dict по нормализованному слову): ~200 байт на запись.
+    """
+
+    def __init__(self, entries=()):
+        self.entries = {normalize_input(entry.word): entry for entry in entries}
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding="utf-8", newline="") as f:
+            rows = csv.reader(f, delimiter="\t", quoting=csv.QUOTE_NONE)
+            return cls(
+                Entry(*(row + [""] * 5)[:5])
+                for row in rows if row and row[0].strip() and not row[0].startswith("#")
+            )
+
+    def __len__(self):
+        return len(self.entries)
+
+    def lookup(self, text):
+        entry = self.entries.get(normalize_input(text))
+        if entry is None or not entry.translation:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry
+
+    def answer(self, text):
+        """JSON по схеме cards.Answer — как ответ модели, — или None, если слова нет."""
+        entry = self.lookup(text)
+        if entry is None:
+            return None
+        ipa = f" [{entry.ipa.strip('[]/')}]" if entry.ipa else ""
+        reply = f"1. **Перевод:** **{entry.word}** — {entry.translation}{ipa}."
+        card = None
+        if entry.example:
+            reply += f"\n2. **Пример:** {entry.example}"
+            if entry.example_translation:
+                reply += f" ({entry.example_translation})"
+            card = Card(word=text.strip(), translation=entry.translation, example=entry.example,
+                        example_translation=entry.example_translation)
+        return Answer(reply=reply, card=card).model_dump_json()
+
+    def stats(self):
+        return {"entries": len(self.entries), "hits": self.hits, "misses": self.misses}
@@ -0,0 +1,256 @@
+import asyncio
+import datetime
+import time
+from collections import deque
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
+
+from database import REMINDER_LEASE, REMINDER_RETRY, REVIEW_PAGE_SIZE
+
+# Лимиты Telegram: ~30 сообщений/сек на бота и ~1 сообщение/сек в один чат
+GLOBAL_RATE = 25
+PER_CHAT_RATE = 1
+PER_CHAT_BURST = 3
+# Больше напоминаний одному чату за тик не шлём: остальные слова придут следующими тиками
+MAX_PER_CHAT = 20
+
+
+class TokenBucket:
+    """Классический token bucket: rate токенов в секунду, не больше capacity."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def try_acquire(self):
+        """Берёт токен без ожидания: 0, если взяли, иначе — сколько секунд ждать токена."""
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                delay = self.try_acquire()
+                if not delay:
+                    return
+                await asyncio.sleep(delay)
+
+
+class DispatchStats:
+    """Счётчики одного тика рассылки."""
+
+    def __init__(self):
+        self.queued = 0
+        self.sent = 0
+        self.failed = 0
+        # Сверх max_per_chat: не отправлялись, вернутся следующим тиком
+        self.deferred = 0
+        self.retries = 0
+        self.started = time.monotonic()
+        self.finished = None
+
+    @property
+    def queue_depth(self):
+        return self.queued - self.sent - self.failed - self.deferred
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.monotonic()) - self.started
+
+    @property
+    def rate(self):
+        return self.sent / self.elapsed if self.elapsed > 0 else 0.0
+
+    def __str__(self):
+        return (
+            f"sent={self.sent} failed={self.failed} deferred={self.deferred} retries={self.retries} "
+            f"queue={self.queue_depth} {self.rate:.1f} msg/s in {self.elapsed:.2f}s"
+        )
+
+
+class ReminderDispatcher:
+    """Рассылает сообщения параллельно, не выходя за лимиты Telegram.
+
+    bot — всё, у чего есть корутина send_message(chat_id=..., **kwargs):
+    настоящий telegram.Bot или фейк для тестов.
+    """
+
+    def __init__(self, bot, concurrency=20, global_rate=GLOBAL_RATE,
+                 per_chat_rate=PER_CHAT_RATE, per_chat_burst=PER_CHAT_BURST,
+                 max_retries=3, backoff=1.0, max_per_chat=MAX_PER_CHAT):
+        self.bot = bot
+        self.concurrency = concurrency
+        self.max_per_chat = max_per_chat
+        self.global_bucket = TokenBucket(global_rate)
+        self.per_chat_rate = per_chat_rate
+        self.per_chat_burst = per_chat_burst
+        self.chat_buckets = {}
+        self.max_retries = max_retries
+        self.backoff = backoff
+        # До какого момента все воркеры молчат после RetryAfter (flood control)
+        self.paused_until = 0.0
+        self.last_stats = None
+
+    def _chat_bucket(self, chat_id):
+        bucket = self.chat_buckets.get(chat_id)
+        if bucket is None:
+            bucket = TokenBucket(self.per_chat_rate, self.per_chat_burst)
+            self.chat_buckets[chat_id] = bucket
+        return bucket
+
+    async def _wait_pause(self):
+        delay = self.paused_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def _send(self, chat_id, kwargs, stats):
+        """Отправка с повторами. Токен чата на первую попытку уже взял dispatch."""
+        for attempt in range(self.max_retries + 1):
+            await self._wait_pause()
+            if attempt:
+                await self._chat_bucket(chat_id).acquire()
+            await self.global_bucket.acquire()
+            try:
+                await self.bot.send_message(chat_id=chat_id, **kwargs)
+                return True
+            except RetryAfter as e:
+                retry_after = e.retry_after
+                if isinstance(retry_after, datetime.timedelta):
+                    retry_after = retry_after.total_seconds()
+                self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+            except (BadRequest, Forbidden) as e:
+                # Чат не найден, бот заблокирован, кривая разметка — повтор не поможет.
+                # BadRequest в PTB наследует NetworkError, поэтому ловим его раньше
+                print(f"⚠ Reminder to {chat_id} failed: {e}")
+                return False
+            except NetworkError:
+                # Таймаут или обрыв соединения (TimedOut и сам NetworkError) — повторяем
+                await asyncio.sleep(self.backoff * 2 ** attempt)
+            except Exception as e:
+                print(f"⚠ Reminder to {chat_id} failed: {e}")
+                return False
+            if attempt < self.max_retries:
+                stats.retries += 1
+        return False
+
+    async def dispatch(self, messages, sent_per_chat=None):
+        """Отправляет messages — тройки (key, chat_id, kwargs).
+
+        Сообщения раскладываются по очередям чатов, и воркеры берут чаты по
+        кругу, пропуская те, у кого кончились токены: сотня слов одного
+        пользователя (например, после /import) не задерживает остальных.
+        Одному чату уходит не больше max_per_chat сообщений; sent_per_chat —
+        счётчик {chat_id: отправлено} на весь тик, если страниц несколько.
+        Лишние не отправляются (stats.deferred).
+
+        Возвращает список key успешно отправленных сообщений.
+        """
+        stats = DispatchStats()
+        self.last_stats = stats
+        if sent_per_chat is None:
+            sent_per_chat = {}
+        chats = {}
+        for key, chat_id, kwargs in messages:
+            stats.queued += 1
+            queue = chats.setdefault(chat_id, deque())
+            if sent_per_chat.get(chat_id, 0) + len(queue) >= self.max_per_chat:
+                stats.deferred += 1
+            else:
+                queue.append((key, kwargs))
+        # Чаты, которые сейчас никто не рассылает; чат, взятый воркером, вернётся сюда после отправки
+        ready = deque(chat_id for chat_id, queue in chats.items() if queue)
+        delivered = []
+
+        async def next_chat():
+            while ready:
+                wait = None
+                for _ in range(len(ready)):
+                    chat_id = ready.popleft()
+                    delay = self._chat_bucket(chat_id).try_acquire()
+                    if not delay:
+                        return chat_id
+                    ready.append(chat_id)
+                    wait = delay if wait is None else min(wait, delay)
+                await asyncio.sleep(wait)
+            # Оставшиеся чаты уже у других воркеров — они их и дошлют
+            return None
+
+        async def worker():
+            while True:
+                chat_id = await next_chat()
+                if chat_id is None:
+                    return
+                queue = chats[chat_id]
+                key, kwargs = queue.popleft()
+                if await self._send(chat_id, kwargs, stats):
+                    stats.sent += 1
+                    sent_per_chat[chat_id] = sent_per_chat.get(chat_id, 0) + 1
+                    delivered.append(key)
+                else:
+                    stats.failed += 1
+                if queue:
+                    ready.append(chat_id)
+
+        workers = min(self.concurrency, len(ready))
+        await asyncio.gather(*(worker() for _ in range(workers)))
+        stats.finished = time.monotonic()
+        # Бакеты чатов нужны только в пределах тика, не копим их вечно
+        self.chat_buckets.clear()
+        return delivered
+
+
+async def _renew_leases(db, owner, word_ids, lease_seconds):
+    """Продлевает аренду страницы, пока она рассылается.
+
+    Один чат получает не больше PER_CHAT_RATE сообщений в секунду, весь
+    бот — GLOBAL_RATE, так что страница может рассылаться дольше аренды.
+    Без продления другой воркер забрал бы неотправленное и отправил второй раз.
+    """
+    while True:
+        await asyncio.sleep(lease_seconds / 3)
+        try:
+            await db.renew_claimed_words(owner, word_ids, lease_seconds)
+        except Exception as e:
+            print(f"⚠ Reminder lease renewal failed: {e}")
+
+
+async def dispatch_leased(dispatcher, db, owner, build, lease_seconds=REMINDER_LEASE,
+                          retry_seconds=REMINDER_RETRY, page_size=REVIEW_PAGE_SIZE):
+    """Рассылает все слова, которым пора на повтор, беря их в аренду страницами.
+
+    db — AsyncDatabase, owner — имя воркера (lease_owner), build(row) —
+    (word_id, chat_id, kwargs) для dispatcher.dispatch. Пока страница
+    рассылается, её аренда продлевается. Возвращает DispatchStats по страницам.
+    """
+    pages = []
+    sent_per_chat = {}
+    while True:
+        rows = await db.claim_due_words(owner, lease_seconds=lease_seconds, limit=page_size)
+        if not rows:
+            return pages
+        messages = [build(row) for row in rows]
+        word_ids = [word_id for word_id, _, _ in messages]
+        renewal = asyncio.ensure_future(_renew_leases(db, owner, word_ids, lease_seconds))
+        try:
+            sent_ids = await dispatcher.dispatch(messages, sent_per_chat)
+        finally:
+            renewal.cancel()
+        sent = set(sent_ids)
+        # Отправленные откладываем, остальные (ошибки и сверх max_per_chat) —
+        # через retry_seconds, одной транзакцией
+        await db.finish_claimed_words(
+            owner, sent_ids, [word_id for word_id in word_ids if word_id not in sent],
+            retry_seconds=retry_seconds
+        )
+        pages.append(dispatcher.last_stats)
+        # Страница без единой отправки (бот заблокирован, чаты удалены) — не крутимся дальше
+        if not sent_ids or len(rows) < page_size:
+            return pages
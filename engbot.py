@@ -1,16 +1,15 @@
 import os
-import threading
-import tempfile
 import asyncio
 import traceback 
-import re
-from flask import Flask
+import signal
+import datetime
+import functools
+import itertools
+import time
 from dotenv import load_dotenv
 
-# --- ИЗМЕНЕНИЕ 1: Новые импорты Google ---
-from google import genai
-from google.genai import types
-import edge_tts
+# Google SDK, edge-tts и веб-сервер импортируются лениво (см. get_client,
+# prewarm и __main__): импорт engbot не ходит ни в сеть, ни на диск
 
 # Библиотеки Telegram
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
@@ -19,9 +18,32 @@ from telegram.ext import (
     MessageHandler, CallbackQueryHandler, filters
 )
 from telegram.constants import ChatAction
+from telegram.error import BadRequest
 
 # Наша база данных
-from database import Database
+from database import AsyncDatabase
+from dispatcher import ReminderDispatcher, dispatch_leased
+from cache import ResponseCache, is_cacheable
+from cards import (Answer, Card, STRUCTURED_INSTRUCTIONS, card_columns, format_card, parse_answer,
+                   partial_reply, split_card_text)
+from tts import TTSCache, extract_speech
+from voice import Timings, answer_voice, download_voice
+from streaming import StreamingReply
+from gate import ChatOrderProcessor, RequestGate
+from replies import Reply, ReplyStore
+from mywords import PAGE_SIZE, TOP_STAGE, PageCache, render_page
+from scheduler import AGAIN, EASY, GOOD, GRADE_LABELS, HARD, get_scheduler
+from workers import WorkerPool, consume_updates, worker_id
+from state import SQLiteStateStore
+from router import FULL, SCENARIOS, WORD, build_routes, classify
+from dictionary import LocalDictionary
+from metrics import (
+    DUE_WORDS, ERRORS, REMINDERS_FAILED, REMINDERS_SENT, REGISTRY, TEXT_ROUTES, counter, gauge,
+    watch_loop_lag
+)
+from bulk import (
+    MAX_IMPORT_WORDS, dedupe, generate_cards, parse_document, parse_pasted, write_anki, write_csv
+)
 
 # --- 1. НАСТРОЙКИ ---
 load_dotenv()
@@ -34,19 +56,11 @@ if not GEMINI_API_KEY:
 if not TELEGRAM_TOKEN:
     print("❌ ОШИБКА: Нет TELEGRAM_TOKEN в файле .env")
 
-# --- ИЗМЕНЕНИЕ 2: Инициализация Клиента (вместо configure) ---
+# Клиент Gemini создаётся при первом запросе (или в prewarm) — см. get_client()
 client = None
-if GEMINI_API_KEY:
-    try:
-        client = genai.Client(api_key=GEMINI_API_KEY)
-    except Exception as e:
-        print(f"❌ Ошибка создания клиента Google: {e}")
 
-# Подключаем БД
-try:
-    db = Database()
-except Exception as e:
-    print(f"❌ ОШИБКА БАЗЫ ДАННЫХ: {e}")
+# БД и всё, что на ней держится, открываются в init_services() из build_application()
+db = None
 
 SYSTEM_PROMPT = """
 Ты — Элитный языковой коуч, специализирующийся на повышении уровня владения английским.
@@ -91,17 +105,152 @@ SYSTEM_PROMPT = """
 
 # В новой версии модель не создается глобально как объект, мы используем client в функциях
 # Модель указывается при вызове (см. handle_text)
+TEXT_MODEL = "gemini-2.5-flash"
 
-# --- 2. FLASK SERVER ---
-app = Flask(__name__)
+# Для текста просим JSON (ответ + карточка), чтобы "Save" не ходил в Gemini второй раз
+TEXT_PROMPT = SYSTEM_PROMPT + STRUCTURED_INSTRUCTIONS
+
+# Локальный классификатор выбирает короткий промпт под сценарий (router.py);
+# ROUTER=0 — все тексты с полным промптом, как раньше
+ROUTER = os.getenv("ROUTER", "1") == "1"
+# Модель на сценарий: MODEL_WORD=gemini-2.5-flash-lite и т. п. (по умолчанию TEXT_MODEL)
+routes = build_routes(
+    TEXT_PROMPT, TEXT_MODEL, {name: os.getenv(f"MODEL_{name.upper()}") for name in SCENARIOS}
+)
+# DICTIONARY_PATH — TSV со словами и IPA (dictionary.py): такие слова отвечаются без Gemini.
+# По умолчанию словаря нет; формат — в benchmarks/sample_dictionary.tsv
+DICTIONARY_PATH = os.getenv("DICTIONARY_PATH")
+dictionary = None
+
+# STREAM_REPLIES=1 — показывать ответ по мере генерации (правками одного сообщения)
+STREAM_REPLIES = os.getenv("STREAM_REPLIES") == "1"
+
+# Кэш ответов на слова и короткие фразы (одинаковые слова приходят от разных людей)
+response_cache = None
+
+# Очередь запросов к Gemini: по одному на пользователя, общий лимит на бот
+gemini_gate = RequestGate()
+
+# Что лежит под кнопками каждого ответа (по chat_id + message_id ответа бота)
+reply_store = None
+
+# Алгоритм интервальных повторений: fsrs (по умолчанию), sm2 или leitner
+scheduler = get_scheduler(os.getenv("SCHEDULER", "fsrs"))
+
+# Готовые страницы /mywords (сбрасываются при изменении словаря)
+page_cache = PageCache()
+
+# Кэш озвучки: mp3 на диске + file_id из Telegram
+tts_cache = None
+# TTS_MODE: concat (по умолчанию) — длинный текст частями параллельно, одним
+# голосовым; stream — каждая часть своим голосовым, как только готова; single — как раньше
+TTS_MODE = os.getenv("TTS_MODE", "concat")
+# TTS_PREWARM=1 — при старте озвучить ответы из кэша Gemini (последние
+# TTS_PREWARM_LIMIT): Listen под ними попросит ровно этот текст
+TTS_PREWARM = os.getenv("TTS_PREWARM") == "1"
+TTS_PREWARM_LIMIT = 200
+# PREWARM=0 — не прогревать Gemini до первого апдейта (см. prewarm)
+PREWARM = os.getenv("PREWARM", "1") == "1"
+PREWARM_TIMEOUT = 10
+
+# --- 2. ВЕБ-СЕРВЕР (webhook + health) ---
+# BOT_MODE=webhook — апдейты приходят POST-ом на наш сервер, polling — запасной
+# режим через getUpdates. По умолчанию webhook, если задан WEBHOOK_URL.
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+# Без WEBHOOK_SECRET WebServer генерирует случайный секрет на каждый запуск
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+BOT_MODE = os.getenv("BOT_MODE", "webhook" if WEBHOOK_URL else "polling")
+# Сколько апдейтов PTB обрабатывает одновременно (апдейты одного чата
+# всё равно идут по очереди — см. ChatOrderProcessor)
+CONCURRENT_UPDATES = int(os.getenv("CONCURRENT_UPDATES", 32))
+# WORKERS > 1 — апдейты делятся по chat_id между процессами (только webhook)
+WORKERS = int(os.getenv("WORKERS", 1))
+# Имя процесса для аренды напоминаний
+WORKER_ID = worker_id()
+
+# Счётчики кэшей уже ведут сами кэши — /metrics читает их при запросе
+counter(
+    "engbot_response_cache_lookups_total", "Поиски в кэше ответов Gemini", ("result",),
+    fn=lambda: {("memory_hit",): response_cache.memory_hits, ("disk_hit",): response_cache.disk_hits,
+                ("miss",): response_cache.misses}
+)
+counter(
+    "engbot_tts_cache_lookups_total", "Поиски в кэше озвучки", ("result",),
+    fn=lambda: {("hit",): tts_cache.hits, ("miss",): tts_cache.misses, ("file_id_hit",): tts_cache.file_id_hits}
+)
+gauge("engbot_gemini_queued", "Запросы к Gemini, ждущие слота", fn=lambda: gemini_gate.limiter.queued)
+
+def init_services():
+    """Открывает БД, создаёт кэши поверх неё и читает локальный словарь; повторный вызов ничего не делает."""
+    global db, response_cache, reply_store, tts_cache, dictionary
+    if db is not None:
+        return
+    if DICTIONARY_PATH:
+        try:
+            dictionary = LocalDictionary.load(DICTIONARY_PATH)
+            print(f"📖 Словарь: {len(dictionary)} слов")
+        except (OSError, UnicodeDecodeError) as e:
+            print(f"⚠ Словарь {DICTIONARY_PATH} не прочитан: {e}")
+    try:
+        db = AsyncDatabase()
+    except Exception as e:
+        print(f"❌ ОШИБКА БАЗЫ ДАННЫХ: {e}")
+        return
+    response_cache = ResponseCache(db, TEXT_PROMPT, [route.prompt_hash for route in routes.values()])
+    reply_store = ReplyStore(SQLiteStateStore(db))
+    tts_cache = TTSCache(db, mode=TTS_MODE)
+
+def get_client():
+    """Клиент Gemini; создаётся (вместе с импортом google-genai) при первом вызове."""
+    global client
+    if client is None and GEMINI_API_KEY:
+        from google import genai
+        try:
+            client = genai.Client(api_key=GEMINI_API_KEY)
+        except Exception as e:
+            print(f"❌ Ошибка создания клиента Google: {e}")
+    return client
+
+@functools.cache
+def text_config(system_prompt):
+    """Конфиг запроса для текста: JSON-ответ с карточкой. Один на промпт сценария."""
+    from google.genai import types
+    return types.GenerateContentConfig(
+        system_instruction=system_prompt,
+        response_mime_type="application/json",
+        response_schema=Answer
+    )
 
-@app.route('/')
-def alive():
-    return "I am alive!"
+async def prewarm():
+    """Готовит всё тяжёлое до первого апдейта, а не на нём.
 
-def run_web_server():
-    port = int(os.environ.get("PORT", 10000))
-    app.run(host="0.0.0.0", port=port, use_reloader=False)
+    Импорты SDK идут в потоке, чтобы не держать event loop; затем один
+    лёгкий запрос к Gemini (models.get) открывает HTTPS-соединение в пуле
+    клиента. Пул Bot API уже открыт: application.initialize() делает getMe.
+    """
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    try:
+        await loop.run_in_executor(None, lambda: [text_config(route.prompt) for route in routes.values()])
+        gemini = await loop.run_in_executor(None, get_client)
+        if gemini is not None:
+            await asyncio.wait_for(gemini.aio.models.get(model=TEXT_MODEL), PREWARM_TIMEOUT)
+    except Exception as e:
+        print(f"⚠ Prewarm: {e!r}")
+    print(f"🔥 Prewarm: {time.perf_counter() - started:.2f}s")
+
+def web_stats(pool=None):
+    """Служебные страницы со статистикой."""
+    stats = {
+        "/cache": lambda: {
+            "responses": response_cache.stats(), "tts": tts_cache.stats(),
+            "dictionary": dictionary.stats() if dictionary else None,
+        },
+        "/gemini": gemini_gate.stats,
+    }
+    if pool:
+        stats["/workers"] = pool.stats
+    return stats
 
 # --- 3. ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ ---
 
@@ -111,36 +260,108 @@ def get_keyboard():
         [InlineKeyboardButton("💾 Save to Dictionary", callback_data="save")]
     ])
 
-async def generate_voice_file(text):
-    VOICE = "en-US-ChristopherNeural"
-    with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as f:
-        output_file = f.name
-    communicate = edge_tts.Communicate(text, VOICE)
-    await communicate.save(output_file)
-    return output_file
+async def remember_reply(chat_id, message, user_input, reply, card=None):
+    """Сохраняет состояние кнопок под отправленным ответом."""
+    await reply_store.put(chat_id, message.message_id, Reply(
+        user_input, extract_speech(reply), card.model_dump_json() if card else None
+    ))
+
+async def generate_card(user_id, word):
+    """Запасной путь: отдельный запрос к Gemini за карточкой (если её нет в ответе).
+
+    Возвращает (short_translation, example).
+    """
+    try:
+        # Мы просим Gemini создать форматированную строку специально для БД
+        prompt = (
+            f"Создай словарную карточку для слова/фразы: '{word}'. "
+            f"Формат строго такой:\n"
+            f"{word} — [Краткий перевод]\n"
+            f"([Короткое предложение-пример на английском с этим словом] — [Перевод предложения на русский])\n\n"
+            f"Не пиши ничего лишнего, только эти две строки."
+        )
+
+        r = await gemini_gate.run(
+            user_id,
+            lambda: get_client().aio.models.generate_content(model=TEXT_MODEL, contents=prompt),
+            key=("card", word),
+            handler="card"
+        )
+        
+        # Получаем красивый текст:
+        # Opportunity — Возможность
+        # (I missed the opportunity to travel. — Я упустил возможность попутешествовать.)
+        full_card = r.text.strip()
+    except Exception as e:
+        full_card = f"{word} — Перевод не найден"
+        print(f"Error generating card: {e}")
+
+    # Уберем само слово из начала строки перевода, чтобы не дублировать в базе,
+    # и разложим остаток по колонкам: первая строка — перевод, вторая — пример
+    return split_card_text(full_card.replace(f"{word} — ", "", 1).replace(f"{word} - ", "", 1))
+
+# Таймер напоминаний спит до ближайшего слова, но не дольше этого (сек),
+# чтобы подхватывать слова, добавленные пока он спал.
+REMINDER_MAX_SLEEP = 300
+REMINDER_MIN_SLEEP = 1
+
+def schedule_reminders(job_queue, delay=None):
+    """Ставит следующий запуск check_reminders на момент, когда что-то станет due."""
+    if delay is None:
+        delay = REMINDER_MAX_SLEEP
+    delay = min(max(delay, REMINDER_MIN_SLEEP), REMINDER_MAX_SLEEP)
+    job_queue.run_once(check_reminders, when=delay, name="check_reminders")
 
 async def check_reminders(context: ContextTypes.DEFAULT_TYPE):
-    words_to_review = db.get_words_to_review()
-    
-    for row in words_to_review:
-        word_id, user_id, word, translation, stage = row
-        kb = InlineKeyboardMarkup([
-            [
-                 InlineKeyboardButton("✅ Помню", callback_data=f"rev_ok_{word_id}_{stage}"),
-                InlineKeyboardButton("❌ Забыл", callback_data=f"rev_bad_{word_id}")
-            ],
-            [InlineKeyboardButton("🗑 Удалить", callback_data=f"stop_{word_id}")]
-        ])
+    try:
+        await send_due_reminders(context)
+    except Exception:
+        ERRORS.labels("reminders").inc()
+        print(f"❌ Reminder error:\n{traceback.format_exc()}")
+    finally:
+        # Таймер — единственная цепочка run_once: он должен перезапуститься
+        # в любом случае, даже если база упала (тогда — через REMINDER_MAX_SLEEP)
+        delay = None
         try:
-            await context.bot.send_message(
-                chat_id=user_id,
-                text=f"🔔 **Time to review!**\n\nКак переводится: **{word}**?",
-                reply_markup=kb, parse_mode="Markdown"
-            )
-
-            db.snooze_word(word_id, hours=2)
-        except Exception:
-            pass 
+            delay = await db.seconds_until_next_review()
+        except Exception as e:
+            ERRORS.labels("reminders").inc()
+            print(f"❌ Reminder scheduling error: {e}")
+        finally:
+            schedule_reminders(context.job_queue, delay)
+        try:
+            DUE_WORDS.set(await db.count_due_words())
+        except Exception as e:
+            print(f"⚠ Due words gauge: {e}")
+
+def build_reminder(row):
+    """Текст и клавиатура напоминания для одной строки из claim_due_words."""
+    word_id, user_id, word, short_translation, stage = row
+    kb = InlineKeyboardMarkup([
+        [
+            InlineKeyboardButton(GRADE_LABELS[grade], callback_data=f"rev_{grade}_{word_id}")
+            for grade in (AGAIN, HARD, GOOD, EASY)
+        ],
+        [InlineKeyboardButton("🗑 Удалить", callback_data=f"stop_{word_id}")]
+    ])
+    return word_id, user_id, {
+        "text": f"🔔 **Time to review!**\n\nКак переводится: **{word}**?",
+        "reply_markup": kb,
+        "parse_mode": "Markdown",
+    }
+
+async def send_due_reminders(context: ContextTypes.DEFAULT_TYPE):
+    dispatcher = context.bot_data.get('reminder_dispatcher')
+    if dispatcher is None or dispatcher.bot is not context.bot:
+        dispatcher = ReminderDispatcher(context.bot)
+        context.bot_data['reminder_dispatcher'] = dispatcher
+
+    # Слова берём в аренду: параллельные воркеры не разошлют одно слово дважды
+    for stats in await dispatch_leased(dispatcher, db, WORKER_ID, build_reminder):
+        REMINDERS_SENT.inc(stats.sent)
+        REMINDERS_FAILED.inc(stats.failed)
+        if stats.queued:
+            print(f"📨 Reminders: {stats}")
 
 # --- 4. ХЕНДЛЕРЫ ---
 
@@ -149,42 +370,115 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         "Yo! Я готов.\n🔹 Пиши слова — я переведу.\n🔹 Используй /mywords чтобы видеть словарь."
     )
 
+async def get_words_page(chat_id, direction="f", cursor=0, stage=0):
+    """Страница /mywords: из кэша или одним запросом на PAGE_SIZE слов.
+
+    direction: "f" — первая страница, "n" — старше cursor, "p" — новее cursor.
+    """
+    page_key = (direction, cursor, stage)
+    page = page_cache.get(chat_id, page_key)
+    if page is not None:
+        return page
+
+    # Последний фильтр (TOP_STAGE) — этот уровень и выше
+    higher = stage == TOP_STAGE
+    if direction == "p":
+        rows, has_more = await db.get_words_page(
+            chat_id, after_id=cursor, stage=stage, limit=PAGE_SIZE, stage_or_higher=higher
+        )
+        has_newer, has_older = has_more, True
+    else:
+        before_id = cursor if direction == "n" else None
+        rows, has_more = await db.get_words_page(
+            chat_id, before_id=before_id, stage=stage, limit=PAGE_SIZE, stage_or_higher=higher
+        )
+        has_newer, has_older = direction == "n", has_more
+
+    page = render_page(rows, stage, has_newer, has_older) if rows else None
+    page_cache.put(chat_id, page_key, page)
+    return page
+
 async def show_my_words(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = update.effective_chat.id
-    words = db.get_all_words(chat_id)
-    if not words:
+    # /mywords 2 — только слова второго уровня
+    stage = int(context.args[0]) if context.args and context.args[0].isdigit() else 0
+    page = await get_words_page(chat_id, stage=stage)
+    if page is None:
         await update.message.reply_text("🤷‍♂️ Твой словарь пуст.")
         return
 
-    message_text = "📚 **Твой словарь:**\n\n"
-    for row in words:
-        word, translation, stage = row
-        
-        # Очистка спецсимволов Markdown, чтобы не ломали разметку
-        safe_word = str(word).replace('*', '').replace('_', '').replace('`', '')
-        
-        # ХИТРОСТЬ: Берём только первую строку перевода (до переноса \n)
-        # Если в базе лежит: "Кошка\n(I saw a cat...)"
-        # Мы покажем только: "Кошка"
-        if "\n" in str(translation):
-            short_trans = str(translation).split('\n')[0]
-        else:
-            short_trans = str(translation)
-            
-        safe_trans = short_trans.replace('*', '').replace('_', '').replace('`', '')
-        
-        level_icon = "🔥" * stage if stage < 4 else "🎓"
-        
-        # Формируем строку
-        line = f"🔹 **{safe_word}** {level_icon} {stage}\n   _{safe_trans}_\n\n"
-        
-        if len(message_text) + len(line) > 4000:
-            await update.message.reply_text(message_text, parse_mode="Markdown")
-            message_text = ""
-        message_text += line
+    text, keyboard = page
+    await update.message.reply_text(text, reply_markup=keyboard, parse_mode="Markdown")
+
+async def import_words(update: Update, context: ContextTypes.DEFAULT_TYPE, items):
+    """Общая часть /import: дедупликация, карточки пачками, одна транзакция."""
+    chat_id = update.effective_chat.id
+    items = list(itertools.islice(items, MAX_IMPORT_WORDS))
+    if not items:
+        await update.message.reply_text("🤷‍♂️ Не нашёл слов для импорта.")
+        return
 
-    if message_text:
-        await update.message.reply_text(message_text, parse_mode="Markdown")
+    existing = await db.get_existing_words(chat_id, [word for word, _ in items])
+    new_items = list(dedupe(items, existing))
+    if not new_items:
+        await update.message.reply_text("⚠ Все эти слова уже есть в словаре.")
+        return
+
+    missing = [word for word, translation in new_items if not translation]
+    if missing:
+        await update.message.reply_text(f"⏳ Делаю карточки для {len(missing)} слов...")
+        await context.bot.send_chat_action(chat_id, action='typing')
+    cards = await generate_cards(get_client(), TEXT_MODEL, gemini_gate, chat_id, missing) if missing else {}
+
+    rows = [
+        (word, translation, None) if translation else (word, *cards[word])
+        for word, translation in new_items
+        if translation or word in cards
+    ]
+    added = await db.add_words(chat_id, rows)
+    page_cache.invalidate(chat_id)
+
+    failed = len(new_items) - len(rows)
+    text = f"✅ Импорт: добавлено **{added}**, уже было **{len(items) - len(new_items)}**"
+    if failed:
+        text += f", без карточки **{failed}**"
+    await update.message.reply_text(text, parse_mode="Markdown")
+
+async def import_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # Текст после /import, с сохранением переносов строк
+    parts = update.message.text.split(maxsplit=1)
+    if len(parts) < 2:
+        await update.message.reply_text(
+            "Пришли список после команды (по слову в строке):\n`/import\nleverage\nopportunity`\n\n"
+            "или отправь CSV/TXT файл с подписью /import — первая колонка слово, "
+            "вторая (необязательно) перевод.",
+            parse_mode="Markdown"
+        )
+        return
+    await import_words(update, context, parse_pasted(parts[1]))
+
+async def import_document(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # Импорт — только по явной подписи: файл, присланный по другому поводу, не трогаем
+    caption = (update.message.caption or "").split()
+    if not caption or caption[0].split("@")[0].lower() != "/import":
+        await update.message.reply_text("Чтобы импортировать слова из файла, отправь его с подписью /import.")
+        return
+    file = await context.bot.get_file(update.message.document.file_id)
+    data = bytes(await file.download_as_bytearray())
+    await import_words(update, context, parse_document(data))
+
+async def export_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    chat_id = update.effective_chat.id
+    # /export anki — TXT для Anki, иначе CSV
+    anki = bool(context.args) and context.args[0].lower() == "anki"
+    path = await db.export_words(chat_id, write_anki if anki else write_csv)
+    try:
+        with open(path, 'rb') as f:
+            await context.bot.send_document(
+                chat_id, f, filename="mywords_anki.txt" if anki else "mywords.csv"
+            )
+    finally:
+        os.remove(path)
 
 async def delete_word_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = update.effective_chat.id
@@ -192,7 +486,8 @@ async def delete_word_command(update: Update, context: ContextTypes.DEFAULT_TYPE
         await update.message.reply_text("Пиши: `/delete слово`", parse_mode="Markdown")
         return
     word = " ".join(context.args)
-    if db.delete_word(chat_id, word):
+    if await db.delete_word(chat_id, word):
+        page_cache.invalidate(chat_id)
         await update.message.reply_text(f"🗑 Удалено: **{word}**", parse_mode="Markdown")
     else:
         await update.message.reply_text("Не нашел такого слова.")
@@ -202,70 +497,88 @@ async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = update.effective_chat.id
     await context.bot.send_chat_action(chat_id=chat_id, action='typing')
     try:
-        # --- ИЗМЕНЕНИЕ 3: Новый вызов генерации текста ---
-        # Используем client.aio для асинхронности
-        response = await client.aio.models.generate_content(
-            model="gemini-2.5-flash", # Используем актуальную модель
-            contents=user_text,
-            config=types.GenerateContentConfig(
-                system_instruction=SYSTEM_PROMPT
-            )
-        )
-        
-        context.user_data['last_reply'] = response.text
-        context.user_data['last_input'] = user_text 
-        await update.message.reply_text(response.text, reply_markup=get_keyboard())
+        route = routes[classify(user_text) if ROUTER else FULL]
+        # Слово из локального словаря — ответ без модели и без кэша
+        raw = dictionary.answer(user_text) if dictionary is not None and route.name == WORD else None
+        TEXT_ROUTES.labels("dictionary" if raw else route.name).inc()
+        cacheable = raw is None and is_cacheable(user_text)
+        if cacheable:
+            raw = await response_cache.get(user_text, route.cache_tag, route.prompt_hash)
+
+        stream = None
+        if raw is None:
+            # --- ИЗМЕНЕНИЕ 3: Новый вызов генерации текста ---
+            # Используем client.aio для асинхронности
+            started = time.monotonic()
+            config = text_config(route.prompt)
+            if STREAM_REPLIES:
+                stream = StreamingReply(update.message)
+
+                async def generate():
+                    raw = ""
+                    async for chunk in await get_client().aio.models.generate_content_stream(
+                        model=route.model, contents=user_text, config=config
+                    ):
+                        raw += chunk.text or ""
+                        await stream.update(partial_reply(raw))
+                    return raw
+
+                # Стрим у каждого свой, поэтому не склеиваем одинаковые запросы
+                raw = await gemini_gate.run(chat_id, generate, handler="text")
+            else:
+                async def generate():
+                    response = await get_client().aio.models.generate_content(
+                        model=route.model, # Модель сценария (MODEL_<СЦЕНАРИЙ>) или TEXT_MODEL
+                        contents=user_text,
+                        config=config
+                    )
+                    return response.text
+
+                # Одинаковый текст от разных пользователей — один вызов.
+                # Длинные тексты склеиваем только при точном совпадении.
+                key = (
+                    response_cache.key(user_text, route.cache_tag, route.prompt_hash) if cacheable
+                    else (route.cache_tag, user_text)
+                )
+                raw = await gemini_gate.run(chat_id, generate, key=key, handler="text")
+            if cacheable and raw:
+                await response_cache.put(
+                    user_text, route.cache_tag, raw, time.monotonic() - started, route.prompt_hash
+                )
+
+        reply, card = parse_answer(raw)
+        if stream is not None:
+            sent = await stream.finish(reply, get_keyboard())
+        else:
+            sent = await update.message.reply_text(reply, reply_markup=get_keyboard())
+        await remember_reply(chat_id, sent, user_text, reply, card)
     except Exception as e:
+        ERRORS.labels("text").inc()
+        print(f"❌ Text handler error: {e}")
         await update.message.reply_text(f"Ошибка: {e}")
 
 async def handle_voice(update: Update, context: ContextTypes.DEFAULT_TYPE):
     chat_id = update.effective_chat.id
     await context.bot.send_chat_action(chat_id=chat_id, action='typing')
     try:
-        file = await context.bot.get_file(update.message.voice.file_id)
-        with tempfile.NamedTemporaryFile(suffix=".ogg", delete=False) as tf:
-            await file.download_to_drive(custom_path=tf.name)
-            tpath = tf.name
-        
-        # --- ИЗМЕНЕНИЕ 4: Загрузка файла и генерация ---
-        # Загружаем файл через client.files
-        # Примечание: 'upload' обычно синхронный, но быстрый. 
-        # Если нужно строго async, используем client.aio.files.upload (если доступно в версии) или запускаем в executor.
-        # Для простоты используем client.files.upload (он работает надежно)
-        
-        # Загрузка
-        upload_file = client.files.upload(file=tpath, config={'mime_type': 'audio/ogg'})
-        
-        # Ждем обработки (обычно аудио быстро, но на всякий случай)
-        while upload_file.state.name == "PROCESSING":
-             await asyncio.sleep(1)
-             upload_file = client.files.get(name=upload_file.name)
-
-        # Генерация ответа
-        resp = await client.aio.models.generate_content(
-            model="gemini-2.5-flash",
-            contents=[
-                types.Content(
-                    role="user",
-                    parts=[
-                        types.Part.from_uri(
-                            file_uri=upload_file.uri,
-                            mime_type=upload_file.mime_type
-                        ),
-                        types.Part.from_text(text="Ответь на это аудио.")
-                    ]
-                )
-            ],
-            config=types.GenerateContentConfig(
-                system_instruction=SYSTEM_PROMPT
-            )
-        )
-        
-        if os.path.exists(tpath): os.remove(tpath)
-        context.user_data['last_reply'] = resp.text
-        context.user_data['last_input'] = None 
-        await update.message.reply_text(f"🗣 {resp.text}", reply_markup=get_keyboard())
+        # Голосовое качаем в память; короткие клипы идут в Gemini inline
+        timings = Timings()
+        audio = await download_voice(context.bot, update.message.voice.file_id, timings)
+        stream = StreamingReply(update.message, prefix="🗣 ") if STREAM_REPLIES else None
+        reply = await gemini_gate.run(chat_id, lambda: answer_voice(
+            get_client(), TEXT_MODEL, audio, SYSTEM_PROMPT, timings,
+            on_text=stream.update if stream else None
+        ), handler="voice")
+        print("🎙 Voice: " + " ".join(f"{k}={v:.2f}s" for k, v in timings.items()))
+
+        if stream is not None:
+            sent = await stream.finish(reply, get_keyboard())
+        else:
+            sent = await update.message.reply_text(f"🗣 {reply}", reply_markup=get_keyboard())
+        await remember_reply(chat_id, sent, None, reply)
     except Exception as e:
+        ERRORS.labels("voice").inc()
+        print(f"❌ Voice handler error: {e}")
         await update.message.reply_text(f"Error: {e}")
 
 async def button_click(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -274,20 +587,14 @@ async def button_click(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.answer()
     data = query.data
 
+    # Кнопки "tts"/"save" относятся к тому ответу, под которым нажаты
+    state = None
+    if data in ("tts", "save"):
+        state = await reply_store.get(chat_id, query.message.message_id)
+
     if data == "tts":
-        text = context.user_data.get('last_reply')
-        if text:
-            # --- ФИЛЬТР ЛИШНИХ ВЫРАЖЕНИЙ ---
-            # 1. Убираем markdown (*, _)
-            clean = text.replace('*', '').replace('_', '')
-            
-            # 2. Оставляем ТОЛЬКО английские буквы, цифры и знаки препинания.
-            # Все русские буквы (и пояснения типа "Оценка:") будут удалены.
-            # Регулярка [^...] значит "удалить всё, что НЕ входит в этот список"
-            clean_english_only = re.sub(r'[^\x00-\x7F]+', '', clean)
-            
-            # Обрезаем лишние пробелы, которые могли остаться после удаления слов
-            final_text = " ".join(clean_english_only.split())
+        if state:
+            final_text = state.tts_text
 
             if not final_text:
                 await query.answer("Нет английского текста для озвучки!")
@@ -295,128 +602,169 @@ async def button_click(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
             await context.bot.send_chat_action(chat_id, action='record_audio')
             try:
-                # Озвучиваем только чистый английский текст
-                path = await generate_voice_file(final_text[:1000])
-                with open(path, 'rb') as f: 
-                    await context.bot.send_voice(chat_id, f)
-                os.remove(path)
+                # Озвучиваем только чистый английский текст (повторы — из кэша)
+                await tts_cache.send_voice(context.bot, chat_id, final_text)
             except Exception as e: 
                 await context.bot.send_message(chat_id, f"TTS Error: {e}")
 
     # --- ПРОСТОЕ СОХРАНЕНИЕ (ТОЛЬКО ПЕРЕВОД) ---
     # --- ИЗМЕНЕНИЕ: УМНОЕ СОХРАНЕНИЕ ПО ШАБЛОНУ ---
     elif data == "save":
-        word = context.user_data.get('last_input')
+        word = state.input if state else None
         
         if not word: return 
-        
-        await context.bot.send_chat_action(chat_id, action='typing')
 
-        try:
-            # Мы просим Gemini создать форматированную строку специально для БД
-            prompt = (
-                f"Создай словарную карточку для слова/фразы: '{word}'. "
-                f"Формат строго такой:\n"
-                f"{word} — [Краткий перевод]\n"
-                f"([Короткое предложение-пример на английском с этим словом] — [Перевод предложения на русский])\n\n"
-                f"Не пиши ничего лишнего, только эти две строки."
-            )
-
-            r = await client.aio.models.generate_content(
-                model="gemini-2.5-flash",
-                contents=prompt
-            )
-            
-            # Получаем красивый текст:
-            # Opportunity — Возможность
-            # (I missed the opportunity to travel. — Я упустил возможность попутешествовать.)
-            full_card = r.text.strip()
-            
-            # Разделяем для удобства (первая строка - перевод, остальное - пример)
-            lines = full_card.split('\n')
-            translation_part = lines[0].split('—')[-1].strip() if '—' in lines[0] else lines[0]
-            
-            # Но в базу мы запишем ВЕСЬ шаблон в поле translation, 
-            # чтобы потом при выводе видеть всё сразу.
-            # ЛИБО (лучший вариант): В translation пишем первую строку, а пример добавим к ней.
-            
-        except Exception as e:
-            full_card = f"{word} — Перевод не найден"
-            print(f"Error generating card: {e}")
-
-        # Сохраняем в БД именно отформатированный шаблон
-        # Обрати внимание: word остается оригинальным (для поиска), 
-        # а в translation мы пишем всё то, что сгенерировала нейронка (перевод + пример)
-        # Нам придется чуть схитрить: в поле translation запишем строку "Перевод\n(Пример)"
-        
-        # Уберем само слово из начала строки перевода, чтобы не дублировать в базе
-        # Gemini вернет: "Word - Translation..."
-        # Нам в базу в колонку 'translation' нужно записать: "Translation\n(Example...)"
-        
-        final_translation_content = full_card.replace(f"{word} — ", "", 1).replace(f"{word} - ", "", 1)
+        # Карточка уже пришла вместе с ответом в handle_text — сеть не нужна
+        if state.card:
+            short_translation, example = card_columns(Card.model_validate_json(state.card))
+        else:
+            await context.bot.send_chat_action(chat_id, action='typing')
+            short_translation, example = await generate_card(chat_id, word)
 
-        if db.add_word(chat_id, word, final_translation_content):
+        if await db.add_word(chat_id, word, short_translation, example):
+            page_cache.invalidate(chat_id)
             await context.bot.send_message(
                 chat_id, 
-                f"✅ **Сохраненo:**\n\n📌 **{word}** — {final_translation_content}", 
+                f"✅ **Сохраненo:**\n\n📌 **{word}** — {format_card(short_translation, example)}", 
                 parse_mode="Markdown"
             )
         else:
             await context.bot.send_message(chat_id, "⚠ Такое слово уже есть.")
-    # 3. ИНТЕРВАЛЬНОЕ ПОВТОРЕНИЕ
-    elif data.startswith("rev_ok_"):
-        parts = data.split("_")
-        wid = int(parts[2])
-        
-        # Пытаемся получить стадию из кнопки, если старые кнопки - считаем 1
+    # Листание /mywords: правим то же сообщение
+    elif data.startswith("mw:"):
+        _, direction, cursor, stage = data.split(":")
+        stage = int(stage)
+        page = await get_words_page(chat_id, direction, int(cursor), stage)
+        text, keyboard = page or render_page([], stage, False, False)
         try:
-            current_stage = int(parts[3])
-        except IndexError:
-            current_stage = 1
+            await query.edit_message_text(text, reply_markup=keyboard, parse_mode="Markdown")
+        except BadRequest:
+            # Нажали на уже открытый фильтр — сообщение не изменилось
+            pass
 
-        row = db.get_word_by_id(wid)
-        
-        # Логика: следующий уровень
-        new_stage = current_stage + 1
-        
-        db.update_word_stage(wid, new_stage) 
-        
-        if row:
-            word, translation = row
-            # Разделяем перевод и пример для красоты вывода (если там есть перенос строки)
-            if "\n" in translation:
-                clean_trans = translation.split("\n")[0] # Берем только первую строку для краткости
+    # 3. ИНТЕРВАЛЬНОЕ ПОВТОРЕНИЕ
+    elif data.startswith("rev_"):
+        parts = data.split("_")
+        # Старые кнопки: rev_ok_<id>_<stage> / rev_bad_<id>, новые: rev_<оценка>_<id>
+        if parts[1] == "ok":
+            grade, wid = GOOD, int(parts[2])
+        elif parts[1] == "bad":
+            grade, wid = AGAIN, int(parts[2])
+        else:
+            grade, wid = int(parts[1]), int(parts[2])
+
+        row = await db.get_word_by_id(wid)
+        result = await db.review_word(wid, grade, scheduler)
+        page_cache.invalidate(chat_id)
+
+        if row and result:
+            word, short_translation, example = row
+            new_stage, next_review = result
+            days = max(1, round((next_review - datetime.datetime.now()).total_seconds() / 86400))
+            if grade == AGAIN:
+                await query.edit_message_text(
+                    f"🤔 Ничего страшного.\n\n📖 **{word}** — {format_card(short_translation, example)}\n\n(Спрошу через {days} дн.)",
+                    parse_mode="Markdown"
+                )
             else:
-                clean_trans = translation
-
-            await query.edit_message_text(
-                f"🎉 Красавчик! (+ ур. {new_stage})\n\n✅ **{word}** — {clean_trans}",
-                parse_mode="Markdown"
-            )
+                # Для краткости — только перевод, без примера
+                await query.edit_message_text(
+                    f"🎉 Красавчик! (ур. {new_stage}, повтор через {days} дн.)\n\n✅ **{word}** — {short_translation}",
+                    parse_mode="Markdown"
+                )
         else:
-            await query.edit_message_text("🎉 Молодец! (Слово удалено)")
-    
-    elif data.startswith("rev_bad_"):
+            await query.edit_message_text("🤷‍♂️ Этого слова уже нет в словаре.")
+
+    elif data.startswith("stop_"):
         wid = int(data.split("_")[-1])
-        
-        row = db.get_word_by_id(wid)
-        
-        db.update_word_stage(wid, 1) # Сброс
-        
+        row = await db.get_word_by_id(wid)
+        await db.delete_word_by_id(wid)
+        page_cache.invalidate(chat_id)
         if row:
-            word, translation = row
-            await query.edit_message_text(
-                f"🤔 Ничего страшного.\n\n📖 **{word}** — {translation}\n\n(Спрошу завтра)",
-                parse_mode="Markdown"
-            )
+            await query.edit_message_text(f"🗑 Удалено: **{row[0]}**", parse_mode="Markdown")
         else:
-            await query.edit_message_text("🤔 Окей, повторим завтра.")
+            await query.edit_message_text("🗑 Удалено.")
+
+async def on_startup(application):
+    # Ответы, полученные со старыми промптами (полным и сценариев роутера), больше не нужны
+    removed = await response_cache.purge_stale()
+    if removed:
+        print(f"🧹 Cache: удалено {removed} ответов со старым промптом")
+    if PREWARM:
+        await prewarm()
+
+async def on_started(application):
+    """После application.start(): фоновые задачи на время работы бота (отменяет on_stop).
+
+    Это обычные задачи asyncio, а не application.create_task: stop() ждёт
+    такие задачи, а watch_loop_lag бесконечна.
+    """
+    tasks = [asyncio.ensure_future(watch_loop_lag())]
+    if TTS_PREWARM:
+        # Ключ озвучки — хэш текста, поэтому греем тот же текст, что сохранит remember_reply
+        responses = await db.get_recent_responses(TTS_PREWARM_LIMIT)
+        texts = {extract_speech(parse_answer(raw)[0]) for raw in responses}
+        tasks.append(asyncio.ensure_future(tts_cache.prewarm([text for text in texts if text])))
+    application.bot_data['background_tasks'] = tasks
+
+async def on_stop(application):
+    for task in application.bot_data.pop('background_tasks', []):
+        task.cancel()
+
+def build_application(request=None, updates_request=None):
+    """Приложение PTB со всеми хендлерами и таймером напоминаний.
+
+    request/updates_request — свой транспорт Bot API (telegram.request.BaseRequest),
+    например фейковый в benchmarks/bench_replay.py.
+    """
+    init_services()
+    builder = (
+        ApplicationBuilder()
+        .token(TELEGRAM_TOKEN)
+        .concurrent_updates(ChatOrderProcessor(CONCURRENT_UPDATES, gemini_gate))
+        .post_init(on_startup)
+        .post_stop(on_stop)
+    )
+    if request is not None:
+        builder = builder.request(request).get_updates_request(updates_request or request)
+    app_bot = builder.build()
+    
+    # Планировщик
+    schedule_reminders(app_bot.job_queue, delay=10)
+
+    # Хендлеры
+    app_bot.add_handler(CommandHandler("start", start))
+    app_bot.add_handler(CommandHandler("mywords", show_my_words))
+    app_bot.add_handler(CommandHandler("delete", delete_word_command))
+    app_bot.add_handler(CommandHandler("import", import_command))
+    app_bot.add_handler(CommandHandler("export", export_command))
+    app_bot.add_handler(MessageHandler(
+        filters.Document.FileExtension("csv") | filters.Document.FileExtension("txt"), import_document
+    ))
+    app_bot.add_handler(MessageHandler(filters.TEXT & (~filters.COMMAND), handle_text))
+    app_bot.add_handler(MessageHandler(filters.VOICE, handle_voice))
+    app_bot.add_handler(CallbackQueryHandler(button_click))
+    return app_bot
+
+def run_worker(index, queue, reports):
+    """Процесс-воркер WorkerPool: свой event loop, своё приложение, апдейты — из queue.
+
+    Метрики воркера раз в несколько секунд уходят в reports — их отдаёт
+    /metrics главного процесса.
+    """
+    # Ctrl+C получает вся группа процессов; останавливает воркеры главный процесс
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    print(f"👷 Worker {index} ({WORKER_ID}) запущен")
+    asyncio.run(consume_updates(
+        build_application(), queue, on_start=on_started,
+        report=lambda: reports.put((index, REGISTRY.snapshot()))
+    ))
+    if db:
+        db.close()
 
 # --- 5. ЗАПУСК (С ОТЛОВОМ ОШИБОК) ---
 if __name__ == '__main__':
     try:
-        threading.Thread(target=run_web_server, daemon=True).start()
-        
         print("✅ Бот запускается...")
         
         if not GEMINI_API_KEY or not TELEGRAM_TOKEN:
@@ -426,25 +774,31 @@ if __name__ == '__main__':
             import sys
             sys.exit(1)
 
-        app_bot = ApplicationBuilder().token(TELEGRAM_TOKEN).build()
-        
-        # Планировщик
-        app_bot.job_queue.run_repeating(check_reminders, interval=60, first=10)
-
-        # Хендлеры
-        app_bot.add_handler(CommandHandler("start", start))
-        app_bot.add_handler(CommandHandler("mywords", show_my_words))
-        app_bot.add_handler(CommandHandler("delete", delete_word_command))
-        app_bot.add_handler(MessageHandler(filters.TEXT & (~filters.COMMAND), handle_text))
-        app_bot.add_handler(MessageHandler(filters.VOICE, handle_voice))
-        app_bot.add_handler(CallbackQueryHandler(button_click))
-
-        print("🚀 Бот работает!")
-        app_bot.run_polling()
+        from webserver import WebServer
+
+        app_bot = build_application()
+        pool = None
+        if WORKERS > 1 and BOT_MODE == "webhook":
+            pool = WorkerPool(WORKERS, run_worker)
+        elif WORKERS > 1:
+            print("⚠ WORKERS > 1 работает только с webhook, запускаю один процесс")
+
+        web = WebServer(
+            app_bot,
+            port=int(os.environ.get("PORT", 10000)),
+            secret_token=WEBHOOK_SECRET,
+            stats=web_stats(pool),
+            metrics=REGISTRY,
+            pool=pool,
+            on_start=on_started
+        )
+        print(f"🚀 Бот работает! (режим: {BOT_MODE})")
+        asyncio.run(web.run(webhook_url=WEBHOOK_URL, polling=BOT_MODE == "polling"))
+        if db:
+            db.close()
         
     except Exception as e:
         print("\n❌ КРИТИЧЕСКАЯ ОШИБКА ПРИ ЗАПУСКЕ:")
         print(traceback.format_exc())
         # Блокировка, чтобы не перезагружать сервер в цикле
-        import time
         time.sleep(10)
\ No newline at end of file
@@ -0,0 +1,197 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from metrics import GEMINI_LATENCY
+
+# Сколько запросов к Gemini может идти одновременно на весь бот
+MAX_CONCURRENT_REQUESTS = 8
+# Семафор PTB в ChatOrderProcessor: настоящий лимит апдейтов — внутри него
+UNLIMITED_UPDATES = 2**31 - 1
+
+
+class FairLimiter:
+    """Глобальный лимит одновременных запросов с честной очередью.
+
+    Когда слот освобождается, его получает следующий пользователь по кругу
+    (round-robin), а не тот, кто успел накидать больше всего запросов.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.active = 0
+        self.waiters = {}  # user_id -> deque[Future]
+        self.order = deque()  # пользователи, у которых есть ожидающие
+
+    async def acquire(self, user_id):
+        if self.active < self.limit and not self.order:
+            self.active += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        queue = self.waiters.setdefault(user_id, deque())
+        if not queue:
+            self.order.append(user_id)
+        queue.append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Слот уже был передан нам — отдаём его следующему
+                self.release()
+            else:
+                self._forget(user_id, future)
+            raise
+
+    def _forget(self, user_id, future):
+        queue = self.waiters.get(user_id)
+        if queue and future in queue:
+            queue.remove(future)
+            if not queue:
+                del self.waiters[user_id]
+                self.order.remove(user_id)
+
+    def release(self):
+        while self.order:
+            user_id = self.order.popleft()
+            queue = self.waiters[user_id]
+            future = queue.popleft()
+            if queue:
+                self.order.append(user_id)
+            else:
+                del self.waiters[user_id]
+            if not future.done():
+                # Слот переходит ожидающему, active не меняется
+                future.set_result(None)
+                return
+        self.active -= 1
+
+    @property
+    def queued(self):
+        return sum(len(q) for q in self.waiters.values())
+
+
+class RequestGate:
+    """Порядок и лимиты для запросов к Gemini.
+
+    - user_turn(): апдейты одного пользователя выполняются по очереди, так
+      что ответы приходят в том же порядке, что и сообщения (его берёт
+      ChatOrderProcessor для каждого апдейта);
+    - run(): одинаковые запросы в полёте (от любых пользователей) сливаются
+      в один вызов, а все вызовы проходят через FairLimiter.
+    """
+
+    def __init__(self, max_concurrent=MAX_CONCURRENT_REQUESTS):
+        self.limiter = FairLimiter(max_concurrent)
+        self.user_locks = {}
+        self.in_flight = {}
+        self.calls = 0
+        self.coalesced = 0
+        self.peak_concurrency = 0
+        self.wait_seconds = 0.0
+        self.waits = 0
+        self.max_wait = 0.0
+
+    def _record_wait(self, started):
+        waited = time.monotonic() - started
+        self.wait_seconds += waited
+        self.waits += 1
+        self.max_wait = max(self.max_wait, waited)
+
+    @asynccontextmanager
+    async def user_turn(self, user_id):
+        entry = self.user_locks.get(user_id)
+        if entry is None:
+            entry = self.user_locks[user_id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        started = time.monotonic()
+        try:
+            async with entry[0]:
+                self._record_wait(started)
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                # Не держим замки для всех пользователей, которые когда-то писали
+                del self.user_locks[user_id]
+
+    async def _call(self, user_id, factory, handler):
+        started = time.monotonic()
+        await self.limiter.acquire(user_id)
+        self._record_wait(started)
+        self.calls += 1
+        self.peak_concurrency = max(self.peak_concurrency, self.limiter.active)
+        called = time.perf_counter()
+        try:
+            return await factory()
+        finally:
+            GEMINI_LATENCY.labels(handler).observe(time.perf_counter() - called)
+            self.limiter.release()
+
+    async def run(self, user_id, factory, key=None, handler="other"):
+        """Выполняет factory() (корутину запроса) под лимитом.
+
+        Если key задан и такой же запрос уже в полёте, ждём его результат.
+        handler — метка для гистограммы задержек Gemini (metrics.py).
+        """
+        if key is None:
+            return await self._call(user_id, factory, handler)
+        task = self.in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._call(user_id, factory, handler))
+            self.in_flight[key] = task
+            task.add_done_callback(lambda _: self.in_flight.pop(key, None))
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def stats(self):
+        return {
+            "active": self.limiter.active,
+            "queued": self.limiter.queued,
+            "limit": self.limiter.limit,
+            "peak_concurrency": self.peak_concurrency,
+            "calls": self.calls,
+            "coalesced": self.coalesced,
+            "avg_wait_seconds": self.wait_seconds / self.waits if self.waits else 0.0,
+            "max_wait_seconds": self.max_wait,
+            "users_waiting": sum(1 for _, count in self.user_locks.values() if count > 1),
+        }
+
+
+class ChatOrderProcessor(BaseUpdateProcessor):
+    """Обработчик апдейтов PTB: разные чаты — параллельно, один чат — строго по очереди.
+
+    Очередь чата — gate.user_turn, так что любой хендлер (текст, голос,
+    кнопки, /import, /delete...) ждёт, пока закончится предыдущий апдейт
+    того же чата. Апдейты без чата обрабатываются сразу.
+
+    Слот из max_concurrent_updates берётся уже после очереди чата: апдейты,
+    ждущие своей очереди, слотов не занимают, и пользователь с сотней
+    сообщений не останавливает остальных. Поэтому семафор самого PTB
+    (его берёт process_update до do_process_update) сделан безлимитным.
+    """
+
+    def __init__(self, max_concurrent_updates, gate):
+        super().__init__(UNLIMITED_UPDATES)
+        self.slots = asyncio.Semaphore(max_concurrent_updates)
+        self.gate = gate
+
+    async def do_process_update(self, update, coroutine):
+        chat = update.effective_chat if isinstance(update, Update) else None
+        if chat is None:
+            async with self.slots:
+                await coroutine
+            return
+        async with self.gate.user_turn(chat.id):
+            async with self.slots:
+                await coroutine
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
@@ -0,0 +1,231 @@
+import asyncio
+import bisect
+import time
+
+# Границы корзин гистограмм по умолчанию (секунды)
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=""):
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value):
+    return repr(float(value)) if value != float("inf") else "+Inf"
+
+
+class _CounterChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+
+class _GaugeChild:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def set(self, value):
+        self.value = value
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        # Последняя ячейка — значения больше всех границ (+Inf)
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+class Metric:
+    """Метрика с метками: metric.labels("text").observe(...), без меток — сразу metric.observe(...).
+
+    Значения меняются без блокировок, поэтому обновлять их можно только из
+    потока event loop (AsyncDatabase замеряет время в своих потоках, но
+    записывает его уже в loop). Время меряем парой time.perf_counter() и
+    observe(): контекстный менеджер стоил бы ещё столько же.
+
+    fn — вместо значений в памяти: функция без аргументов, которая при
+    каждом /metrics возвращает число или {кортеж меток: число} (для
+    счётчиков, которые уже ведут другие объекты, например ResponseCache).
+    """
+    kind = None
+    child_class = None
+
+    def __init__(self, name, documentation, labelnames=(), fn=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.fn = fn
+        self.children = {}
+        if not self.labelnames and fn is None:
+            self._default = self.labels()
+
+    def _new_child(self):
+        return self.child_class()
+
+    def labels(self, *values):
+        child = self.children.get(values)
+        if child is None:
+            child = self.children[values] = self._new_child()
+        return child
+
+    def _samples(self):
+        if self.fn is not None:
+            value = self.fn()
+            items = value.items() if isinstance(value, dict) else [((), value)]
+            for labels, number in items:
+                yield "", labels, "", number
+            return
+        for labels, child in list(self.children.items()):
+            yield "", labels, "", child.value
+
+    def render(self, workers=()):
+        """workers — пары (имя воркера, сэмплы из Registry.snapshot()): выводятся
+        в том же семействе с дополнительной меткой worker."""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for suffix, labels, extra, value in self._samples():
+            lines.append(
+                f"{self.name}{suffix}{_format_labels(self.labelnames, labels, extra)} {_format_value(value)}"
+            )
+        names = self.labelnames + ("worker",)
+        for worker, samples in workers:
+            for suffix, labels, extra, value in samples:
+                lines.append(
+                    f"{self.name}{suffix}{_format_labels(names, tuple(labels) + (worker,), extra)} "
+                    f"{_format_value(value)}"
+                )
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+    child_class = _CounterChild
+
+    def inc(self, amount=1):
+        self._default.inc(amount)
+
+
+class Gauge(Metric):
+    kind = "gauge"
+    child_class = _GaugeChild
+
+    def set(self, value):
+        self._default.set(value)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._default.observe(value)
+
+    def _samples(self):
+        for labels, child in list(self.children.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), child.counts):
+                cumulative += count
+                yield "_bucket", labels, f'le="{_format_value(bound)}"', cumulative
+            yield "_sum", labels, "", child.sum
+            yield "_count", labels, "", cumulative
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        if metric.name in self.metrics:
+            raise ValueError(f"metric {metric.name} already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def snapshot(self):
+        """Все сэмплы всех метрик — для передачи из процесса-воркера (см. render)."""
+        return {name: list(metric._samples()) for name, metric in self.metrics.items()}
+
+    def render(self, workers=None):
+        """Текстовый формат Prometheus (text/plain; version=0.0.4).
+
+        workers — {имя воркера: snapshot()} от процессов WorkerPool: их
+        сэмплы идут в те же семейства с меткой worker (у главного процесса её нет).
+        """
+        workers = workers or {}
+        return "\n".join(
+            metric.render([
+                (worker, snapshot[name]) for worker, snapshot in workers.items() if name in snapshot
+            ])
+            for name, metric in self.metrics.items()
+        ) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def counter(name, documentation, labelnames=(), fn=None):
+    return REGISTRY.register(Counter(name, documentation, labelnames, fn))
+
+
+def gauge(name, documentation, labelnames=(), fn=None):
+    return REGISTRY.register(Gauge(name, documentation, labelnames, fn))
+
+
+def histogram(name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+    return REGISTRY.register(Histogram(name, documentation, labelnames, buckets))
+
+
+# --- Метрики бота ---
+GEMINI_LATENCY = histogram(
+    "engbot_gemini_request_seconds", "Время запроса к Gemini (без очереди gate)", ("handler",)
+)
+TTS_SYNTHESIS = histogram("engbot_tts_synthesis_seconds", "Время синтеза озвучки edge-tts (одной части текста)")
+TTS_FIRST_AUDIO = histogram(
+    "engbot_tts_first_audio_seconds", "От нажатия Listen до отправки первого голосового"
+)
+DB_QUERY = histogram(
+    "engbot_db_query_seconds", "Время метода Database в потоке базы", ("method",),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+)
+REMINDERS_SENT = counter("engbot_reminders_sent_total", "Отправленные напоминания")
+REMINDERS_FAILED = counter("engbot_reminders_failed_total", "Напоминания, которые не удалось отправить")
+ERRORS = counter("engbot_errors_total", "Пойманные исключения в хендлерах и таймерах", ("where",))
+TEXT_ROUTES = counter(
+    "engbot_text_routes_total", "Тексты по сценариям локального классификатора (dictionary — ответ из словаря)",
+    ("scenario",)
+)
+DUE_WORDS = gauge("engbot_due_words", "Слова, которым пора на повтор (после тика рассылки)")
+LOOP_LAG = gauge("engbot_event_loop_lag_seconds", "Насколько event loop опоздал с последним пробуждением")
+
+
+async def watch_loop_lag(interval=0.5):
+    """Фоновая задача: раз в interval меряет, насколько позже просыпается loop."""
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        LOOP_LAG.set(max(0.0, time.perf_counter() - started - interval))
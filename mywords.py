@@ -0,0 +1,91 @@
+from collections import OrderedDict
+
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+
+# Слов на одной странице /mywords
+PAGE_SIZE = 20
+# Фильтр по уровню: 0 — все слова. Уровень растёт с каждым удачным повтором без
+# потолка, поэтому последний фильтр — «этот уровень и выше»
+STAGE_FILTERS = (0, 1, 2, 3, 4, 5)
+TOP_STAGE = STAGE_FILTERS[-1]
+
+
+def stage_label(stage):
+    return f"{stage}+" if stage == TOP_STAGE else str(stage)
+# Для скольких пользователей и страниц держим готовый текст
+CACHED_USERS = 1000
+CACHED_PAGES_PER_USER = 10
+
+
+def render_word_line(word, short_translation, stage):
+    # Очистка спецсимволов Markdown, чтобы не ломали разметку
+    safe_word = str(word).replace('*', '').replace('_', '').replace('`', '')
+    safe_trans = str(short_translation).replace('*', '').replace('_', '').replace('`', '')
+
+    level_icon = "🔥" * stage if stage < 4 else "🎓"
+    return f"🔹 **{safe_word}** {level_icon} {stage}\n   _{safe_trans}_\n\n"
+
+
+def render_page(rows, stage, has_newer, has_older):
+    """Текст и клавиатура одной страницы. rows — (id, word, short_translation, stage), новые первыми."""
+    title = "📚 **Твой словарь:**" if not stage else f"📚 **Твой словарь (уровень {stage_label(stage)}):**"
+    text = title + "\n\n"
+    if not rows:
+        text += "🤷‍♂️ Здесь пока пусто."
+    shown = []
+    for row in rows:
+        line = render_word_line(*row[1:])
+        if len(text) + len(line) > 4000:
+            # Не влезшие слова попадут на следующую страницу
+            has_older = True
+            break
+        text += line
+        shown.append(row)
+    rows = shown
+
+    nav = []
+    if rows and has_newer:
+        nav.append(InlineKeyboardButton("◀", callback_data=f"mw:p:{rows[0][0]}:{stage}"))
+    if rows and has_older:
+        nav.append(InlineKeyboardButton("▶", callback_data=f"mw:n:{rows[-1][0]}:{stage}"))
+    filters_row = [
+        InlineKeyboardButton(
+            ("• " if s == stage else "") + ("Все" if s == 0 else stage_label(s)),
+            callback_data=f"mw:f:0:{s}"
+        )
+        for s in STAGE_FILTERS
+    ]
+    keyboard = [nav, filters_row] if nav else [filters_row]
+    return text, InlineKeyboardMarkup(keyboard)
+
+
+class PageCache:
+    """Готовые страницы /mywords по пользователям.
+
+    Сбрасывается целиком для пользователя при любом изменении его словаря
+    (добавление, удаление, смена уровня).
+    """
+
+    def __init__(self, max_users=CACHED_USERS, pages_per_user=CACHED_PAGES_PER_USER):
+        self.max_users = max_users
+        self.pages_per_user = pages_per_user
+        self.users = OrderedDict()
+
+    def get(self, user_id, page_key):
+        pages = self.users.get(user_id)
+        if pages is None:
+            return None
+        self.users.move_to_end(user_id)
+        return pages.get(page_key)
+
+    def put(self, user_id, page_key, page):
+        pages = self.users.setdefault(user_id, OrderedDict())
+        self.users.move_to_end(user_id)
+        pages[page_key] = page
+        while len(pages) > self.pages_per_user:
+            pages.popitem(last=False)
+        while len(self.users) > self.max_users:
+            self.users.popitem(last=False)
+
+    def invalidate(self, user_id):
+        self.users.pop(user_id, None)
@@ -0,0 +1,54 @@
+import json
+from collections import OrderedDict, namedtuple
+
+# Что нужно кнопкам под ответом бота: исходный ввод, текст для озвучки, карточка (JSON)
+Reply = namedtuple("Reply", "input tts_text card")
+
+# Сколько ответов держим в памяти на весь бот и в базе на одного пользователя
+MEMORY_REPLIES = 10_000
+REPLIES_PER_USER = 50
+
+
+class ReplyStore:
+    """Состояние кнопок под каждым ответом бота, по ключу (chat_id, message_id).
+
+    Горячие записи лежат в LRU в памяти (общий лимит на бот, так что память
+    не растёт с числом пользователей), все — в общем StateStore (state.py),
+    не больше per_user_limit последних на пользователя. Переживает
+    перезапуски и видна всем воркерам; записи не меняются после put(),
+    так что LRU в каждом процессе не устаревает.
+    """
+
+    NAMESPACE = "reply"
+
+    def __init__(self, store, memory_entries=MEMORY_REPLIES, per_user_limit=REPLIES_PER_USER):
+        self.store = store
+        self.memory_entries = memory_entries
+        self.per_user_limit = per_user_limit
+        self.memory = OrderedDict()
+
+    def _remember(self, key, reply):
+        self.memory[key] = reply
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_entries:
+            self.memory.popitem(last=False)
+
+    async def put(self, chat_id, message_id, reply):
+        # Сначала в память — кнопку могут нажать раньше, чем запишется база
+        self._remember((chat_id, message_id), reply)
+        await self.store.put(
+            self.NAMESPACE, chat_id, message_id, json.dumps(reply, ensure_ascii=False), self.per_user_limit
+        )
+
+    async def get(self, chat_id, message_id):
+        key = (chat_id, message_id)
+        reply = self.memory.get(key)
+        if reply is not None:
+            self.memory.move_to_end(key)
+            return reply
+        value = await self.store.get(self.NAMESPACE, chat_id, message_id)
+        if value is None:
+            return None
+        reply = Reply(*json.loads(value))
+        self._remember(key, reply)
+        return reply
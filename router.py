@@ -0,0 +1,107 @@
+import re
+from collections import namedtuple
+
+from cache import MAX_CACHEABLE_WORDS, normalize_input, prompt_hash
+
+# Сценарии из SYSTEM_PROMPT, которые можно узнать по тексту без модели
+WORD = "word"              # СЦЕНАРИЙ 1: слово или фраза на английском
+HOW_TO_SAY = "how_to_say"  # СЦЕНАРИЙ 2: "как сказать ...?" / текст на русском
+ENGLISH = "english"        # СЦЕНАРИЙ 3 (текстом): предложение на английском
+FULL = "full"              # не уверены — полный промпт, модель выберет сама
+SCENARIOS = (WORD, HOW_TO_SAY, ENGLISH, FULL)
+
+CYRILLIC_RE = re.compile(r"[а-яё]", re.IGNORECASE)
+LATIN_RE = re.compile(r"[a-z]", re.IGNORECASE)
+HOW_TO_SAY_RE = re.compile(
+    r"^\s*(как\s+(сказать|будет|перевести|по-английски)|how\s+(do\s+(you|i)\s+|to\s+)?say)\b",
+    re.IGNORECASE
+)
+SENTENCE_RE = re.compile(r"[?!]|[.,;:]\s+\S")
+
+# Короткие промпты: общий тон + только нужный сценарий (полный — около 2.3 тыс. символов)
+PROMPT_HEADER = """
+Ты — языковой коуч по английскому. Тон: прямой, лаконичный, профессиональный.
+Объяснения и переводы — на русском, примеры — на английском, ключевые слова — **жирным**.
+Без приветствий, сразу к делу.
+"""
+
+SCENARIO_PROMPTS = {
+    WORD: """
+Пользователь прислал английское слово или фразу. Ответь по пунктам:
+1. **Перевод:** слово — перевод [IPA]. Если значений несколько — укажи все.
+2. **Контексты:** 🏢 **Бизнес**, 🗣 **Разговорный**, 🔥 **Сленг** (если есть) — по примеру.
+3. **Коллокации:** 2-3 словосочетания (перевод в скобках).
+4. **Нюансы:** кратко: оттенки смысла, отличие от синонимов.
+5. **Синонимы:** несколько самых подходящих.
+""",
+    HOW_TO_SAY: """
+Пользователь спрашивает, как сказать это по-английски. Ответь по пунктам:
+1. 🏆 **Как носитель:** самый естественный вариант.
+2. 👔 **Формально:** офисный стиль.
+3. 🚧 **Избегать:** типичные ошибки (калька с русского).
+Кратко поясни, почему именно так.
+""",
+    ENGLISH: """
+Пользователь написал по-английски. Ответь по пунктам:
+1. **Перевод:** на русский.
+2. **Оценка:** 📉 **Ошибки** (исправь, объясни) и 📈 **Апгрейд** (как сказать круче).
+3. **Ответ:** ответь на сообщение по-английски, поддержи диалог.
+""",
+}
+
+# Формат JSON (схема cards.Answer) для коротких промптов
+CARD_INSTRUCTIONS = """
+Ответ — JSON: `reply` — весь ответ пользователю по правилам выше; `card` — карточка:
+`word` — как прислал пользователь, `translation` — краткий перевод, `example` — короткий
+пример на английском, `example_translation` — его перевод.
+"""
+REPLY_ONLY_INSTRUCTIONS = """
+Ответ — JSON: `reply` — весь ответ пользователю по правилам выше; `card` не заполняй.
+"""
+
+# cache_tag — вместо имени модели в ключе кэша ответов: в нём сценарий и хэш
+# его промпта, так что правка короткого промпта сама делает старые ответы недостижимыми.
+# prompt_hash — хэш промпта сценария: с ним ответ пишется в кэш, по нему purge_stale
+# узнаёт ответы, полученные со старой версией промпта
+Route = namedtuple("Route", "name prompt model cache_tag prompt_hash")
+
+
+def classify(text):
+    """Сценарий по самому тексту: алфавит, число слов, шаблоны вопроса.
+
+    Ошибаться лучше в сторону FULL: полный промпт справится с любым вводом.
+    """
+    text = normalize_input(text)
+    if not text:
+        return FULL
+    if HOW_TO_SAY_RE.search(text):
+        return HOW_TO_SAY
+    cyrillic = CYRILLIC_RE.search(text)
+    latin = LATIN_RE.search(text)
+    if cyrillic and not latin:
+        return HOW_TO_SAY
+    if latin and not cyrillic:
+        if len(text.split()) <= MAX_CACHEABLE_WORDS and not SENTENCE_RE.search(text):
+            return WORD
+        return ENGLISH
+    return FULL
+
+
+def build_routes(full_prompt, default_model, models=None):
+    """{сценарий: Route}. models — {сценарий: модель}; пропущенные берут default_model.
+
+    full_prompt — прежний промпт со всеми сценариями (с инструкциями JSON).
+    """
+    models = models or {}
+    routes = {}
+    for name in SCENARIOS:
+        model = models.get(name) or default_model
+        if name == FULL:
+            # Ключ кэша как до роутера: сохранённые ответы остаются в силе
+            routes[name] = Route(name, full_prompt, model, model, prompt_hash(full_prompt))
+            continue
+        instructions = CARD_INSTRUCTIONS if name == WORD else REPLY_ONLY_INSTRUCTIONS
+        prompt = PROMPT_HEADER + SCENARIO_PROMPTS[name] + instructions
+        digest = prompt_hash(prompt)
+        routes[name] = Route(name, prompt, model, f"{model}:{name}:{digest}", digest)
+    return routes
@@ -0,0 +1,137 @@
+import datetime
+import math
+import random
+from collections import namedtuple
+
+# Оценки ответа на напоминание
+AGAIN, HARD, GOOD, EASY = 1, 2, 3, 4
+GRADE_LABELS = {AGAIN: "❌ Забыл", HARD: "😓 Трудно", GOOD: "✅ Помню", EASY: "😎 Легко"}
+
+# Состояние слова для планировщика. stability — интервал/стабильность в днях
+# (None — слово ещё ни разу не повторяли), last_review — datetime или None.
+ReviewState = namedtuple("ReviewState", "stage ease stability difficulty last_review")
+NEW_STATE = ReviewState(stage=1, ease=2.5, stability=None, difficulty=None, last_review=None)
+
+# Старые фиксированные интервалы (по ним же мигрируем существующие слова)
+LEITNER_INTERVALS = {1: 1, 2: 3, 3: 7, 4: 14, 5: 30}
+MAX_INTERVAL_DAYS = 365
+
+
+class LeitnerScheduler:
+    """Прежняя схема: 1 -> 3 -> 7 -> 14 -> 30 дней, "забыл" — сброс на первый уровень."""
+    name = "leitner"
+
+    def review(self, state, grade, now):
+        stage = 1 if grade == AGAIN else state.stage + 1
+        interval = LEITNER_INTERVALS.get(stage, 30)
+        return state._replace(stage=stage, stability=float(interval), last_review=now), interval
+
+
+class SM2Scheduler:
+    """SuperMemo-2: у каждого слова свой коэффициент лёгкости (ease)."""
+    name = "sm2"
+    # Оценка 1..4 -> качество ответа SM-2 (0..5)
+    QUALITY = {AGAIN: 1, HARD: 3, GOOD: 4, EASY: 5}
+
+    def review(self, state, grade, now):
+        q = self.QUALITY[grade]
+        ease = max(1.3, state.ease + 0.1 - (5 - q) * (0.08 + (5 - q) * 0.02))
+        if grade == AGAIN:
+            stage, interval = 1, 1.0
+        else:
+            # stage - 1 — число успешных повторов подряд
+            reps = state.stage - 1
+            if reps == 0:
+                interval = 1.0
+            elif reps == 1:
+                interval = 6.0
+            else:
+                interval = (state.stability or 1.0) * ease
+            stage = state.stage + 1
+        interval = min(interval, MAX_INTERVAL_DAYS)
+        return state._replace(stage=stage, ease=ease, stability=interval, last_review=now), interval
+
+
+class FSRSScheduler:
+    """FSRS v4: стабильность и сложность памяти, интервал под желаемую вероятность вспомнить."""
+    name = "fsrs"
+    WEIGHTS = (0.4, 0.6, 2.4, 5.8, 4.93, 0.94, 0.86, 0.01, 1.49, 0.14, 0.94,
+               2.18, 0.05, 0.34, 1.26, 0.29, 2.61)
+
+    def __init__(self, retention=0.9, weights=WEIGHTS):
+        self.retention = retention
+        self.w = weights
+
+    def _initial_difficulty(self, grade):
+        return min(10.0, max(1.0, self.w[4] - (grade - 3) * self.w[5]))
+
+    def _interval(self, stability):
+        return min(MAX_INTERVAL_DAYS, max(1.0, 9 * stability * (1 / self.retention - 1)))
+
+    def review(self, state, grade, now):
+        w = self.w
+        if state.stability is None or state.difficulty is None:
+            stability = w[grade - 1]
+            difficulty = self._initial_difficulty(grade)
+        else:
+            elapsed = 0.0
+            if state.last_review is not None:
+                elapsed = max(0.0, (now - state.last_review).total_seconds() / 86400)
+            s, d = state.stability, state.difficulty
+            retrievability = (1 + elapsed / (9 * s)) ** -1
+            difficulty = d - w[6] * (grade - 3)
+            difficulty = w[7] * self._initial_difficulty(GOOD) + (1 - w[7]) * difficulty
+            difficulty = min(10.0, max(1.0, difficulty))
+            if grade == AGAIN:
+                stability = (w[11] * d ** -w[12] * ((s + 1) ** w[13] - 1)
+                             * math.exp(w[14] * (1 - retrievability)))
+            else:
+                hard_penalty = w[15] if grade == HARD else 1.0
+                easy_bonus = w[16] if grade == EASY else 1.0
+                stability = s * (1 + math.exp(w[8]) * (11 - d) * s ** -w[9]
+                                 * (math.exp(w[10] * (1 - retrievability)) - 1)
+                                 * hard_penalty * easy_bonus)
+        stage = 1 if grade == AGAIN else state.stage + 1
+        interval = self._interval(stability)
+        new_state = state._replace(stage=stage, stability=stability,
+                                   difficulty=difficulty, last_review=now)
+        return new_state, interval
+
+
+SCHEDULERS = {cls.name: cls for cls in (LeitnerScheduler, SM2Scheduler, FSRSScheduler)}
+
+
+def get_scheduler(name):
+    return SCHEDULERS.get(name, FSRSScheduler)()
+
+
+def fuzz_range(interval):
+    """Окно дней, в которое можно сдвинуть повтор без вреда для запоминания."""
+    if interval < 2.5:
+        return round(interval), round(interval)
+    spread = max(1, round(interval * (0.15 if interval < 7 else 0.1 if interval < 30 else 0.05)))
+    return round(interval) - spread, round(interval) + spread
+
+
+def pick_day(interval, day_load=None, rnd=random):
+    """Выбирает день повтора в окне fuzz_range: наименее загруженный, при равенстве — случайный.
+
+    day_load — {смещение в днях: сколько слов уже назначено}.
+    """
+    low, high = fuzz_range(interval)
+    days = list(range(max(1, low), max(1, high) + 1))
+    rnd.shuffle(days)
+    if day_load:
+        return min(days, key=lambda day: day_load.get(day, 0))
+    return days[0]
+
+
+def schedule(scheduler, state, grade, now, load_fn=None, rnd=random):
+    """Полный шаг: новое состояние слова и дата следующего повтора.
+
+    load_fn(days) возвращает загрузку на ближайшие days дней (см. pick_day).
+    """
+    new_state, interval = scheduler.review(state, grade, now)
+    day_load = load_fn(fuzz_range(interval)[1] + 1) if load_fn else None
+    days = pick_day(interval, day_load, rnd)
+    return new_state, now + datetime.timedelta(days=days)
@@ -0,0 +1,59 @@
+from abc import ABC, abstractmethod
+
+
+class StateStore(ABC):
+    """Состояние пользователей, общее для всех воркеров бота.
+
+    Значения — строки (обычно JSON), адрес — (namespace, chat_id, key).
+    key упорядочен (например, message_id), чтобы keep в put() мог оставлять
+    только последние записи чата. Любое хранилище (SQLite, Postgres, Redis)
+    подключается, реализовав эти три метода.
+    """
+
+    @abstractmethod
+    async def get(self, namespace, chat_id, key):
+        """Значение или None."""
+
+    @abstractmethod
+    async def put(self, namespace, chat_id, key, value, keep=None):
+        """Записывает значение; keep — сколько последних записей чата в namespace оставить."""
+
+    @abstractmethod
+    async def delete(self, namespace, chat_id, key):
+        """Удаляет значение, если оно есть."""
+
+
+class SQLiteStateStore(StateStore):
+    """Таблица user_state в общей базе (AsyncDatabase) — видна всем процессам на этой машине."""
+
+    def __init__(self, db):
+        self.db = db
+
+    async def get(self, namespace, chat_id, key):
+        return await self.db.get_state(namespace, chat_id, key)
+
+    async def put(self, namespace, chat_id, key, value, keep=None):
+        await self.db.put_state(namespace, chat_id, key, value, keep)
+
+    async def delete(self, namespace, chat_id, key):
+        await self.db.delete_state(namespace, chat_id, key)
+
+
+class MemoryStateStore(StateStore):
+    """Словарь в памяти: для одного процесса и для проверок без базы."""
+
+    def __init__(self):
+        self.chats = {}
+
+    async def get(self, namespace, chat_id, key):
+        return self.chats.get((namespace, chat_id), {}).get(key)
+
+    async def put(self, namespace, chat_id, key, value, keep=None):
+        values = self.chats.setdefault((namespace, chat_id), {})
+        values[key] = value
+        if keep is not None and len(values) > keep:
+            for old in sorted(values)[:len(values) - keep]:
+                del values[old]
+
+    async def delete(self, namespace, chat_id, key):
+        self.chats.get((namespace, chat_id), {}).pop(key, None)
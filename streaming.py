@@ -0,0 +1,60 @@
+import time
+
+# Как часто можно править сообщение во время стриминга: Telegram ограничивает
+# правки, поэтому не чаще раза в секунду и только если текста прибавилось.
+EDIT_INTERVAL = 1.0
+EDIT_MIN_CHARS = 80
+# Telegram не принимает сообщения длиннее 4096 символов
+MAX_MESSAGE_LENGTH = 4096
+
+
+class StreamingReply:
+    """Ответ, который показывается пользователю по мере генерации.
+
+    Первый кусок отправляется сразу, дальше сообщение редактируется не
+    чаще EDIT_INTERVAL и не меньше чем на EDIT_MIN_CHARS новых символов.
+    Клавиатура прикрепляется последней правкой в finish().
+    """
+
+    def __init__(self, message, prefix="", interval=EDIT_INTERVAL, min_chars=EDIT_MIN_CHARS):
+        self.message = message
+        self.prefix = prefix
+        self.interval = interval
+        self.min_chars = min_chars
+        self.sent = None
+        self.shown = ""
+        self.last_edit = 0.0
+        self.edits = 0
+        self.started = time.monotonic()
+        self.first_byte = None  # через сколько секунд пользователь увидел текст
+
+    def _render(self, text):
+        return (self.prefix + text)[:MAX_MESSAGE_LENGTH]
+
+    async def update(self, text):
+        text = self._render(text)
+        if not text.strip() or text == self.shown:
+            return
+        now = time.monotonic()
+        if self.sent is None:
+            self.sent = await self.message.reply_text(text)
+            self.first_byte = now - self.started
+        elif now - self.last_edit >= self.interval and len(text) - len(self.shown) >= self.min_chars:
+            await self.sent.edit_text(text)
+            self.edits += 1
+        else:
+            return
+        self.shown = text
+        self.last_edit = now
+
+    async def finish(self, text, reply_markup=None):
+        text = self._render(text)
+        if self.sent is None:
+            self.sent = await self.message.reply_text(text, reply_markup=reply_markup)
+            self.first_byte = time.monotonic() - self.started
+        else:
+            # Клавиатура меняет сообщение, так что правка пройдёт даже при том же тексте
+            await self.sent.edit_text(text, reply_markup=reply_markup)
+            self.edits += 1
+        self.shown = text
+        return self.sent
@@ -0,0 +1,343 @@
+import asyncio
+import hashlib
+import os
+import re
+import tempfile
+import time
+from collections import OrderedDict
+
+from metrics import TTS_FIRST_AUDIO, TTS_SYNTHESIS
+
+VOICE = "en-US-ChristopherNeural"
+# Сколько места на диске может занимать кэш озвучки
+TTS_CACHE_BYTES = 200 * 1024 * 1024
+TTS_CACHE_DIR = os.path.join(tempfile.gettempdir(), "engbot_tts")
+# Превысив TTS_CACHE_BYTES, чистим до этой доли: каталог пересканируется не на каждом файле
+EVICT_TO = 0.9
+
+# Сколько английского текста из ответа озвучиваем (обрезаем по границе фрагмента)
+SPEECH_MAX_CHARS = 3000
+# Длинный текст синтезируется частями до CHUNK_CHARS; первая часть короче,
+# чтобы первое аудио было готово быстрее
+CHUNK_CHARS = 400
+FIRST_CHUNK_CHARS = 150
+# Одновременных запросов к edge-tts на весь бот
+SYNTHESIS_CONCURRENCY = 4
+# single — весь текст одним запросом; concat — части параллельно, склеенные
+# в один mp3; stream — каждая часть отдельным голосовым, по мере готовности
+MODES = ("single", "concat", "stream")
+
+IPA_RE = re.compile(r"\[[^\]\n]*\]|/[^/\s]{1,40}/")
+# Разметка и двойные кавычки в речи не нужны
+MARKUP_RE = re.compile(r"[*_`#>\"]+")
+# Английский фрагмент: от буквы или цифры до буквы, цифры или конца предложения.
+# Всё остальное (кириллица, эмодзи, скобки, тире «—», перенос строки) его обрывает
+ENGLISH_RUN_RE = re.compile(r"[A-Za-z0-9][A-Za-z0-9 \t.,!?;:'’%$&-]*[A-Za-z0-9.!?]|[A-Za-z0-9]")
+NUMBERING_RE = re.compile(r"^\d+[.)]\s+")
+LATIN_WORD_RE = re.compile(r"[A-Za-z]{2,}")
+SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s+")
+CLAUSE_END_RE = re.compile(r"(?<=[,;:])\s+|\s+")
+
+
+def extract_speech(text, max_chars=SPEECH_MAX_CHARS):
+    """Английские фрагменты ответа для озвучки: без markdown, IPA, русского и нумерации.
+
+    Фрагмент не переходит через перенос строки и идёт отдельным предложением
+    (с точкой в конце, если её не было), повторы выброшены. Текст обрезается
+    по границе фрагмента, не посреди предложения.
+    """
+    text = MARKUP_RE.sub("", IPA_RE.sub(" ", text))
+    segments, seen, total = [], set(), 0
+    for piece in ENGLISH_RUN_RE.findall(text):
+        if not LATIN_WORD_RE.search(piece):
+            continue
+        piece = " ".join(piece.split())
+        if piece[0].isdigit():
+            piece = NUMBERING_RE.sub("", piece)
+        if piece.lower() in seen:
+            continue
+        if piece[-1] not in ".!?":
+            piece += "."
+        if total + len(piece) > max_chars:
+            break
+        seen.add(piece.lower())
+        segments.append(piece)
+        total += len(piece) + 1
+    return " ".join(segments)
+
+
+def _split_long(sentence, limit):
+    """Предложение длиннее limit — по запятым, в крайнем случае по словам."""
+    parts, current = [], ""
+    for word in CLAUSE_END_RE.split(sentence):
+        if current and len(current) + 1 + len(word) > limit:
+            parts.append(current)
+            current = word
+        else:
+            current = f"{current} {word}" if current else word
+    if current:
+        parts.append(current)
+    return parts
+
+
+def split_chunks(text, chunk_chars=CHUNK_CHARS, first_chunk_chars=FIRST_CHUNK_CHARS):
+    """Режет текст на части по предложениям: первая до first_chunk_chars, остальные до chunk_chars.
+
+    Текст не длиннее chunk_chars остаётся одной частью, так что повторный
+    вызов на готовой части ничего не меняет.
+    """
+    text = text.strip()
+    if len(text) <= chunk_chars:
+        return [text] if text else []
+    chunks, current = [], ""
+    for sentence in SENTENCE_END_RE.split(text):
+        limit = chunk_chars if chunks else first_chunk_chars
+        for part in _split_long(sentence, limit) if len(sentence) > limit else [sentence]:
+            limit = chunk_chars if chunks else first_chunk_chars
+            if current and len(current) + 1 + len(part) > limit:
+                chunks.append(current)
+                current = part
+            else:
+                current = f"{current} {part}" if current else part
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+async def edge_synthesize(text, voice, path):
+    """Синтез через edge-tts в mp3-файл path."""
+    # edge_tts (и aiohttp под ним) грузим при первом синтезе, а не на старте бота
+    import edge_tts
+
+    await edge_tts.Communicate(text, voice).save(path)
+
+
+class TTSCache:
+    """Кэш озвучки на диске с адресацией по содержимому.
+
+    Ключ — хэш (голос, текст). Файлы вытесняются по LRU, когда кэш
+    превышает max_bytes. Для каждого ключа также помним file_id, который
+    вернул Telegram: повторная отправка идёт по нему, без синтеза и загрузки.
+    Одновременные запросы одного и того же текста синтезируются один раз.
+
+    Каталог может быть общим для нескольких процессов (WORKERS > 1): mtime
+    файла — время последнего использования, и при вытеснении размер и
+    порядок берутся из самого каталога, а не только из self.files. Файл,
+    удалённый другим процессом перед отправкой, синтезируется заново.
+
+    Длинный текст режется по предложениям (split_chunks), части синтезируются
+    параллельно (не больше concurrency запросов на весь бот) и кэшируются по
+    отдельности. mode — см. MODES. synthesize(text, voice, path) — сам синтез,
+    по умолчанию edge-tts (в бенчмарках — заглушка).
+    """
+
+    def __init__(self, db, directory=TTS_CACHE_DIR, max_bytes=TTS_CACHE_BYTES, voice=VOICE,
+                 mode="concat", chunk_chars=CHUNK_CHARS, first_chunk_chars=FIRST_CHUNK_CHARS,
+                 concurrency=SYNTHESIS_CONCURRENCY, synthesize=edge_synthesize):
+        if mode not in MODES:
+            raise ValueError(f"unknown TTS mode: {mode}")
+        self.db = db
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.voice = voice
+        self.mode = mode
+        self.chunk_chars = chunk_chars
+        self.first_chunk_chars = first_chunk_chars
+        self.synthesize = synthesize
+        self.slots = asyncio.Semaphore(concurrency)
+        self.files = OrderedDict()  # key -> размер файла, от старых к новым
+        self.total_bytes = 0
+        self.in_flight = {}
+        self.hits = 0
+        self.misses = 0
+        self.file_id_hits = 0
+        os.makedirs(directory, exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        """Перечитывает каталог: все файлы, включая чужие и с прошлого запуска (старые — первыми)."""
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".mp3"):
+                continue
+            try:
+                st = os.stat(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                # Успел вытеснить другой процесс
+                continue
+            entries.append((st.st_mtime, name[:-4], st.st_size))
+        self.files = OrderedDict()
+        self.total_bytes = 0
+        for _, key, size in sorted(entries):
+            self.files[key] = size
+            self.total_bytes += size
+
+    def key(self, text):
+        return hashlib.sha256(f"{self.voice}\x00{text}".encode("utf-8")).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{key}.mp3")
+
+    def chunks(self, text):
+        if self.mode == "single":
+            return [text]
+        return split_chunks(text, self.chunk_chars, self.first_chunk_chars)
+
+    def _evict(self):
+        if self.total_bytes <= self.max_bytes:
+            return
+        # Свои счётчики не видят файлов других процессов — считаем по каталогу
+        self._scan()
+        while self.total_bytes > self.max_bytes * EVICT_TO and len(self.files) > 1:
+            key, size = self.files.popitem(last=False)
+            self.total_bytes -= size
+            try:
+                os.remove(self.path(key))
+            except FileNotFoundError:
+                pass
+
+    def _add(self, key, path):
+        size = os.path.getsize(path)
+        self.total_bytes += size - self.files.pop(key, 0)
+        self.files[key] = size
+        self._evict()
+        return path
+
+    async def _open(self, text, path):
+        """Открывает готовый mp3; если его уже вытеснил другой процесс — синтезирует заново."""
+        try:
+            return open(path, "rb")
+        except FileNotFoundError:
+            return open(await self.get_audio(text), "rb")
+
+    async def _synthesize(self, key, text):
+        path = self.path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            async with self.slots:
+                started = time.perf_counter()
+                await self.synthesize(text, self.voice, tmp_path)
+                TTS_SYNTHESIS.observe(time.perf_counter() - started)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return self._add(key, path)
+
+    async def _join(self, key, chunks):
+        """Части синтезируются параллельно и склеиваются: mp3-кадры можно писать подряд."""
+        parts = await asyncio.gather(*(self.get_audio(chunk) for chunk in chunks))
+        path = self.path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "wb") as out:
+                for chunk, part in zip(chunks, parts):
+                    with await self._open(chunk, part) as f:
+                        out.write(f.read())
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return self._add(key, path)
+
+    async def get_audio(self, text):
+        """Путь к mp3 для text: из кэша или после синтеза (длинный текст — по частям)."""
+        key = self.key(text)
+        path = self.path(key)
+        try:
+            # mtime — время последнего использования, по нему вытесняют все процессы
+            os.utime(path)
+        except FileNotFoundError:
+            self.files.pop(key, None)
+        else:
+            self.hits += 1
+            if key in self.files:
+                self.files.move_to_end(key)
+            else:
+                # Синтезировал другой процесс
+                self._add(key, path)
+            return path
+
+        task = self.in_flight.get(key)
+        if task is None:
+            self.misses += 1
+            chunks = self.chunks(text)
+            if len(chunks) > 1:
+                task = asyncio.ensure_future(self._join(key, chunks))
+            else:
+                task = asyncio.ensure_future(self._synthesize(key, text))
+            self.in_flight[key] = task
+            task.add_done_callback(lambda _: self.in_flight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def _send(self, bot, chat_id, text, key, file_id, audio):
+        """Одно голосовое: по file_id, если он есть и жив, иначе файлом из audio()."""
+        if file_id:
+            try:
+                await bot.send_voice(chat_id, file_id)
+                self.file_id_hits += 1
+                return
+            except Exception as e:
+                # file_id мог протухнуть — загружаем заново
+                print(f"⚠ TTS file_id resend failed: {e}")
+
+        path = await audio()
+        with await self._open(text, path) as f:
+            message = await bot.send_voice(chat_id, f)
+        if message is not None and message.voice is not None:
+            await self.db.put_tts_file_id(key, message.voice.file_id)
+
+    async def send_voice(self, bot, chat_id, text):
+        """Отправляет озвучку text в чат, по возможности — по сохранённым file_id.
+
+        В режиме stream длинный текст уходит несколькими голосовыми по
+        порядку: синтез всех частей начинается сразу, каждая часть
+        отправляется, как только готова она и все перед ней.
+        """
+        started = time.perf_counter()
+        chunks = self.chunks(text) if self.mode == "stream" else [text]
+        keys = [self.key(chunk) for chunk in chunks]
+        file_ids = await asyncio.gather(*(self.db.get_tts_file_id(key) for key in keys))
+        tasks = [
+            None if file_id else asyncio.ensure_future(self.get_audio(chunk))
+            for chunk, file_id in zip(chunks, file_ids)
+        ]
+        try:
+            for i, (chunk, key, file_id, task) in enumerate(zip(chunks, keys, file_ids, tasks)):
+                audio = (lambda task=task: task) if task else (lambda chunk=chunk: self.get_audio(chunk))
+                await self._send(bot, chat_id, chunk, key, file_id, audio)
+                if i == 0:
+                    TTS_FIRST_AUDIO.observe(time.perf_counter() - started)
+        finally:
+            # Если отправка оборвалась, остальных частей не ждём (синтез под
+            # shield всё равно доделается и останется в кэше)
+            for task in tasks:
+                if task is not None and not task.done():
+                    task.cancel()
+
+    async def prewarm(self, texts, concurrency=4):
+        """Заранее синтезирует озвучку для текстов — тех же, что потом придут в send_voice.
+
+        В режиме stream send_voice просит части по отдельности, поэтому
+        и прогреваем части, а не склейку.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def warm(text):
+            async with semaphore:
+                try:
+                    for part in self.chunks(text) if self.mode == "stream" else [text]:
+                        await self.get_audio(part)
+                except Exception as e:
+                    print(f"⚠ TTS prewarm failed for {text[:40]!r}: {e}")
+
+        await asyncio.gather(*(warm(text) for text in texts))
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "file_id_hits": self.file_id_hits,
+            "files": len(self.files),
+            "bytes": self.total_bytes,
+        }
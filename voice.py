@@ -0,0 +1,101 @@
+import asyncio
+import io
+import time
+from contextlib import contextmanager
+
+VOICE_MIME_TYPE = "audio/ogg"
+VOICE_PROMPT = "Ответь на это аудио."
+# До этого размера аудио уходит прямо в запрос (Part.from_bytes), без Files API.
+# Лимит Gemini на весь inline-запрос — 20 МБ, оставляем запас под промпт.
+INLINE_AUDIO_LIMIT = 10 * 1024 * 1024
+# Ожидание обработки загруженного файла: 0.25s, 0.5s, 1s, ... но не дольше
+POLL_INITIAL_DELAY = 0.25
+POLL_MAX_DELAY = 4.0
+POLL_TIMEOUT = 120.0
+
+
+class Timings(dict):
+    """Время по стадиям голосового пайплайна, в секундах."""
+
+    @contextmanager
+    def measure(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self[stage] = self.get(stage, 0.0) + time.perf_counter() - started
+
+
+async def download_voice(bot, file_id, timings=None):
+    """Скачивает голосовое из Telegram прямо в память."""
+    timings = timings if timings is not None else Timings()
+    with timings.measure("download"):
+        file = await bot.get_file(file_id)
+        return bytes(await file.download_as_bytearray())
+
+
+async def upload_audio(client, audio, timings):
+    """Загружает аудио через Files API и ждёт, пока файл обработается."""
+    with timings.measure("upload"):
+        uploaded = await client.aio.files.upload(
+            file=io.BytesIO(audio), config={'mime_type': VOICE_MIME_TYPE}
+        )
+    with timings.measure("processing"):
+        delay = POLL_INITIAL_DELAY
+        deadline = time.monotonic() + POLL_TIMEOUT
+        while uploaded.state.name == "PROCESSING":
+            if time.monotonic() > deadline:
+                raise TimeoutError("Gemini не успел обработать аудио")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, POLL_MAX_DELAY)
+            uploaded = await client.aio.files.get(name=uploaded.name)
+        if uploaded.state.name == "FAILED":
+            raise RuntimeError("Gemini не смог обработать аудио")
+    return uploaded
+
+
+async def answer_voice(client, model, audio, system_prompt, timings=None, on_text=None):
+    """Отвечает на голосовое: маленькие клипы — inline, большие — через Files API.
+
+    Если передан on_text, ответ стримится: корутина on_text получает
+    накопленный текст после каждого куска.
+    """
+    # Google SDK тяжёлый: импортируется при первом голосовом (или в prewarm)
+    from google.genai import types
+
+    timings = timings if timings is not None else Timings()
+    uploaded = None
+    try:
+        if len(audio) <= INLINE_AUDIO_LIMIT:
+            audio_part = types.Part.from_bytes(data=audio, mime_type=VOICE_MIME_TYPE)
+        else:
+            uploaded = await upload_audio(client, audio, timings)
+            audio_part = types.Part.from_uri(file_uri=uploaded.uri, mime_type=uploaded.mime_type)
+
+        contents = [
+            types.Content(
+                role="user",
+                parts=[audio_part, types.Part.from_text(text=VOICE_PROMPT)]
+            )
+        ]
+        config = types.GenerateContentConfig(system_instruction=system_prompt)
+        with timings.measure("generation"):
+            if on_text is None:
+                resp = await client.aio.models.generate_content(
+                    model=model, contents=contents, config=config
+                )
+                return resp.text
+            text = ""
+            async for chunk in await client.aio.models.generate_content_stream(
+                model=model, contents=contents, config=config
+            ):
+                text += chunk.text or ""
+                await on_text(text)
+            return text
+    finally:
+        if uploaded is not None:
+            # Файл в Gemini больше не нужен; ошибку удаления не пробрасываем
+            try:
+                await client.aio.files.delete(name=uploaded.name)
+            except Exception as e:
+                print(f"⚠ Не удалось удалить аудио из Gemini: {e}")
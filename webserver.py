@@ -0,0 +1,143 @@
+import asyncio
+import json
+import secrets
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, PlainTextResponse, Response
+from starlette.routing import Route
+from telegram import Update
+
+from metrics import CONTENT_TYPE
+
+# Куда Telegram шлёт апдейты в режиме webhook
+WEBHOOK_PATH = "/telegram"
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class WebServer:
+    """Один ASGI-сервер на весь бот: webhook Telegram, health/readiness и статистика.
+
+    Апдейты из POST не обрабатываются в запросе — они кладутся в
+    application.update_queue, дальше их разбирает сам PTB (с
+    concurrent_updates — параллельно). Так Telegram получает 200 сразу.
+    POST без верного заголовка SECRET_HEADER отклоняется; если secret_token
+    не задан, в режиме webhook он генерируется при запуске и передаётся в
+    setWebhook (в режиме polling /telegram не принимает ничего).
+    stats — {путь: функция без аргументов, возвращающая JSON-совместимый объект},
+    metrics — metrics.Registry для /metrics. on_start(application) — после
+    application.start() (фоновые задачи бота), post_stop — после stop().
+
+    С pool (workers.WorkerPool) апдейты не обрабатываются здесь, а
+    раскладываются по процессам-воркерам; application нужен только для
+    setWebhook. /metrics тогда добавляет последние снимки метрик воркеров
+    с меткой worker.
+    """
+
+    def __init__(self, application, host="0.0.0.0", port=10000, secret_token=None,
+                 webhook_path=WEBHOOK_PATH, stats=None, metrics=None, pool=None, on_start=None):
+        self.application = application
+        self.pool = pool
+        self.metrics = metrics
+        self.on_start = on_start
+        self.secret_token = secret_token
+        self.webhook_path = webhook_path
+        self.received = 0
+        routes = [
+            Route("/", self.alive),
+            Route("/healthz", self.alive),
+            Route("/readyz", self.ready),
+            Route(webhook_path, self.telegram_update, methods=["POST"]),
+        ]
+        if metrics is not None:
+            routes.append(Route("/metrics", self.render_metrics))
+        for path, fn in (stats or {}).items():
+            routes.append(Route(path, self._stats_endpoint(fn)))
+        self.app = Starlette(routes=routes)
+        self.server = uvicorn.Server(uvicorn.Config(self.app, host=host, port=port, log_level="warning"))
+
+    @staticmethod
+    def _stats_endpoint(fn):
+        async def endpoint(request):
+            return JSONResponse(fn())
+        return endpoint
+
+    async def alive(self, request):
+        return PlainTextResponse("I am alive!")
+
+    async def render_metrics(self, request):
+        workers = self.pool.metrics() if self.pool else None
+        return Response(self.metrics.render(workers), media_type=CONTENT_TYPE)
+
+    async def ready(self, request):
+        """200, пока бот принимает апдейты; 503 до старта и во время остановки."""
+        running = self.pool.alive() if self.pool else self.application.running
+        if running and not self.server.should_exit:
+            return PlainTextResponse("ready")
+        return PlainTextResponse("not ready", status_code=503)
+
+    async def telegram_update(self, request):
+        # Без секрета кто угодно мог бы прислать апдейт от имени любого chat_id
+        header = request.headers.get(SECRET_HEADER, "")
+        if not self.secret_token or not secrets.compare_digest(header, self.secret_token):
+            return Response(status_code=403)
+        if not (self.pool or self.application.running):
+            # Telegram повторит апдейт позже
+            return Response(status_code=503)
+        try:
+            data = await request.json()
+            if self.pool:
+                self.pool.route(data)
+            else:
+                await self.application.update_queue.put(Update.de_json(data, self.application.bot))
+        except (json.JSONDecodeError, KeyError, TypeError, ValueError, AttributeError) as e:
+            print(f"⚠ Webhook: bad update: {e}")
+            return Response(status_code=400)
+        self.received += 1
+        return Response(status_code=200)
+
+    async def run(self, webhook_url=None, polling=False):
+        """Запускает бот и сервер, пока не придёт SIGINT/SIGTERM.
+
+        webhook_url — публичный адрес для setWebhook (без него webhook не
+        регистрируется: удобно для локальной проверки POST-ами). polling=True —
+        запасной режим: апдейты через getUpdates, сервер только для health.
+        """
+        application = self.application
+        if not polling and not self.secret_token:
+            self.secret_token = secrets.token_urlsafe(32)
+            if webhook_url:
+                print("🔐 WEBHOOK_SECRET не задан — для setWebhook сгенерирован случайный")
+            else:
+                print("⚠ WEBHOOK_SECRET не задан и WEBHOOK_URL нет: /telegram не примет ни одного апдейта")
+        async with application:
+            if self.pool:
+                self.pool.start()
+            else:
+                if application.post_init:
+                    await application.post_init(application)
+                await application.start()
+                if self.on_start:
+                    await self.on_start(application)
+            if polling:
+                await application.updater.start_polling(allowed_updates=Update.ALL_TYPES)
+            elif webhook_url:
+                await application.bot.set_webhook(
+                    webhook_url.rstrip("/") + self.webhook_path,
+                    secret_token=self.secret_token,
+                    allowed_updates=Update.ALL_TYPES
+                )
+            try:
+                # serve() возвращается по сигналу, дождавшись текущих HTTP-запросов
+                await self.server.serve()
+            finally:
+                if self.pool:
+                    # Воркеры сами дорабатывают свои очереди
+                    await asyncio.get_running_loop().run_in_executor(None, self.pool.stop)
+                else:
+                    if application.updater and application.updater.running:
+                        await application.updater.stop()
+                    # stop() дожидается апдейтов из очереди и уже запущенных хендлеров
+                    await application.stop()
+                    if application.post_stop:
+                        await application.post_stop(application)
@@ -0,0 +1,127 @@
+import asyncio
+import multiprocessing
+import os
+import socket
+from queue import Empty
+
+from telegram import Update
+
+# Как часто воркер отправляет снимок своих метрик главному процессу (сек)
+METRICS_INTERVAL = 5
+
+
+def worker_id():
+    """Имя процесса для аренды напоминаний (lease_owner в базе)."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def chat_id_of(data):
+    """chat_id сырого апдейта (JSON от Telegram) — по нему выбираем воркер.
+
+    Для callback_query берём чат сообщения с кнопкой, для апдейтов без чата
+    (inline-запросы и т. п.) — отправителя.
+    """
+    for value in data.values():
+        if isinstance(value, dict):
+            message = value.get("message") if isinstance(value.get("message"), dict) else value
+            chat = message.get("chat") or value.get("from")
+            if chat:
+                return chat["id"]
+    return 0
+
+
+class WorkerPool:
+    """N процессов-воркеров, апдейты делятся между ними по chat_id.
+
+    Все апдейты одного чата попадают в один и тот же процесс, поэтому
+    порядок сообщений пользователя и его локальные кэши (gate, /mywords)
+    сохраняются. target(index, queue, reports) запускается в отдельном
+    процессе (spawn: модуль бота импортируется заново, со своей базой и
+    клиентами); в reports воркер кладёт (index, снимок метрик).
+    """
+
+    def __init__(self, workers, target):
+        context = multiprocessing.get_context("spawn")
+        self.queues = [context.Queue() for _ in range(workers)]
+        self.reports = context.Queue()
+        self.snapshots = {}
+        self.processes = [
+            context.Process(target=target, args=(index, queue, self.reports), name=f"bot-worker-{index}")
+            for index, queue in enumerate(self.queues)
+        ]
+        self.routed = [0] * workers
+
+    def start(self):
+        for process in self.processes:
+            process.start()
+
+    def route(self, data):
+        index = chat_id_of(data) % len(self.queues)
+        self.routed[index] += 1
+        self.queues[index].put(data)
+
+    def metrics(self):
+        """Последние снимки метрик воркеров: {"0": Registry.snapshot(), ...}."""
+        while True:
+            try:
+                index, snapshot = self.reports.get_nowait()
+            except Empty:
+                return self.snapshots
+            self.snapshots[str(index)] = snapshot
+
+    def alive(self):
+        return all(process.is_alive() for process in self.processes)
+
+    def stop(self, timeout=30):
+        """Просит воркеры доработать очередь и ждёт их (не дольше timeout на каждый)."""
+        for queue in self.queues:
+            queue.put(None)
+        for process in self.processes:
+            process.join(timeout)
+            if process.is_alive():
+                print(f"⚠ Workers: {process.name} не успел остановиться")
+                process.terminate()
+
+    def stats(self):
+        return {
+            "workers": len(self.processes),
+            "alive": sum(1 for process in self.processes if process.is_alive()),
+            "routed": self.routed,
+        }
+
+
+async def _report_every(report, interval):
+    while True:
+        await asyncio.sleep(interval)
+        report()
+
+
+async def consume_updates(application, queue, on_start=None, report=None):
+    """Тело воркера: апдейты из очереди WorkerPool -> update_queue приложения.
+
+    None в очереди — сигнал остановки: application.stop() дождётся уже
+    принятых апдейтов и хендлеров. on_start(application) вызывается после
+    application.start(), post_stop — после stop(). report() — раз в
+    METRICS_INTERVAL и при остановке отправляет метрики главному процессу.
+    """
+    loop = asyncio.get_running_loop()
+    async with application:
+        if application.post_init:
+            await application.post_init(application)
+        await application.start()
+        if on_start:
+            await on_start(application)
+        reporter = asyncio.ensure_future(_report_every(report, METRICS_INTERVAL)) if report else None
+        try:
+            while True:
+                data = await loop.run_in_executor(None, queue.get)
+                if data is None:
+                    break
+                await application.update_queue.put(Update.de_json(data, application.bot))
+        finally:
+            await application.stop()
+            if application.post_stop:
+                await application.post_stop(application)
+            if reporter:
+                reporter.cancel()
+                report()